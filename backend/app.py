@@ -8,8 +8,14 @@ from pathlib import Path
 
 from .config import Config
 from .services.cache_service import CacheService
+from .services.cache_backends import create_cache_backend
+from .services.message_store import MessageStoreManager
+from .services.twilio_client_registry import TwilioClientRegistry
+from .services.webhook_ingestor import WebhookIngestor
 from .routes.message_routes import MessageRoutes
 from .routes.auth_routes import AuthRoutes
+from .routes.webhook_routes import WebhookRoutes
+from .routes.metrics_routes import MetricsRoutes
 
 
 def create_app() -> Flask:
@@ -46,16 +52,65 @@ def create_app() -> Flask:
     
     # Inicializar servicios
     cache_service = CacheService(
-        ttl_seconds=Config.CACHE_TTL_SECONDS
+        ttl_seconds=Config.CACHE_TTL_SECONDS,
+        stale_ttl_seconds=Config.CACHE_STALE_SECONDS,
+        backend=create_cache_backend(
+            Config.CACHE_BACKEND,
+            max_entries=Config.CACHE_MAX_ENTRIES,
+            max_bytes=Config.CACHE_MAX_BYTES,
+            sqlite_path=Config.CACHE_SQLITE_PATH
+        )
     )
     
+    client_registry = TwilioClientRegistry(
+        pool_size=Config.TWILIO_HTTP_POOL_SIZE,
+        idle_seconds=Config.TWILIO_CLIENT_IDLE_SECONDS,
+        timeout=Config.TWILIO_HTTP_TIMEOUT,
+        governor_options={
+            'initial_rate': Config.TWILIO_RATE_INITIAL,
+            'max_rate': Config.TWILIO_RATE_MAX,
+            'max_concurrency': Config.TWILIO_MAX_CONCURRENCY,
+            'max_retries': Config.TWILIO_RATE_LIMIT_RETRIES,
+            'max_wait_seconds': Config.TWILIO_RATE_LIMIT_MAX_WAIT_SECONDS
+        },
+        api_base_url=Config.TWILIO_API_BASE_URL
+    )
+    
+    message_store_manager = None
+    if Config.MESSAGE_STORE_ENABLED:
+        message_store_manager = MessageStoreManager(Config.MESSAGE_STORE_DIR)
+    
     # Registrar rutas
-    auth_routes = AuthRoutes()
+    auth_routes = AuthRoutes(client_registry, cache_service)
     app.register_blueprint(auth_routes.blueprint)
     
-    message_routes = MessageRoutes(cache_service)
+    message_routes = MessageRoutes(
+        cache_service,
+        message_store_manager,
+        client_registry=client_registry
+    )
     app.register_blueprint(message_routes.blueprint)
     
+    webhook_ingestor = WebhookIngestor(
+        cache_service,
+        message_store_manager,
+        max_queue=Config.WEBHOOK_QUEUE_SIZE,
+        batch_size=Config.WEBHOOK_BATCH_SIZE
+    )
+    webhook_routes = WebhookRoutes(
+        webhook_ingestor,
+        Config.TWILIO_WEBHOOK_AUTH_TOKENS,
+        base_url=Config.WEBHOOK_BASE_URL
+    )
+    app.register_blueprint(webhook_routes.blueprint)
+    
+    metrics_routes = MetricsRoutes(
+        cache_service,
+        token=Config.METRICS_TOKEN,
+        server_timing=Config.SERVER_TIMING_ENABLED
+    )
+    app.register_blueprint(metrics_routes.blueprint)
+    
     # Ruta principal - redirige a login si no está autenticado
     @app.route("/")
     def index():
@@ -112,6 +167,10 @@ def create_app() -> Flask:
         return jsonify({
             "status": "ok",
             "cache_size": cache_service.size(),
+            "cache": cache_service.stats(),
+            "twilio_clients": client_registry.stats(),
+            "webhooks": webhook_ingestor.stats(),
+            "prefetch": message_routes.page_prefetcher.stats(),
             "authenticated": 'account_sid' in session,
             "paths": {
                 "base_dir": str(base_dir),
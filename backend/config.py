@@ -18,11 +18,66 @@ class Config:
     
     # Cache
     CACHE_TTL_SECONDS = 20  # 20 segundos para monitor en 'tiempo real'
+    CACHE_STALE_SECONDS = 60  # Ventana en la que se sirve una entrada expirada mientras se refresca
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')  # 'memory' o 'sqlite' (compartido entre workers)
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1000))
+    CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    CACHE_SQLITE_PATH = os.getenv('CACHE_SQLITE_PATH', 'data/cache.sqlite3')
+    MESSAGE_WINDOW_SIZE = 500  # Resultados leídos de una vez; las páginas se recortan de ahí
+    PREFETCH_MAX_WORKERS = 2  # Hilos por worker que precargan la página siguiente
+    PREFETCH_MAX_PENDING = 8  # Precargas en cola por worker (el resto se descarta)
+    COUNT_CLOSED_DAY_TTL_SECONDS = 7 * 24 * 3600  # Conteo de un día cerrado (ya no cambia)
+    SERVICE_CATALOG_REFRESH_SECONDS = 900  # Números de la cuenta: se releen en segundo plano tras 15 minutos
+    SERVICE_CATALOG_MAX_AGE_SECONDS = 24 * 3600  # Antigüedad máxima con la que se sirven
+    CREDENTIAL_CACHE_TTL_SECONDS = 300  # Credenciales verificadas con Twilio: se vuelven a verificar tras 5 minutos
+    
+    # Almacén local de mensajes (SQLite por cuenta)
+    MESSAGE_STORE_ENABLED = os.getenv('MESSAGE_STORE_ENABLED', 'True').lower() == 'true'
+    MESSAGE_STORE_DIR = os.getenv('MESSAGE_STORE_DIR', 'data/message_store')
+    MESSAGE_STORE_BACKFILL_DAYS = int(os.getenv('MESSAGE_STORE_BACKFILL_DAYS', 30))  # 0 = todo el historial
+    MESSAGE_STORE_SYNC_INTERVAL_SECONDS = 20
+    MESSAGE_STORE_WEBHOOK_SYNC_INTERVAL_SECONDS = 300  # Mientras llegan webhooks sólo se cubren huecos
+    
+    # Webhooks de Twilio (mensajes entrantes y status callbacks)
+    # Formato: "AC...:token,AC...:token" (cuentas cuyas firmas se pueden validar)
+    TWILIO_WEBHOOK_AUTH_TOKENS = dict(
+        pair.strip().split(':', 1) for pair in os.getenv('TWILIO_WEBHOOK_AUTH_TOKENS', '').split(',') if ':' in pair
+    )
+    WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')  # URL pública (la firma depende de ella)
+    WEBHOOK_QUEUE_SIZE = 20000  # Eventos pendientes antes de responder 503
+    WEBHOOK_BATCH_SIZE = 500  # Eventos por transacción de escritura
     
     # API
     MAX_MESSAGES_PER_PAGE = 100
     DEFAULT_MESSAGES_PER_PAGE = 50
     TWILIO_PAGE_SIZE = 100
+    TWILIO_HTTP_POOL_SIZE = int(os.getenv('TWILIO_HTTP_POOL_SIZE', 10))  # Conexiones keep-alive por cuenta
+    TWILIO_HTTP_TIMEOUT = 30  # Segundos por petición HTTP a Twilio
+    TWILIO_API_BASE_URL = os.getenv('TWILIO_API_BASE_URL', '')  # Vacío = api.twilio.com (otro valor: API simulada de benchmarks/)
+    TWILIO_CLIENT_IDLE_SECONDS = 900  # Desalojar clientes sin uso tras 15 minutos
+    TWILIO_ASYNC_ENABLED = os.getenv('TWILIO_ASYNC_ENABLED', 'True').lower() == 'true'  # Motor aiohttp
+    TWILIO_RATE_INITIAL = float(os.getenv('TWILIO_RATE_INITIAL', 10))  # Peticiones/s por cuenta al arrancar
+    TWILIO_RATE_MAX = float(os.getenv('TWILIO_RATE_MAX', 100))  # Techo del aumento AIMD
+    TWILIO_MAX_CONCURRENCY = int(os.getenv('TWILIO_MAX_CONCURRENCY', 8))  # Peticiones simultáneas por cuenta
+    TWILIO_RATE_LIMIT_RETRIES = 4  # Reintentos de una petición rechazada con 429
+    TWILIO_RATE_LIMIT_MAX_WAIT_SECONDS = 30  # Espera máxima por un turno antes de responder 503
+    TWILIO_SHARD_CONCURRENCY = int(os.getenv('TWILIO_SHARD_CONCURRENCY', 4))  # Tramos en paralelo (0 = desactivado)
+    TWILIO_SHARD_HOURS = 24  # Duración de cada tramo de fecha
+    TWILIO_SHARD_MIN_RANGE_HOURS = 72  # Rango mínimo para dividir la consulta en tramos
+    TWILIO_PLAN_MESSAGES_PER_DAY = int(os.getenv('TWILIO_PLAN_MESSAGES_PER_DAY', 2000))  # Volumen supuesto de la cuenta al comparar planes de lectura
+    TWILIO_MAX_DISCARDED_ROWS = int(os.getenv('TWILIO_MAX_DISCARDED_ROWS', 1000))  # Filas sin coincidencia leídas por página de resultados antes de cortar una búsqueda (scan_truncated)
+    
+    # Feed en vivo (SSE): un sondeo por cuenta y filtros, compartido por todos los clientes
+    LIVE_FEED_POLL_SECONDS = 5
+    LIVE_FEED_OVERLAP_SECONDS = 60  # Ventana releída para mensajes que aparecen con retraso
+    LIVE_FEED_MAX_SUBSCRIBERS = int(os.getenv('LIVE_FEED_MAX_SUBSCRIBERS', 4))  # Por worker (cada uno ocupa un hilo)
+    LIVE_FEED_HEARTBEAT_SECONDS = 15
+    LIVE_FEED_MAX_STREAM_SECONDS = 300  # El navegador reconecta solo al cerrarse el stream
+    
+    # Métricas (/metrics en formato Prometheus, Server-Timing por petición)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Bearer token para /metrics (vacío = /metrics desactivado)
+    # Server-Timing expone tiempos internos a cualquier cliente: sólo si se activa
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'False').lower() == 'true'
     
     # Timezone
     TIMEZONE_OFFSET_HOURS = 6  # UTC-6
@@ -1,12 +1,20 @@
 """
 Modelo de dominio para mensajes de Twilio
 """
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, asdict
 from datetime import datetime
-from typing import Optional
+from json.encoder import encode_basestring_ascii
+from typing import Callable, Iterable, Iterator, Optional
+import hashlib
+import json
+import sys
 
+from ..utils.date_utils import to_epoch, from_epoch
+from ..utils.text_search import parse_body_query
 
-@dataclass
+
+@dataclass(slots=True)
 class Message:
     """Representa un mensaje de Twilio"""
     
@@ -47,17 +55,213 @@ class Message:
             if timezone_offset_hours:
                 date_sent -= timedelta(hours=timezone_offset_hours)
         
+        # Números, estado y dirección se repiten en miles de mensajes: una sola copia
         return cls(
             sid=twilio_msg.sid,
-            from_number=twilio_msg.from_,
-            to_number=twilio_msg.to,
+            from_number=_intern(twilio_msg.from_),
+            to_number=_intern(twilio_msg.to),
             body=twilio_msg.body,
-            status=twilio_msg.status,
-            direction=twilio_msg.direction,
+            status=_intern(twilio_msg.status),
+            direction=_intern(twilio_msg.direction),
             date_sent=date_sent
         )
 
 
+def _intern(value: Optional[str]) -> Optional[str]:
+    """sys.intern tolerante a None"""
+    return sys.intern(value) if value else value
+
+
+class MessageBatch:
+    """
+    Lote de mensajes en columnas, para páginas cacheadas y respuestas JSON
+    
+    Números, estados y direcciones se guardan una vez en una tabla de textos y
+    cada fila sólo guarda su índice; las fechas son epoch en un array de
+    enteros. Un lote de 100 mensajes ocupa una fracción de la lista de
+    diccionarios equivalente y se serializa a JSON sin crear un dict por fila.
+    """
+    
+    __slots__ = ('sids', 'bodies', 'texts', 'from_idx', 'to_idx',
+                 'status_idx', 'direction_idx', 'dates')
+    
+    # Marca de "sin fecha" en el array de epochs
+    NO_DATE = -2 ** 63
+    
+    def __init__(self):
+        self.sids: list[str] = []
+        self.bodies: list[Optional[str]] = []
+        self.texts: list[Optional[str]] = []
+        self.from_idx = array('I')
+        self.to_idx = array('I')
+        self.status_idx = array('I')
+        self.direction_idx = array('I')
+        self.dates = array('q')
+    
+    @classmethod
+    def from_messages(cls, messages: Iterable[Message]) -> 'MessageBatch':
+        """
+        Construye el lote a partir de mensajes
+        
+        Args:
+            messages: Mensajes en el orden de la respuesta
+        
+        Returns:
+            Lote en columnas
+        """
+        batch = cls()
+        lookup: dict[Optional[str], int] = {}
+        
+        def index_of(value: Optional[str]) -> int:
+            index = lookup.get(value)
+            if index is None:
+                index = lookup[value] = len(batch.texts)
+                batch.texts.append(value)
+            return index
+        
+        for message in messages:
+            batch.sids.append(message.sid)
+            batch.bodies.append(message.body)
+            batch.from_idx.append(index_of(message.from_number))
+            batch.to_idx.append(index_of(message.to_number))
+            batch.status_idx.append(index_of(message.status))
+            batch.direction_idx.append(index_of(message.direction))
+            date_sent = to_epoch(message.date_sent)
+            batch.dates.append(cls.NO_DATE if date_sent is None else date_sent)
+        
+        return batch
+    
+    def __len__(self) -> int:
+        return len(self.sids)
+    
+    @property
+    def nbytes(self) -> int:
+        """Tamaño aproximado en bytes (textos y arrays), sin serializar el lote"""
+        arrays = (self.from_idx, self.to_idx, self.status_idx, self.direction_idx, self.dates)
+        return (
+            sum(column.itemsize * len(column) for column in arrays)
+            + sum(map(len, self.sids))
+            + sum(len(text) for text in self.bodies if text)
+            + sum(len(text) for text in self.texts if text)
+        )
+    
+    def __iter__(self) -> Iterator[Message]:
+        """Reconstruye los mensajes (objetos nuevos en cada recorrido)"""
+        return self.messages()
+    
+    def messages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Message]:
+        """
+        Reconstruye los mensajes de un tramo del lote
+        
+        Args:
+            start: Primera fila
+            stop: Fila donde termina (exclusiva; None = hasta el final)
+        
+        Returns:
+            Iterador de mensajes nuevos
+        """
+        texts = self.texts
+        stop = len(self.sids) if stop is None else min(stop, len(self.sids))
+        for i in range(start, stop):
+            date_sent = self.dates[i]
+            yield Message(
+                sid=self.sids[i],
+                from_number=texts[self.from_idx[i]],
+                to_number=texts[self.to_idx[i]],
+                body=self.bodies[i],
+                status=texts[self.status_idx[i]],
+                direction=texts[self.direction_idx[i]],
+                date_sent=None if date_sent == self.NO_DATE else from_epoch(date_sent)
+            )
+    
+    def date_strings(self) -> list[Optional[str]]:
+        """
+        Fechas en formato ISO (las de un mismo día comparten el prefijo calculado)
+        
+        Returns:
+            Lista con la fecha de cada fila (None si no tiene)
+        """
+        day_prefixes: dict[int, str] = {}
+        dates = []
+        for date_sent in self.dates:
+            if date_sent == self.NO_DATE:
+                dates.append(None)
+                continue
+            day, seconds = divmod(date_sent, 86400)
+            prefix = day_prefixes.get(day)
+            if prefix is None:
+                prefix = day_prefixes[day] = from_epoch(day * 86400).date().isoformat()
+            hours, seconds = divmod(seconds, 3600)
+            dates.append('%sT%02d:%02d:%02d' % (prefix, hours, seconds // 60, seconds % 60))
+        return dates
+    
+    def to_rows(self) -> list[dict]:
+        """
+        Filas como diccionarios (mismo formato que Message.to_dict)
+        
+        Sólo para codificadores en C (orjson), más rápidos con dicts
+        temporales que to_json formateando cada fila en Python.
+        """
+        texts = self.texts
+        return [
+            {
+                "sid": sid,
+                "from": texts[from_idx],
+                "to": texts[to_idx],
+                "body": body,
+                "status": texts[status_idx],
+                "direction": texts[direction_idx],
+                "date_sent": date_sent
+            }
+            for sid, from_idx, to_idx, body, status_idx, direction_idx, date_sent in zip(
+                self.sids, self.from_idx, self.to_idx, self.bodies,
+                self.status_idx, self.direction_idx, self.date_strings()
+            )
+        ]
+    
+    def to_json(self) -> str:
+        """
+        Serializa el lote como un arreglo JSON de mensajes (mismo formato que Message.to_dict)
+        
+        Returns:
+            Texto JSON
+        """
+        # Cada texto repetido se codifica una sola vez
+        encoded = [_encode_json(text) for text in self.texts]
+        rows = [
+            '{"sid":%s,"from":%s,"to":%s,"body":%s,"status":%s,'
+            '"direction":%s,"date_sent":%s}' % (
+                _encode_json(sid),
+                encoded[from_idx],
+                encoded[to_idx],
+                _encode_json(body),
+                encoded[status_idx],
+                encoded[direction_idx],
+                _encode_json(date_sent)
+            )
+            for sid, from_idx, to_idx, body, status_idx, direction_idx, date_sent in zip(
+                self.sids, self.from_idx, self.to_idx, self.bodies,
+                self.status_idx, self.direction_idx, self.date_strings()
+            )
+        ]
+        return '[' + ','.join(rows) + ']'
+
+
+def direction_group(direction: Optional[str]) -> Optional[str]:
+    """Sentido de un mensaje sin el detalle ('outbound-api' -> 'outbound')"""
+    return direction.split('-', 1)[0] if direction else direction
+
+
+def _match_all(message: Message) -> bool:
+    """Matcher de una búsqueda sin filtros residuales"""
+    return True
+
+
+def _encode_json(value: Optional[str]) -> str:
+    """Codifica un texto (o None) como valor JSON"""
+    return 'null' if value is None else encode_basestring_ascii(value)
+
+
 @dataclass
 class MessageFilter:
     """Representa los filtros para buscar mensajes"""
@@ -68,6 +272,10 @@ class MessageFilter:
     numero_from: Optional[str] = None
     numero_to: Optional[str] = None
     body_search: Optional[str] = None  # Nuevo campo para búsqueda por contenido
+    numero_from_to: Optional[str] = None  # Número como origen O destino (conversación)
+    numero_contraparte: Optional[str] = None  # Limita la conversación a este otro número
+    status: Optional[str] = None  # Estado exacto (delivered, failed, ...)
+    direction: Optional[str] = None  # 'inbound' u 'outbound' (incluye outbound-api, -reply, ...)
     
     def matches(self, message: Message) -> bool:
         """
@@ -98,15 +306,103 @@ class MessageFilter:
         if self.numero_to and message.to_number != self.numero_to:
             return False
         
-        # Filtro por contenido del mensaje (búsqueda case-insensitive)
-        if self.body_search and message.body:
-            if self.body_search.lower() not in message.body.lower():
+        # Filtros por estado y sentido
+        if self.status and message.status != self.status:
+            return False
+        if self.direction and direction_group(message.direction) != self.direction:
+            return False
+        
+        # Filtro por conversación: el número participa en cualquier sentido
+        if self.numero_from_to:
+            if self.numero_contraparte:
+                participants = {message.from_number, message.to_number}
+                if participants != {self.numero_from_to, self.numero_contraparte}:
+                    return False
+            elif self.numero_from_to not in (message.from_number, message.to_number):
                 return False
-        elif self.body_search and not message.body:
+        
+        # Filtro por contenido (prefijos y frases, sin distinguir mayúsculas ni acentos)
+        if self.body_search and not parse_body_query(self.body_search).matches(message.body):
             return False
         
         return True
     
+    def compile_matcher(self, pushed: Iterable[str] = ()) -> Callable[[Message], bool]:
+        """
+        Compila los filtros en una función equivalente a matches
+        
+        Arma una tupla con un predicado por filtro activo, en orden de costo
+        (estado y números antes que el cuerpo): en cada mensaje no se consultan
+        los campos del filtro que no aplican.
+        
+        Args:
+            pushed: Filtros que el stream de Twilio ya garantiza ('sid',
+                'numero_from', 'numero_to', 'numero_from_to'): se omiten
+        
+        Returns:
+            Función mensaje -> bool
+        """
+        pushed = set(pushed)
+        predicates = []
+        
+        if self.sid and 'sid' not in pushed:
+            sid = self.sid
+            predicates.append(lambda m: m.sid == sid)
+        
+        if self.status:
+            status = self.status
+            predicates.append(lambda m: m.status == status)
+        
+        if self.direction:
+            # Mismo criterio que direction_group: 'outbound' incluye 'outbound-api', ...
+            direction = self.direction
+            subtype_prefix = direction + '-'
+            predicates.append(
+                lambda m: m.direction == direction or (m.direction or '').startswith(subtype_prefix)
+            )
+        
+        if self.numero_from and 'numero_from' not in pushed:
+            numero_from = self.numero_from
+            predicates.append(lambda m: m.from_number == numero_from)
+        
+        if self.numero_to and 'numero_to' not in pushed:
+            numero_to = self.numero_to
+            predicates.append(lambda m: m.to_number == numero_to)
+        
+        if self.numero_from_to and 'numero_from_to' not in pushed:
+            number = self.numero_from_to
+            if self.numero_contraparte:
+                other = self.numero_contraparte
+                predicates.append(
+                    lambda m: (m.from_number == number and m.to_number == other)
+                    or (m.from_number == other and m.to_number == number)
+                )
+            else:
+                predicates.append(lambda m: m.from_number == number or m.to_number == number)
+        
+        # Los mensajes sin fecha (en cola) pasan los filtros de fecha
+        fecha_inicio, fecha_final = self.fecha_inicio, self.fecha_final
+        if fecha_inicio and fecha_final:
+            predicates.append(
+                lambda m: m.date_sent is None or fecha_inicio <= m.date_sent <= fecha_final
+            )
+        elif fecha_inicio:
+            predicates.append(lambda m: m.date_sent is None or m.date_sent >= fecha_inicio)
+        elif fecha_final:
+            predicates.append(lambda m: m.date_sent is None or m.date_sent <= fecha_final)
+        
+        if self.body_search:
+            body_matches = parse_body_query(self.body_search).matches
+            predicates.append(lambda m: body_matches(m.body))
+        
+        if not predicates:
+            return _match_all
+        if len(predicates) == 1:
+            return predicates[0]
+        
+        predicates = tuple(predicates)
+        return lambda m: all(predicate(m) for predicate in predicates)
+    
     def to_twilio_params(self) -> dict:
         """
         Convierte los filtros a parámetros para la API de Twilio
@@ -124,9 +420,26 @@ class MessageFilter:
             params['from_'] = self.numero_from
         if self.numero_to:
             params['to'] = self.numero_to
-        # Nota: body_search se filtra en memoria, no en la API de Twilio
+        # Nota: body_search, status y direction se filtran en memoria (Twilio no los admite)
+        # Nota: numero_from_to lo resuelve el QueryPlanner (uno o dos streams)
         
         return params
+    
+    def fingerprint(self) -> str:
+        """
+        Genera un hash corto y estable de los filtros
+        
+        body_search entra en su forma canónica: textos equivalentes
+        comparten caché, conteos y feeds.
+        
+        Returns:
+            Hash MD5 (16 caracteres) de los filtros
+        """
+        values = asdict(self)
+        if self.body_search:
+            values['body_search'] = parse_body_query(self.body_search).canonical
+        key_str = json.dumps(values, sort_keys=True, default=str)
+        return hashlib.md5(key_str.encode()).hexdigest()[:16]
 
 
 @dataclass
@@ -140,15 +453,32 @@ class PaginatedResponse:
     total_pages: int
     has_more: bool
     unique_users: int = 0  # Número de usuarios únicos que interactuaron
+    next_cursor: Optional[str] = None  # Token para la siguiente página (modo cursor)
+    total_exact: bool = False  # True si total es un conteo exacto y no una estimación
+    scan_truncated: bool = False  # La lectura se cortó por el máximo de filas descartadas: puede haber más
     
     def to_dict(self) -> dict:
         """Convierte la respuesta a diccionario para JSON"""
+        return {"mensajes": [msg.to_dict() for msg in self.messages], **self._metadata()}
+    
+    def to_payload(self) -> dict:
+        """
+        Como to_dict, pero con los mensajes en un MessageBatch
+        
+        Es lo que se guarda en caché: serializar con utils.json_utils.dumps.
+        """
+        return {"mensajes": MessageBatch.from_messages(self.messages), **self._metadata()}
+    
+    def _metadata(self) -> dict:
+        """Campos de la respuesta además de los mensajes"""
         return {
-            "mensajes": [msg.to_dict() for msg in self.messages],
             "page": self.page,
             "per_page": self.per_page,
             "total": self.total,
             "total_pages": self.total_pages,
             "has_more": self.has_more,
-            "unique_users": self.unique_users
+            "unique_users": self.unique_users,
+            "next_cursor": self.next_cursor,
+            "total_exact": self.total_exact,
+            "scan_truncated": self.scan_truncated
         }
\ No newline at end of file
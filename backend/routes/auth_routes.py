@@ -4,7 +4,17 @@ Rutas HTTP para autenticación y gestión de servicios
 from flask import Blueprint, request, jsonify, session
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
+from typing import Optional
 import logging
+import uuid
+
+from ..services.twilio_client_registry import TwilioClientRegistry
+from ..services.cache_service import CacheService
+from ..services.service_catalog import ServiceCatalog
+from ..services.credential_cache import CredentialCache
+from ..utils.twilio_errors import is_auth_error
+from ..config import Config
+from .responses import etag_response
 
 logger = logging.getLogger(__name__)
 
@@ -12,10 +22,75 @@ logger = logging.getLogger(__name__)
 class AuthRoutes:
     """Controlador de rutas para autenticación y servicios"""
     
-    def __init__(self):
+    def __init__(self, client_registry: Optional[TwilioClientRegistry] = None,
+                 cache_service: Optional[CacheService] = None,
+                 service_catalog: Optional[ServiceCatalog] = None,
+                 credential_cache: Optional[CredentialCache] = None):
+        """
+        Inicializa las rutas de autenticación
+        
+        Args:
+            client_registry: Registro de clientes de Twilio reutilizables
+            cache_service: Caché donde se guarda el catálogo de servicios
+            service_catalog: Catálogo de servicios por cuenta (por defecto sobre cache_service)
+            credential_cache: Credenciales ya verificadas (por defecto sobre cache_service)
+        """
+        cache_service = cache_service or CacheService()
+        self.client_registry = client_registry
+        self.credential_cache = credential_cache or CredentialCache(
+            cache_service,
+            Config.SECRET_KEY,
+            ttl_seconds=Config.CREDENTIAL_CACHE_TTL_SECONDS
+        )
+        self.service_catalog = service_catalog or ServiceCatalog(
+            cache_service,
+            refresh_seconds=Config.SERVICE_CATALOG_REFRESH_SECONDS,
+            max_age_seconds=Config.SERVICE_CATALOG_MAX_AGE_SECONDS
+        )
         self.blueprint = Blueprint('auth', __name__)
         self._register_routes()
     
+    def _get_client(self, account_sid: str, auth_token: str) -> Client:
+        """
+        Obtiene un cliente de Twilio, reutilizando el del registro si existe
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+            auth_token: Token de autenticación
+            
+        Returns:
+            Cliente de Twilio
+        """
+        if self.client_registry is not None:
+            return self.client_registry.get_client(account_sid, auth_token)
+        return Client(account_sid, auth_token)
+    
+    def _verify_account(self, account_sid: str, auth_token: str) -> dict:
+        """
+        Consulta la cuenta en Twilio para validar las credenciales
+        
+        Con registro, las credenciales se prueban sin reemplazar el cliente
+        que ya usan otras sesiones de la cuenta (ver TwilioClientRegistry.verify).
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+            auth_token: Token de autenticación
+        
+        Returns:
+            Datos de la cuenta (friendly_name, status)
+        """
+        def fetch_account(client: Client) -> dict:
+            # Hacer una llamada simple para validar credenciales
+            account = client.api.accounts(account_sid).fetch()
+            return {
+                'friendly_name': account.friendly_name,
+                'status': account.status
+            }
+        
+        if self.client_registry is not None:
+            return self.client_registry.verify(account_sid, auth_token, fetch_account)
+        return fetch_account(Client(account_sid, auth_token))
+    
     def _register_routes(self):
         """Registra todas las rutas del blueprint"""
         self.blueprint.add_url_rule(
@@ -70,26 +145,33 @@ class AuthRoutes:
                     'message': 'Credenciales incompletas'
                 }), 400
             
-            # Validar credenciales intentando conectar con Twilio
+            # Validar credenciales con Twilio, salvo que ya se hayan verificado
             try:
-                client = Client(account_sid, auth_token)
-                # Hacer una llamada simple para validar credenciales
-                account = client.api.accounts(account_sid).fetch()
+                account = self.credential_cache.verify(
+                    account_sid,
+                    auth_token,
+                    lambda: self._verify_account(account_sid, auth_token)
+                )
                 
                 # Guardar en sesión
                 session['account_sid'] = account_sid
                 session['auth_token'] = auth_token
-                session['account_name'] = account.friendly_name
+                session['account_name'] = account['friendly_name']
+                session['session_id'] = uuid.uuid4().hex  # Identifica la sesión (precarga de páginas)
                 session.permanent = True
                 
                 return jsonify({
                     'success': True,
                     'message': 'Login exitoso',
-                    'account_name': account.friendly_name
+                    'account_name': account['friendly_name']
                 })
                 
             except TwilioRestException as e:
                 logger.error(f"Error de autenticación Twilio: {e}")
+                if self.client_registry is not None:
+                    # Sólo si era el token registrado (p. ej. se rotó): un token
+                    # equivocado no afecta a las sesiones que usan el correcto
+                    self.client_registry.invalidate(account_sid, auth_token)
                 return jsonify({
                     'success': False,
                     'message': 'Credenciales inválidas'
@@ -128,6 +210,9 @@ class AuthRoutes:
         """
         Endpoint para obtener servicios de mensajería de Twilio
         
+        El catálogo se cachea por cuenta y se refresca en segundo plano
+        (ver ServiceCatalog); la respuesta lleva ETag.
+        
         Returns:
             JSON con lista de servicios (números de teléfono configurados)
         """
@@ -138,51 +223,17 @@ class AuthRoutes:
             }), 401
         
         try:
-            client = Client(session['account_sid'], session['auth_token'])
-            
-            # Obtener números de teléfono entrantes (incoming phone numbers)
-            incoming_numbers = client.incoming_phone_numbers.list(limit=100)
-            
-            services = []
-            seen_numbers = set()
+            client = self._get_client(session['account_sid'], session['auth_token'])
+            encoded = self.service_catalog.get(session['account_sid'], client)
             
-            for number in incoming_numbers:
-                base_number = number.phone_number
-                
-                # Evitar duplicados
-                if base_number in seen_numbers:
-                    continue
-                seen_numbers.add(base_number)
-                
-                # Crear servicio con prefijo whatsapp: (asumiendo que todos usan WhatsApp)
-                # Si usas SMS regular, ajusta esta lógica
-                phone_number = f"whatsapp:{base_number}"
-                service_type = 'WhatsApp'
-                
-                # Si prefieres detectar automáticamente, descomenta esto:
-                # if hasattr(number, 'sms_url') and number.sms_url:
-                #     if 'whatsapp' in str(number.sms_url).lower():
-                #         service_type = 'WhatsApp'
-                #         phone_number = f"whatsapp:{base_number}"
-                #     else:
-                #         service_type = 'SMS'
-                #         phone_number = base_number
-                
-                services.append({
-                    'sid': number.sid,
-                    'phone_number': phone_number,
-                    'friendly_name': number.friendly_name or base_number,
-                    'service_type': service_type,
-                    'capabilities': number.capabilities
-                })
-            
-            return jsonify({
-                'success': True,
-                'services': services
-            })
+            # El navegador revalida con If-None-Match: sin cambios recibe un 304
+            return etag_response(encoded, cache_control='private, no-cache')
             
         except Exception as e:
             logger.error(f"Error al obtener servicios: {e}")
+            if is_auth_error(e):
+                # El token dejó de ser válido (p. ej. se rotó): el próximo login vuelve a verificarlo
+                self.credential_cache.forget(session['account_sid'], session['auth_token'])
             return jsonify({
                 'success': False,
                 'message': 'Error al obtener servicios'
@@ -1,27 +1,90 @@
 """
 Rutas HTTP para gestión de mensajes
 """
-from flask import Blueprint, request, jsonify, session
-from datetime import timedelta
+from flask import Blueprint, Response, request, jsonify, session, stream_with_context
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Optional
+import math
+import time
 
 from ..models.message import MessageFilter
 from ..utils.date_utils import parse_datetime
+from ..utils.json_utils import EncodedResponse
+from ..utils.twilio_errors import is_auth_error, is_rate_limit_error, retry_after_seconds
 from ..services.twilio_service import TwilioService
-from ..services.cache_service import CacheService
+from ..services.cache_service import CacheScope, CacheService, generate_cache_key
+from ..services.request_coalescer import RequestCoalescer
+from ..services.twilio_client_registry import TwilioClientRegistry
+from ..services.message_store import MessageStoreManager
+from ..services.export_service import MessageExporter
+from ..services.count_service import CountService
+from ..services.credential_cache import CredentialCache
+from ..services.live_feed import LiveFeedHub, LiveFeedFull
+from ..services.message_window import MessageWindowCache, cache_scope
+from ..services.page_prefetcher import PagePrefetcher
+from ..services import metrics
 from ..config import Config
+from .responses import etag_response
 
 
 class MessageRoutes:
     """Controlador de rutas para mensajes"""
     
-    def __init__(self, cache_service: CacheService):
+    def __init__(self, cache_service: CacheService,
+                 message_store_manager: Optional[MessageStoreManager] = None,
+                 request_coalescer: Optional[RequestCoalescer] = None,
+                 client_registry: Optional[TwilioClientRegistry] = None,
+                 count_service: Optional[CountService] = None,
+                 live_feed: Optional[LiveFeedHub] = None,
+                 window_cache: Optional[MessageWindowCache] = None,
+                 page_prefetcher: Optional[PagePrefetcher] = None,
+                 credential_cache: Optional[CredentialCache] = None):
         """
         Inicializa las rutas con las dependencias necesarias
         
         Args:
             cache_service: Servicio de caché
+            message_store_manager: Almacenes locales por cuenta (opcional)
+            request_coalescer: Single-flight para consultas idénticas en vuelo
+            client_registry: Registro de clientes de Twilio reutilizables
+            count_service: Conteos exactos por día (por defecto sobre cache_service)
+            live_feed: Feeds en vivo compartidos entre clientes (/mensajes/stream)
+            window_cache: Ventanas de resultados de las que se recortan las páginas
+            page_prefetcher: Precarga de la página siguiente en segundo plano
+            credential_cache: Credenciales verificadas en el login (por defecto
+                sobre cache_service); un 401 de Twilio las descarta
         """
         self.cache_service = cache_service
+        self.message_store_manager = message_store_manager
+        self.request_coalescer = request_coalescer or RequestCoalescer()
+        self.client_registry = client_registry
+        self.credential_cache = credential_cache or CredentialCache(
+            cache_service,
+            Config.SECRET_KEY,
+            ttl_seconds=Config.CREDENTIAL_CACHE_TTL_SECONDS
+        )
+        self.count_service = count_service or CountService(
+            cache_service,
+            timezone_offset_hours=Config.TIMEZONE_OFFSET_HOURS,
+            open_day_ttl_seconds=Config.CACHE_TTL_SECONDS,
+            closed_day_ttl_seconds=Config.COUNT_CLOSED_DAY_TTL_SECONDS
+        )
+        self.live_feed = live_feed or LiveFeedHub(
+            timezone_offset_hours=Config.TIMEZONE_OFFSET_HOURS,
+            poll_seconds=Config.LIVE_FEED_POLL_SECONDS,
+            overlap_seconds=Config.LIVE_FEED_OVERLAP_SECONDS,
+            max_subscribers=Config.LIVE_FEED_MAX_SUBSCRIBERS
+        )
+        self.window_cache = window_cache or MessageWindowCache(
+            cache_service,
+            window_size=Config.MESSAGE_WINDOW_SIZE,
+            request_coalescer=self.request_coalescer
+        )
+        self.page_prefetcher = page_prefetcher or PagePrefetcher(
+            max_workers=Config.PREFETCH_MAX_WORKERS,
+            max_pending=Config.PREFETCH_MAX_PENDING
+        )
         self.blueprint = Blueprint('messages', __name__)
         self._register_routes()
     
@@ -33,6 +96,24 @@ class MessageRoutes:
             self.get_messages,
             methods=['GET']
         )
+        self.blueprint.add_url_rule(
+            '/mensajes/count',
+            'count_messages',
+            self.count_messages,
+            methods=['GET']
+        )
+        self.blueprint.add_url_rule(
+            '/mensajes/export',
+            'export_messages',
+            self.export_messages,
+            methods=['GET']
+        )
+        self.blueprint.add_url_rule(
+            '/mensajes/stream',
+            'stream_messages',
+            self.stream_messages,
+            methods=['GET']
+        )
     
     def _get_twilio_service(self):
         """
@@ -44,13 +125,68 @@ class MessageRoutes:
         if 'account_sid' not in session or 'auth_token' not in session:
             return None
         
+        return self._create_twilio_service(session['account_sid'], session['auth_token'])
+    
+    def _create_twilio_service(self, account_sid: str, auth_token: str,
+                               client=None) -> TwilioService:
+        """
+        Crea una instancia de TwilioService para unas credenciales
+        
+        Args:
+            account_sid: SID de la cuenta
+            auth_token: Token de autenticación
+            client: Cliente del registro ya obtenido para ese token (opcional)
+        
+        Returns:
+            TwilioService con los clientes compartidos del registro
+        """
+        async_client = None
+        if self.client_registry is not None:
+            client = client or self.client_registry.get_client(account_sid, auth_token)
+            if Config.TWILIO_ASYNC_ENABLED:
+                async_client = self.client_registry.get_async_client(account_sid, auth_token)
+        
+        message_store = None
+        if self.message_store_manager is not None:
+            message_store = self.message_store_manager.get(account_sid)
+        
         return TwilioService(
-            account_sid=session['account_sid'],
-            auth_token=session['auth_token'],
+            account_sid=account_sid,
+            auth_token=auth_token,
             timezone_offset_hours=Config.TIMEZONE_OFFSET_HOURS,
-            page_size=Config.TWILIO_PAGE_SIZE
+            page_size=Config.TWILIO_PAGE_SIZE,
+            message_store=message_store,
+            store_backfill_days=Config.MESSAGE_STORE_BACKFILL_DAYS,
+            store_sync_interval_seconds=Config.MESSAGE_STORE_SYNC_INTERVAL_SECONDS,
+            store_webhook_sync_interval_seconds=Config.MESSAGE_STORE_WEBHOOK_SYNC_INTERVAL_SECONDS,
+            client=client,
+            async_client=async_client,
+            shard_concurrency=Config.TWILIO_SHARD_CONCURRENCY,
+            shard_hours=Config.TWILIO_SHARD_HOURS,
+            shard_min_range_hours=Config.TWILIO_SHARD_MIN_RANGE_HOURS,
+            plan_messages_per_day=Config.TWILIO_PLAN_MESSAGES_PER_DAY,
+            max_discarded_rows=Config.TWILIO_MAX_DISCARDED_ROWS,
+            window_cache=self.window_cache
         )
     
+    def _create_feed_service(self, account_sid: str) -> Optional[TwilioService]:
+        """
+        Crea el TwilioService con el que sondea un feed en vivo
+        
+        El feed es de la cuenta y sobrevive a la sesión que lo abrió: usa el
+        token con el que se usó la cuenta más recientemente según el registro.
+        
+        Args:
+            account_sid: SID de la cuenta
+        
+        Returns:
+            TwilioService, o None si la cuenta no tiene credenciales vigentes
+        """
+        client = self.client_registry.get_latest_client(account_sid)
+        if client is None:
+            return None
+        return self._create_twilio_service(account_sid, client.password, client=client)
+    
     def get_messages(self):
         """
         Endpoint para obtener mensajes paginados con filtros
@@ -62,10 +198,21 @@ class MessageRoutes:
             - fecha_final: Fecha final (ISO format)
             - from: Número de origen
             - to: Número de destino
+            - from_to: Número como origen o destino (conversación, ambos sentidos)
+            - contraparte: Con from_to, limita la conversación a este otro número
             - sid: SID del mensaje
-            - body_search: Búsqueda por contenido del mensaje
+            - body_search: Búsqueda por contenido del mensaje (palabras por
+              prefijo, "frase exacta", sin distinguir acentos)
+            - status: Estado del mensaje (delivered, failed, ...)
+            - direction: 'inbound' u 'outbound'
+            - orden: 'relevancia' ordena los resultados de body_search por
+              relevancia cuando se responde desde el almacén local
             - service: Número del servicio (opcional)
-            
+            - cursor: Activa la paginación por cursor (vacío = primera página,
+              después el valor de next_cursor de la respuesta anterior)
+            - exact_count: Si es 1, total y total_pages son exactos cuando el
+              conteo ya está listo; si no, count_pending indica que sigue en curso
+        
         Returns:
             JSON con mensajes paginados
         """
@@ -85,40 +232,147 @@ class MessageRoutes:
         # Limpiar caché expirado periódicamente
         self.cache_service.clear_expired()
         
-        # Verificar caché
-        cache_key = dict(request.args)
-        cache_key['account_sid'] = session['account_sid']  # Incluir SID en caché
-        cached_response = self.cache_service.get(cache_key)
-        
-        if cached_response:
-            return jsonify(cached_response)
-        
         # Parsear parámetros de paginación
-        page = int(request.args.get("page", 1))
-        per_page = min(
-            int(request.args.get("per_page", Config.DEFAULT_MESSAGES_PER_PAGE)),
-            Config.MAX_MESSAGES_PER_PAGE
-        )
+        try:
+            page, per_page = self._parse_pagination(request.args)
+        except ValueError as e:
+            return jsonify({
+                'error': str(e),
+                'mensajes': [],
+                'page': 1,
+                'per_page': Config.DEFAULT_MESSAGES_PER_PAGE,
+                'total': 0,
+                'total_pages': 0,
+                'has_more': False
+            }), 400
         
         # Parsear filtros
         filters = self._parse_filters(request.args)
+        cursor = request.args.get('cursor') if 'cursor' in request.args else None
+        exact_count = request.args.get('exact_count') == '1'  # Se superpone aparte
+        order_by_relevance = bool(filters.body_search) and request.args.get('orden') == 'relevancia'
         
-        # Obtener mensajes
-        try:
-            response = twilio_service.get_paginated_messages(
-                filters,
-                page,
-                per_page
-            )
+        # Clave sobre los filtros normalizados, no sobre los parámetros crudos
+        cache_key = {
+            'mensajes': filters.fingerprint(),
+            'account_sid': session['account_sid'],
+            'page': page if cursor is None else None,
+            'per_page': per_page,
+            'cursor': cursor,
+            'relevancia': order_by_relevance
+        }
+        # Los webhooks invalidan sólo las búsquedas de los números y fechas que tocan
+        scope = cache_scope(session['account_sid'], filters)
+        flight_key = generate_cache_key(cache_key)
+        
+        # Cambiar de filtros descarta las precargas pendientes de la búsqueda anterior
+        owner = session.get('session_id') or session['account_sid']
+        search_key = generate_cache_key({**cache_key, 'page': None, 'cursor': None})
+        self.page_prefetcher.set_search(owner, search_key)
+        
+        def fetch_page(key: dict, page_number: int, page_cursor: Optional[str]) -> EncodedResponse:
+            """Consulta Twilio (o el almacén local) y guarda el resultado serializado en caché"""
+            started = time.time()
+            if page_cursor is not None:
+                # Modo cursor: cada página retoma donde terminó la anterior
+                response = twilio_service.get_messages_by_cursor(
+                    filters,
+                    per_page,
+                    page_cursor or None
+                )
+            else:
+                response = twilio_service.get_paginated_messages(
+                    filters,
+                    page_number,
+                    per_page,
+                    order_by_relevance=order_by_relevance
+                )
             
-            response_dict = response.to_dict()
+            with metrics.timed('serialize'):
+                encoded = EncodedResponse(response.to_payload())
+            self.cache_service.set(key, encoded, scope=scope, computed_at=started)
+            return encoded
+        
+        def fetch_and_cache() -> EncodedResponse:
+            """Página pedida"""
+            return fetch_page(cache_key, page, cursor)
+        
+        def prefetch_next(encoded: EncodedResponse) -> None:
+            """Precarga la página siguiente: el clic en "siguiente" será un acierto de caché"""
+            if not encoded.data.get('has_more'):
+                return
             
-            # Guardar en caché
-            self.cache_service.set(cache_key, response_dict)
+            if cursor is None:
+                next_page, next_cursor = page + 1, None
+            else:
+                next_page, next_cursor = None, encoded.data.get('next_cursor')
+                if not next_cursor:
+                    return
             
-            return jsonify(response_dict)
+            next_key = {**cache_key, 'page': next_page, 'cursor': next_cursor}
+            if self.cache_service.has(next_key):
+                return
+            
+            next_flight = generate_cache_key(next_key)
+            self.page_prefetcher.schedule(
+                owner,
+                search_key,
+                next_flight,
+                # Si el clic llega antes de que termine, se une a esta misma consulta
+                lambda: self.request_coalescer.do(
+                    next_flight,
+                    lambda: fetch_page(next_key, next_page, next_cursor)
+                )
+            )
+        
+        # Verificar caché (una entrada obsoleta se sirve mientras se refresca)
+        cached_response, is_stale = self.cache_service.get_with_staleness(cache_key)
+        metrics.cache_lookup('pages', 'miss' if not cached_response else 'stale' if is_stale else 'hit')
+        
+        if cached_response:
+            if is_stale:
+                self.request_coalescer.do_async(flight_key, fetch_and_cache)
+            prefetch_next(cached_response)
+            if exact_count:
+                cached_response = self._with_exact_count(
+                    cached_response, twilio_service, filters, cache_key, scope
+                )
+            return etag_response(cached_response)
+        
+        # Obtener mensajes: peticiones idénticas concurrentes comparten una sola consulta
+        try:
+            encoded = self.request_coalescer.do(flight_key, fetch_and_cache)
+            prefetch_next(encoded)
+            if exact_count:
+                encoded = self._with_exact_count(encoded, twilio_service, filters, cache_key, scope)
             
+            return etag_response(encoded)
+        
+        except ValueError as e:
+            return jsonify({
+                "error": str(e),
+                "mensajes": [],
+                "page": page,
+                "per_page": per_page,
+                "total": 0,
+                "total_pages": 0,
+                "has_more": False
+            }), 400
+        
         except Exception as e:
+            self._forget_if_rejected(e)
+            if is_rate_limit_error(e):
+                # Mejor una respuesta lenta que "0 mensajes": el cliente puede reintentar
+                return jsonify({
+                    "error": "Twilio está limitando las consultas de la cuenta, intenta de nuevo en unos segundos",
+                    "mensajes": [],
+                    "page": page,
+                    "per_page": per_page,
+                    "total": 0,
+                    "total_pages": 0,
+                    "has_more": False
+                }), 503, self._retry_after_header(e)
+            
             return jsonify({
                 "error": f"Error al consultar mensajes: {str(e)}",
                 "mensajes": [],
@@ -129,6 +383,232 @@ class MessageRoutes:
                 "has_more": False
             }), 500
     
+    def _with_exact_count(self, encoded: EncodedResponse, twilio_service: TwilioService,
+                          filters: MessageFilter, cache_key: dict,
+                          scope: CacheScope) -> EncodedResponse:
+        """
+        Sustituye el total estimado por el conteo exacto si ya está disponible
+        
+        El conteo se guarda aparte del caché de páginas, así una página cacheada
+        recibe el total en cuanto el trabajo de conteo termina. La variante
+        serializada se guarda en caché junto a la página (compartida entre
+        workers con el backend sqlite) y sólo se vuelve a serializar si cambia
+        la página o el conteo.
+        
+        Args:
+            encoded: Respuesta paginada serializada (no se modifica)
+            twilio_service: Servicio con el que se cuentan los días pendientes
+            filters: Filtros de la búsqueda
+            cache_key: Clave de caché de la página
+            scope: Scope de invalidación de la página
+        
+        Returns:
+            Respuesta con total exacto o count_pending
+        """
+        if encoded.data.get('total_exact'):
+            return encoded
+        
+        count = self.count_service.get_count(session['account_sid'], twilio_service, filters)
+        
+        if not count['exact']:
+            overrides = {'count_pending': True}
+        else:
+            per_page = encoded.data['per_page']
+            overrides = {
+                'total': count['total'],
+                'total_pages': (count['total'] + per_page - 1) // per_page,
+                'unique_users': count['unique_users'],
+                'total_exact': True
+            }
+        
+        variant_key = {**cache_key, 'variante': 'exact_count'}
+        cached_variant = self.cache_service.get(variant_key)
+        variant = encoded.with_overrides(overrides, cached_variant)
+        if variant is not encoded and variant is not cached_variant:
+            self.cache_service.set(variant_key, variant, scope=scope)
+        return variant
+    
+    def count_messages(self):
+        """
+        Endpoint para consultar el conteo exacto de una búsqueda
+        
+        Acepta los mismos filtros que /mensajes. Si el conteo todavía no está
+        listo, lanza (o sigue) el trabajo en segundo plano y reporta el avance.
+        
+        Query Parameters:
+            - per_page: Mensajes por página para calcular total_pages (default: 50)
+            - Filtros: fecha_inicio, fecha_final, from, to, from_to, contraparte,
+              sid, body_search, status, direction
+        
+        Returns:
+            JSON con total, total_pages, unique_users, exact, days_done y days_total
+        """
+        twilio_service = self._get_twilio_service()
+        if not twilio_service:
+            return jsonify({'error': 'No autenticado'}), 401
+        
+        try:
+            _, per_page = self._parse_pagination(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        filters = self._parse_filters(request.args)
+        
+        count = self.count_service.get_count(session['account_sid'], twilio_service, filters)
+        if count['exact']:
+            count['total_pages'] = (count['total'] + per_page - 1) // per_page
+        else:
+            count['total_pages'] = None
+        
+        return jsonify(count)
+    
+    def _forget_if_rejected(self, error: Exception) -> None:
+        """Si Twilio rechazó las credenciales de la sesión (p. ej. token rotado), el próximo login las vuelve a verificar"""
+        if is_auth_error(error):
+            self.credential_cache.forget(session['account_sid'], session['auth_token'])
+    
+    @staticmethod
+    def _retry_after_header(error: Exception) -> dict:
+        """Encabezado Retry-After para una respuesta 503 por límite de Twilio"""
+        retry_after = retry_after_seconds(error)
+        return {'Retry-After': str(max(math.ceil(retry_after or 0), 1))}
+    
+    def export_messages(self):
+        """
+        Endpoint para exportar todos los mensajes que cumplen los filtros
+        
+        Acepta los mismos filtros que /mensajes (sin paginación). La respuesta se
+        genera en streaming desde el almacén local o desde Twilio, y se comprime
+        con gzip si el cliente lo acepta.
+        
+        Query Parameters:
+            - format: 'csv' (default) o 'ndjson'
+            - Filtros: fecha_inicio, fecha_final, from, to, from_to, contraparte,
+              sid, body_search, status, direction
+        
+        Returns:
+            Archivo CSV o NDJSON en streaming
+        """
+        twilio_service = self._get_twilio_service()
+        if not twilio_service:
+            return jsonify({'error': 'No autenticado'}), 401
+        
+        try:
+            exporter = MessageExporter(request.args.get('format', 'csv'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        filters = self._parse_filters(request.args)
+        messages = twilio_service.iter_messages(filters)
+        
+        # Leer el primer mensaje antes de responder: así un error de Twilio
+        # todavía puede devolverse con su código HTTP en lugar de cortar el archivo
+        try:
+            first = next(messages, None)
+        except Exception as e:
+            self._forget_if_rejected(e)
+            if is_rate_limit_error(e):
+                return jsonify({
+                    'error': "Twilio está limitando las consultas de la cuenta, intenta de nuevo en unos segundos"
+                }), 503, self._retry_after_header(e)
+            return jsonify({'error': f"Error al exportar mensajes: {str(e)}"}), 500
+        
+        if first is not None:
+            messages = chain([first], messages)
+        chunks = exporter.iter_chunks(messages)
+        
+        filename = f"twilio_mensajes_{datetime.now().strftime('%Y-%m-%d')}.{exporter.extension}"
+        headers = {
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+            'Vary': 'Accept-Encoding'
+        }
+        
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            chunks = MessageExporter.gzip_chunks(chunks)
+            headers['Content-Encoding'] = 'gzip'
+        
+        return Response(
+            stream_with_context(chunks),
+            content_type=exporter.content_type,
+            headers=headers
+        )
+    
+    def stream_messages(self):
+        """
+        Endpoint SSE con los mensajes nuevos que cumplen los filtros
+        
+        Todos los clientes con la misma cuenta y filtros comparten un único
+        sondeo a Twilio. Cada evento 'mensajes' trae un lote con el mismo
+        formato que /mensajes (del más antiguo al más reciente). Al reconectar,
+        el navegador envía Last-Event-ID y se reenvían los mensajes recientes
+        desde ese punto (el cliente descarta los SID que ya tiene).
+        
+        Query Parameters:
+            - Filtros: los mismos que /mensajes
+        
+        Returns:
+            Stream text/event-stream, o 503 si el worker ya tiene el máximo de clientes
+        """
+        if 'account_sid' not in session or 'auth_token' not in session:
+            return jsonify({'error': 'No autenticado'}), 401
+        
+        account_sid = session['account_sid']
+        auth_token = session['auth_token']
+        filters = self._parse_filters(request.args)
+        
+        if self.client_registry is not None:
+            # El token de esta sesión pasa a ser el más reciente de la cuenta
+            self.client_registry.get_client(account_sid, auth_token)
+            service_factory = lambda: self._create_feed_service(account_sid)
+        else:
+            service_factory = lambda: self._create_twilio_service(account_sid, auth_token)
+        
+        try:
+            subscription = self.live_feed.subscribe(
+                account_sid,
+                filters,
+                service_factory,
+                last_event_id=request.headers.get('Last-Event-ID')
+            )
+        except LiveFeedFull as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+        
+        events = subscription.iter_events(
+            heartbeat_seconds=Config.LIVE_FEED_HEARTBEAT_SECONDS,
+            max_seconds=Config.LIVE_FEED_MAX_STREAM_SECONDS
+        )
+        response = Response(events, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Sin buffer en proxies (nginx/Render)
+        })
+        # Se ejecuta aunque el cliente se desconecte antes del primer evento
+        response.call_on_close(lambda: self.live_feed.unsubscribe(subscription))
+        return response
+    
+    @staticmethod
+    def _parse_pagination(args) -> tuple[int, int]:
+        """
+        Parsea page y per_page (per_page se limita a MAX_MESSAGES_PER_PAGE)
+        
+        Args:
+            args: Argumentos de la petición (request.args)
+        
+        Returns:
+            Tupla (page, per_page)
+        
+        Raises:
+            ValueError: Si alguno no es un entero mayor que cero
+        """
+        try:
+            page = int(args.get("page", 1))
+            per_page = int(args.get("per_page", Config.DEFAULT_MESSAGES_PER_PAGE))
+        except ValueError:
+            raise ValueError("page y per_page deben ser números enteros")
+        
+        if page < 1 or per_page < 1:
+            raise ValueError("page y per_page deben ser mayores que cero")
+        return page, min(per_page, Config.MAX_MESSAGES_PER_PAGE)
+    
     def _parse_filters(self, args) -> MessageFilter:
         """
         Parsea los parámetros de consulta a un objeto MessageFilter
@@ -144,11 +624,42 @@ class MessageRoutes:
         if fecha_final:
             fecha_final += timedelta(hours=Config.TIMEZONE_OFFSET_HOURS)
         
+        body_search = (args.get("body_search") or '').strip()
+        direction = (args.get("direction") or '').strip().lower()
+        
         return MessageFilter(
-            sid=args.get("sid"),
+            sid=(args.get("sid") or '').strip() or None,
             fecha_inicio=parse_datetime(args.get("fecha_inicio")),
             fecha_final=fecha_final,
-            numero_from=args.get("from"),
-            numero_to=args.get("to"),
-            body_search=args.get("body_search")  # Nuevo parámetro
-        )
\ No newline at end of file
+            numero_from=self._normalize_number(args.get("from")),
+            numero_to=self._normalize_number(args.get("to")),
+            body_search=body_search or None,  # Nuevo parámetro
+            numero_from_to=self._normalize_number(args.get("from_to")),
+            numero_contraparte=self._normalize_number(args.get("contraparte")),
+            status=(args.get("status") or '').strip().lower() or None,
+            direction=direction if direction in ('inbound', 'outbound') else None
+        )
+    
+    @staticmethod
+    def _normalize_number(number: Optional[str]) -> Optional[str]:
+        """
+        Normaliza un número de filtro al formato de Twilio ("whatsapp:+52...")
+        
+        Misma regla que el frontend: sin prefijo se asume WhatsApp. Un "+" que
+        llegó sin codificar en la URL se convierte en espacio: se restituye.
+        
+        Args:
+            number: Número tal como llegó en la petición
+        
+        Returns:
+            Número normalizado, o None si viene vacío
+        """
+        if not number or not number.strip():
+            return None
+        
+        number = ''.join(number.split())
+        if number.startswith('whatsapp:'):
+            number = number[len('whatsapp:'):]
+        if number.isdigit():
+            number = f"+{number}"
+        return f"whatsapp:{number}"
\ No newline at end of file
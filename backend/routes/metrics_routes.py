@@ -0,0 +1,115 @@
+"""
+Rutas HTTP para métricas (Prometheus) y tiempos por petición (Server-Timing)
+"""
+from flask import Blueprint, Response, request, g
+import hmac
+
+from ..services import metrics
+from ..services.cache_service import CacheService
+
+
+class MetricsRoutes:
+    """
+    Controlador de /metrics
+    
+    Además mide todas las peticiones de la app: al terminar cada una vuelca
+    sus tiempos por etapa en los histogramas y, si está activo, los agrega
+    a la respuesta en el encabezado Server-Timing (visible en las DevTools).
+    """
+    
+    def __init__(self, cache_service: CacheService, token: str = '',
+                 server_timing: bool = True):
+        """
+        Inicializa las rutas de métricas
+        
+        Args:
+            cache_service: Caché cuyos aciertos se exportan
+            token: Bearer token requerido por /metrics (vacío = /metrics no se publica)
+            server_timing: Agregar el encabezado Server-Timing a las respuestas
+        """
+        self.cache_service = cache_service
+        self.token = token
+        self.server_timing = server_timing
+        metrics.REGISTRY.add_collector(self._cache_metrics)
+        self.blueprint = Blueprint('metrics', __name__)
+        self._register_routes()
+    
+    def _register_routes(self):
+        """Registra la ruta del blueprint y la medición de todas las peticiones"""
+        # Sin token no hay /metrics (404): un despliegue público no lo expone por omisión
+        if self.token:
+            self.blueprint.add_url_rule(
+                '/metrics',
+                'metrics',
+                self.metrics,
+                methods=['GET']
+            )
+        self.blueprint.before_app_request(self._begin_request)
+        self.blueprint.after_app_request(self._observe_request)
+        self.blueprint.teardown_app_request(self._end_request)
+    
+    def metrics(self):
+        """
+        Endpoint con las métricas del worker en formato de texto de Prometheus
+        
+        Returns:
+            text/plain con histogramas por etapa, llamadas a Twilio y aciertos de caché
+        """
+        expected = f'Bearer {self.token}'
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return Response('No autorizado\n', status=401, mimetype='text/plain')
+        
+        return Response(
+            metrics.REGISTRY.render(),
+            mimetype='text/plain; version=0.0.4',
+            headers={'Cache-Control': 'no-store'}
+        )
+    
+    @staticmethod
+    def _begin_request():
+        """Empieza a medir la petición"""
+        g.metrics_token = metrics.begin_request()
+    
+    def _observe_request(self, response: Response) -> Response:
+        """Vuelca los tiempos de la petición y agrega Server-Timing"""
+        timings = metrics.current_timings()
+        if timings is None or request.endpoint in (None, 'metrics.metrics', 'static', 'static_files'):
+            return response
+        
+        metrics.observe_request(timings, request.endpoint, response.status_code)
+        if self.server_timing:
+            response.headers['Server-Timing'] = timings.server_timing()
+        return response
+    
+    @staticmethod
+    def _end_request(error=None):
+        """Deja de medir la petición"""
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            metrics.end_request(token)
+    
+    def _cache_metrics(self) -> list[str]:
+        """Aciertos del CacheService (todas las entradas: páginas, ventanas, conteos)"""
+        stats = self.cache_service.stats()
+        lines = metrics.gauge_lines(
+            'twilio_monitor_cache_service_lookups_total',
+            'Consultas al CacheService por resultado',
+            {
+                ('hit',): stats['hits'],
+                ('stale',): stats['stale_hits'],
+                ('miss',): stats['misses']
+            },
+            ('result',),
+            metric_type='counter'
+        )
+        lines += metrics.gauge_lines(
+            'twilio_monitor_cache_service_hit_ratio',
+            'Fracción de consultas al CacheService servidas desde caché',
+            {(): stats['hit_ratio']}
+        )
+        lines += metrics.gauge_lines(
+            'twilio_monitor_cache_service_entries',
+            'Entradas en el CacheService',
+            {(): self.cache_service.size()}
+        )
+        return lines
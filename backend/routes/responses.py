@@ -0,0 +1,30 @@
+"""
+Respuestas HTTP comunes a los controladores
+"""
+from flask import Response, request
+
+from ..utils.json_utils import EncodedResponse
+
+
+def etag_response(encoded: EncodedResponse, cache_control: str = 'no-cache') -> Response:
+    """
+    Sirve una respuesta ya serializada con su ETag
+    
+    Si el cliente ya tiene esa versión (If-None-Match) responde 304 sin cuerpo.
+    Con no-cache el navegador revalida en cada petición.
+    
+    Args:
+        encoded: Respuesta serializada
+        cache_control: Valor de Cache-Control
+    
+    Returns:
+        Respuesta 200 con el JSON o 304 Not Modified
+    """
+    if request.if_none_match.contains(encoded.etag):
+        response = Response(status=304)
+    else:
+        response = Response(encoded.body, mimetype='application/json')
+    
+    response.set_etag(encoded.etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,127 @@
+"""
+Rutas HTTP para los webhooks de Twilio (mensajes entrantes y status callbacks)
+"""
+from flask import Blueprint, Response, request, jsonify
+from twilio.request_validator import RequestValidator
+from typing import Optional
+
+from ..models.message import Message
+from ..services.webhook_ingestor import WebhookIngestor
+from ..config import Config
+
+
+# Respuesta TwiML vacía: el mensaje entrante no recibe contestación automática
+_EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
+# Estados de los mensajes recibidos por el número de la cuenta
+_INBOUND_STATUSES = {'receiving', 'received'}
+
+
+class WebhookRoutes:
+    """Controlador de rutas para webhooks de Twilio"""
+    
+    def __init__(self, ingestor: WebhookIngestor, auth_tokens: dict[str, str],
+                 base_url: str = ''):
+        """
+        Inicializa las rutas de webhooks
+        
+        Args:
+            ingestor: Cola de ingesta por lotes
+            auth_tokens: Token de cada cuenta, para validar X-Twilio-Signature
+            base_url: URL pública del servidor (vacío = la de la petición)
+        """
+        self.ingestor = ingestor
+        self.base_url = base_url.rstrip('/')
+        self._validators = {
+            account_sid: RequestValidator(token)
+            for account_sid, token in auth_tokens.items()
+        }
+        self.blueprint = Blueprint('webhooks', __name__)
+        self._register_routes()
+    
+    def _register_routes(self):
+        """Registra todas las rutas del blueprint"""
+        self.blueprint.add_url_rule(
+            '/webhooks/twilio/mensajes',
+            'receive_message_event',
+            self.receive_message_event,
+            methods=['POST']
+        )
+    
+    def receive_message_event(self):
+        """
+        Endpoint para el webhook de mensajes entrantes y el status callback
+        
+        Configurar en Twilio la misma URL para "A message comes in" y para
+        StatusCallback. El evento se valida con la firma de la cuenta y se
+        encola; el almacén y el caché se actualizan por lotes.
+        
+        Returns:
+            TwiML vacío (200), 403 si la firma no es válida o 503 si la cola está llena
+        """
+        account_sid = request.form.get('AccountSid', '')
+        validator = self._validators.get(account_sid)
+        signature = request.headers.get('X-Twilio-Signature', '')
+        
+        if validator is None or not validator.validate(self._public_url(), request.form, signature):
+            return jsonify({'error': 'Firma de Twilio inválida'}), 403
+        
+        message = self._message_from_form(request.form)
+        if message is None:
+            return jsonify({'error': 'Falta MessageSid'}), 400
+        
+        if not self.ingestor.submit(account_sid, message):
+            # Twilio reintenta los webhooks que fallan (según la configuración de la cuenta)
+            return jsonify({'error': 'Ingesta saturada'}), 503, {'Retry-After': '5'}
+        
+        return Response(_EMPTY_TWIML, mimetype='text/xml')
+    
+    def _public_url(self) -> str:
+        """
+        URL con la que Twilio firmó la petición
+        
+        Detrás de un proxy (Render) la petición llega por http: se usa
+        WEBHOOK_BASE_URL o, en su defecto, el esquema de X-Forwarded-Proto.
+        """
+        path = request.full_path.rstrip('?')
+        if self.base_url:
+            return f"{self.base_url}{path}"
+        
+        scheme = request.headers.get('X-Forwarded-Proto', request.scheme)
+        return f"{scheme}://{request.host}{path}"
+    
+    @staticmethod
+    def _message_from_form(form) -> Optional[Message]:
+        """
+        Convierte los parámetros del webhook a Message
+        
+        Los status callbacks no traen Body ni fecha: los campos que faltan
+        quedan en None y el almacén conserva lo que ya tenía. Un mensaje nuevo
+        queda sin fecha (como los que están en cola) hasta que la
+        sincronización traiga la de Twilio. Sólo los estados de recepción
+        dicen el sentido; con los demás queda en None y lo completa la
+        sincronización (apply_updates no pisa un sentido ya guardado).
+        
+        Args:
+            form: Parámetros POST del webhook
+        
+        Returns:
+            Mensaje parcial, o None si falta el SID
+        """
+        sid = form.get('MessageSid') or form.get('SmsSid')
+        if not sid:
+            return None
+        
+        status = form.get('MessageStatus') or form.get('SmsStatus')
+        # El subtipo de un saliente (outbound-api, outbound-reply...) no viene en el webhook
+        direction = 'inbound' if status in _INBOUND_STATUSES else None
+        
+        return Message(
+            sid=sid,
+            from_number=form.get('From', ''),
+            to_number=form.get('To', ''),
+            body=form.get('Body'),
+            status=status,
+            direction=direction,
+            date_sent=None
+        )
@@ -0,0 +1,120 @@
+"""
+Motor asíncrono de consultas a Twilio (AsyncTwilioHttpClient / aiohttp)
+"""
+import asyncio
+from twilio.rest import Client
+from typing import AsyncIterator, Iterator, Optional
+import logging
+
+from ..models.message import Message
+from ..utils.async_utils import get_background_loop
+from ..utils.twilio_errors import is_rate_limit_error
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTwilioService:
+    """
+    Consulta mensajes de Twilio con I/O asíncrono
+    
+    Mientras se procesa una página ya se está descargando la siguiente, y un
+    solo event loop por worker atiende a todos los usuarios concurrentes.
+    """
+    
+    def __init__(self, client: Client, timezone_offset_hours: int = 0,
+                 page_size: int = 100):
+        """
+        Args:
+            client: Cliente de Twilio creado con AsyncTwilioHttpClient
+            timezone_offset_hours: Horas a restar para ajuste de zona horaria
+            page_size: Tamaño de página para consultas a Twilio
+        """
+        self._client = client
+        self._timezone_offset = timezone_offset_hours
+        self._page_size = page_size
+    
+    async def get_message_by_sid(self, sid: str) -> Optional[Message]:
+        """
+        Obtiene un mensaje específico por su SID
+        
+        Args:
+            sid: SID del mensaje
+            
+        Returns:
+            Mensaje encontrado o None si no existe
+        """
+        try:
+            twilio_msg = await self._client.messages(sid).fetch_async()
+            return Message.from_twilio_message(twilio_msg, self._timezone_offset)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                raise
+            logger.error(f"Error al obtener mensaje con SID {sid}: {e}")
+            return None
+    
+    async def iter_pages(self, twilio_params: dict,
+                         limit: Optional[int] = None) -> AsyncIterator[list[Message]]:
+        """
+        Recorre las páginas de Twilio descargando la siguiente por adelantado
+        
+        Args:
+            twilio_params: Parámetros de filtro para Twilio
+            limit: Máximo de mensajes a entregar
+            
+        Returns:
+            Generador asíncrono de páginas (listas de mensajes)
+        """
+        twilio_page = await self._client.messages.page_async(
+            page_size=self._page_size,
+            **twilio_params
+        )
+        delivered = 0
+        next_page_task = None
+        
+        try:
+            while twilio_page is not None:
+                if twilio_page.next_page_url:
+                    next_page_task = asyncio.ensure_future(twilio_page.next_page_async())
+                else:
+                    next_page_task = None
+                
+                with metrics.timed('convert'):
+                    messages = [
+                        Message.from_twilio_message(twilio_msg, self._timezone_offset)
+                        for twilio_msg in twilio_page
+                    ]
+                if limit is not None:
+                    messages = messages[:limit - delivered]
+                delivered += len(messages)
+                
+                yield messages
+                
+                if next_page_task is None or (limit is not None and delivered >= limit):
+                    break
+                
+                twilio_page = await next_page_task
+                next_page_task = None
+        finally:
+            if next_page_task is not None and not next_page_task.done():
+                next_page_task.cancel()
+    
+    def iter_messages_blocking(self, twilio_params: dict,
+                               limit: Optional[int] = None) -> Iterator[Message]:
+        """
+        Fachada síncrona: recorre los mensajes desde un hilo de Flask
+        
+        Las descargas ocurren en el event loop compartido; el hilo que llama
+        sólo espera cada página.
+        
+        Args:
+            twilio_params: Parámetros de filtro para Twilio
+            limit: Máximo de mensajes a leer
+            
+        Returns:
+            Iterador síncrono de mensajes
+        """
+        loop = get_background_loop()
+        for messages in loop.iterate(self.iter_pages(twilio_params, limit)):
+            yield from messages
\ No newline at end of file
@@ -0,0 +1,374 @@
+"""
+Backends de almacenamiento para CacheService
+"""
+import heapq
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Any
+
+
+class CacheBackend(ABC):
+    """Interfaz común de los backends de caché"""
+    
+    name = 'base'
+    
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Obtiene un valor vigente o None"""
+    
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl_seconds: float,
+            size: Optional[int] = None) -> None:
+        """
+        Guarda un valor con su tiempo de vida
+        
+        Args:
+            key: Clave
+            value: Valor a guardar
+            ttl_seconds: Tiempo de vida en segundos
+            size: Tamaño aproximado en bytes si se conoce (None = se calcula)
+        """
+    
+    @abstractmethod
+    def update(self, key: str, updater: Callable[[Optional[Any]], Any],
+               ttl_seconds: float) -> None:
+        """
+        Reemplaza un valor por updater(valor actual) de forma atómica
+        
+        Ningún otro set o update sobre el backend (de este u otro worker, si
+        se comparte) se intercala entre la lectura y la escritura.
+        
+        Args:
+            key: Clave
+            updater: Recibe el valor vigente (o None) y retorna el nuevo
+            ttl_seconds: Tiempo de vida del nuevo valor
+        """
+    
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Elimina una entrada si existe"""
+    
+    @abstractmethod
+    def clear_expired(self) -> int:
+        """Elimina las entradas expiradas y retorna cuántas se eliminaron"""
+    
+    @abstractmethod
+    def clear(self) -> None:
+        """Elimina todas las entradas"""
+    
+    @abstractmethod
+    def size(self) -> int:
+        """Número de entradas almacenadas"""
+    
+    @abstractmethod
+    def stats(self) -> dict:
+        """Estadísticas propias del backend (entradas, bytes, desalojos)"""
+
+
+def _sizeof(value: Any) -> int:
+    """Tamaño aproximado en bytes de un valor sin pista de tamaño (serializándolo)"""
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Caché en memoria del proceso con límite LRU por entradas y bytes
+    
+    La expiración usa un heap por fecha de vencimiento, así clear_expired()
+    sólo toca las entradas vencidas en lugar de recorrer todo el caché.
+    """
+    
+    name = 'memory'
+    
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Máximo de entradas antes de desalojar (LRU)
+            max_bytes: Máximo de bytes antes de desalojar (LRU)
+        """
+        self._entries: OrderedDict[str, tuple[Any, float, int]] = OrderedDict()
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            value, expires_at, _ = entry
+            if time.time() > expires_at:
+                self._remove(key)
+                return None
+            
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any, ttl_seconds: float,
+            size: Optional[int] = None) -> None:
+        if size is None:
+            size = _sizeof(value)
+        expires_at = time.time() + ttl_seconds
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            
+            while self._entries and (
+                len(self._entries) > self._max_entries or self._bytes > self._max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._evictions += 1
+            
+            # Compactar el heap si acumula demasiadas referencias obsoletas
+            if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+                self._expiry_heap = [
+                    (entry[1], k) for k, entry in self._entries.items()
+                ]
+                heapq.heapify(self._expiry_heap)
+    
+    def update(self, key: str, updater: Callable[[Optional[Any]], Any],
+               ttl_seconds: float) -> None:
+        with self._lock:
+            self.set(key, updater(self.get(key)), ttl_seconds)
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def clear_expired(self) -> int:
+        now = time.time()
+        removed = 0
+        
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] < now:
+                expires_at, key = heapq.heappop(self._expiry_heap)
+                entry = self._entries.get(key)
+                # La referencia del heap puede ser de una versión ya reemplazada
+                if entry is not None and entry[1] == expires_at:
+                    self._remove(key)
+                    removed += 1
+        
+        return removed
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._expiry_heap.clear()
+            self._bytes = 0
+    
+    def size(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'evictions': self._evictions
+        }
+    
+    def _remove(self, key: str) -> None:
+        """Elimina una entrada actualizando el contador de bytes"""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Caché compartido entre procesos sobre un archivo SQLite (modo WAL)
+    
+    Permite que todos los workers de gunicorn compartan los aciertos.
+    Los valores se serializan con pickle: el archivo debe vivir en un
+    directorio al que sólo tenga acceso la aplicación.
+    """
+    
+    name = 'sqlite'
+    
+    # Precisión de last_access: un acierto sólo escribe si el valor guardado es
+    # más antiguo, así las lecturas no compiten por el bloqueo de escritura
+    LAST_ACCESS_RESOLUTION_SECONDS = 60
+    
+    def __init__(self, db_path: str, max_entries: int = 1000,
+                 max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            db_path: Ruta del archivo SQLite compartido
+            max_entries: Máximo de entradas antes de desalojar (LRU)
+            max_bytes: Máximo de bytes antes de desalojar (LRU)
+        """
+        self._db_path = str(db_path)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._evictions = 0
+        self._local = threading.local()
+        
+        Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache (expires_at);
+            CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access);
+        """)
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión del hilo actual en modo autocommit"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, expires_at, last_access FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        value, expires_at, last_access = row
+        now = time.time()
+        if now > expires_at:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        
+        if now - last_access > self.LAST_ACCESS_RESOLUTION_SECONDS:
+            conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+        return pickle.loads(value)
+    
+    def set(self, key: str, value: Any, ttl_seconds: float,
+            size: Optional[int] = None) -> None:
+        # El tamaño guardado es el del blob, que hay que serializar igualmente
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._connection()
+        
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._write(conn, key, blob, ttl_seconds)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    def update(self, key: str, updater: Callable[[Optional[Any]], Any],
+               ttl_seconds: float) -> None:
+        conn = self._connection()
+        
+        # BEGIN IMMEDIATE toma el bloqueo de escritura antes de leer: los demás
+        # workers esperan y no se pierde ninguna actualización
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            current = None
+            if row is not None and time.time() <= row[1]:
+                current = pickle.loads(row[0])
+            blob = pickle.dumps(updater(current), protocol=pickle.HIGHEST_PROTOCOL)
+            self._write(conn, key, blob, ttl_seconds)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    def _write(self, conn: sqlite3.Connection, key: str, blob: bytes,
+               ttl_seconds: float) -> None:
+        """Guarda un valor serializado y desaloja si hace falta (dentro de una transacción)"""
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access, size) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, blob, now + ttl_seconds, now, len(blob))
+        )
+        self._evict(conn)
+    
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Desaloja las entradas menos usadas hasta cumplir los límites"""
+        entries, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+        
+        if entries <= self._max_entries and total_bytes <= self._max_bytes:
+            return
+        
+        rows = conn.execute(
+            "SELECT key, size FROM cache ORDER BY last_access ASC"
+        )
+        to_delete = []
+        for key, size in rows:
+            if entries <= self._max_entries and total_bytes <= self._max_bytes:
+                break
+            to_delete.append((key,))
+            entries -= 1
+            total_bytes -= size
+        
+        conn.executemany("DELETE FROM cache WHERE key = ?", to_delete)
+        self._evictions += len(to_delete)
+    
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+    
+    def clear_expired(self) -> int:
+        cursor = self._connection().execute(
+            "DELETE FROM cache WHERE expires_at < ?", (time.time(),)
+        )
+        return cursor.rowcount
+    
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM cache")
+    
+    def size(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+    
+    def stats(self) -> dict:
+        entries, total_bytes = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+        return {
+            'entries': entries,
+            'bytes': total_bytes,
+            'evictions': self._evictions
+        }
+
+
+def create_cache_backend(backend_type: str, max_entries: int, max_bytes: int,
+                         sqlite_path: Optional[str] = None) -> CacheBackend:
+    """
+    Crea el backend de caché configurado
+    
+    Args:
+        backend_type: 'memory' (por proceso) o 'sqlite' (compartido entre workers)
+        max_entries: Máximo de entradas
+        max_bytes: Máximo de bytes
+        sqlite_path: Ruta del archivo para el backend 'sqlite'
+    
+    Returns:
+        Instancia del backend
+    """
+    if backend_type == 'sqlite':
+        return SQLiteCacheBackend(sqlite_path, max_entries=max_entries, max_bytes=max_bytes)
+    if backend_type == 'memory':
+        return MemoryCacheBackend(max_entries=max_entries, max_bytes=max_bytes)
+    raise ValueError(f"Backend de caché desconocido: {backend_type}")
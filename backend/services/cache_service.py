@@ -3,22 +3,71 @@ Servicio de caché para almacenar resultados de consultas
 """
 import hashlib
 import json
-from datetime import datetime, timedelta
-from typing import Optional, Any
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional, Any
+
+from .cache_backends import CacheBackend, MemoryCacheBackend
+
+
+def generate_cache_key(params: dict) -> str:
+    """
+    Genera una clave única basada en los parámetros
+    
+    Args:
+        params: Diccionario con los parámetros de consulta
+    
+    Returns:
+        Hash MD5 de los parámetros
+    """
+    key_str = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.md5(key_str.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class CacheScope:
+    """
+    Datos de los que depende una entrada, para invalidarla de forma selectiva
+    
+    Una entrada con scope deja de ser válida cuando, después de guardarse,
+    se invalida su cuenta completa, o su número (o "cualquier número" si la
+    entrada no filtra por número) con cambios en fechas que caen dentro de
+    su rango.
+    """
+    
+    namespace: str  # Cuenta
+    number: Optional[str] = None  # Número del que dependen los resultados (None = todos)
+    until: Optional[int] = None  # Fin del rango de fechas (epoch local; None = abierto)
 
 
 class CacheService:
     """Servicio para cachear consultas y reducir llamadas a la API"""
     
-    def __init__(self, ttl_seconds: int = 300):
+    # Marcas de invalidación recientes guardadas por número
+    MAX_INVALIDATION_MARKS = 16
+    
+    # Prefijo de las claves de entradas: se sube al cambiar el formato de lo que
+    # se guarda (pickle en el backend sqlite), así no se leen entradas viejas
+    KEY_PREFIX = 'v1:'
+    
+    def __init__(self, ttl_seconds: int = 300, backend: Optional[CacheBackend] = None,
+                 stale_ttl_seconds: int = 0):
         """
         Inicializa el servicio de caché
         
         Args:
             ttl_seconds: Tiempo de vida del caché en segundos
+            backend: Almacenamiento a usar (por defecto LRU en memoria)
+            stale_ttl_seconds: Segundos extra que una entrada expirada se puede
+                servir como obsoleta mientras se refresca (stale-while-revalidate)
         """
-        self._cache = {}
+        self._backend = backend or MemoryCacheBackend()
         self._ttl_seconds = ttl_seconds
+        self._stale_ttl_seconds = stale_ttl_seconds
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
     
     def _generate_key(self, params: dict) -> str:
         """
@@ -28,10 +77,9 @@ class CacheService:
             params: Diccionario con los parámetros de consulta
             
         Returns:
-            Hash MD5 de los parámetros
+            Hash MD5 de los parámetros, con KEY_PREFIX
         """
-        key_str = json.dumps(params, sort_keys=True, default=str)
-        return hashlib.md5(key_str.encode()).hexdigest()
+        return self.KEY_PREFIX + generate_cache_key(params)
     
     def get(self, params: dict) -> Optional[Any]:
         """
@@ -43,33 +91,162 @@ class CacheService:
         Returns:
             El valor cacheado o None si no existe o expiró
         """
-        key = self._generate_key(params)
+        value, is_stale = self._lookup(params)
         
-        if key not in self._cache:
+        if value is None or is_stale:
+            self._misses += 1
             return None
         
-        entry = self._cache[key]
-        age = (datetime.now() - entry['timestamp']).total_seconds()
+        self._hits += 1
+        return value
+    
+    def get_with_staleness(self, params: dict) -> tuple[Optional[Any], bool]:
+        """
+        Obtiene un valor del caché aunque haya expirado dentro de la ventana stale
         
-        if age > self._ttl_seconds:
-            del self._cache[key]
-            return None
+        Args:
+            params: Parámetros de consulta
+            
+        Returns:
+            Tupla (valor o None, True si el valor es obsoleto y debe refrescarse)
+        """
+        value, is_stale = self._lookup(params)
+        
+        if value is None:
+            self._misses += 1
+        elif is_stale:
+            self._stale_hits += 1
+        else:
+            self._hits += 1
+        
+        return value, is_stale
+    
+    def has(self, params: dict) -> bool:
+        """
+        Indica si hay una entrada vigente, sin contar acierto ni fallo
+        
+        Args:
+            params: Parámetros de consulta
+        
+        Returns:
+            True si get devolvería un valor
+        """
+        value, is_stale = self._lookup(params)
+        return value is not None and not is_stale
+    
+    def _lookup(self, params: dict) -> tuple[Optional[Any], bool]:
+        """
+        Busca la entrada y determina si sigue vigente
         
-        return entry['data']
+        Returns:
+            Tupla (valor o None, True si ya superó el TTL)
+        """
+        entry = self._backend.get(self._generate_key(params))
+        if entry is None:
+            return None, False
+        
+        scope = entry.get('scope')
+        if scope is not None and self._is_invalidated(scope, entry['timestamp']):
+            return None, False
+        
+        age = time.time() - entry['timestamp']
+        return entry['data'], age > entry.get('ttl', self._ttl_seconds)
     
-    def set(self, params: dict, value: Any) -> None:
+    def set(self, params: dict, value: Any, ttl_seconds: Optional[float] = None,
+            scope: Optional[CacheScope] = None, computed_at: Optional[float] = None,
+            stale_ttl_seconds: Optional[float] = None) -> None:
         """
         Almacena un valor en el caché
         
         Args:
             params: Parámetros de consulta (usados como clave)
             value: Valor a almacenar
+            ttl_seconds: Tiempo de vida de esta entrada (default: el del servicio)
+            scope: Datos de los que depende, para invalidate (None = sólo expira)
+            computed_at: Momento en que se empezó a calcular el valor (default:
+                ahora); una invalidación posterior lo descarta aunque llegue antes de set
+            stale_ttl_seconds: Ventana stale de esta entrada (default: la del servicio)
         """
         key = self._generate_key(params)
-        self._cache[key] = {
+        ttl = self._ttl_seconds if ttl_seconds is None else ttl_seconds
+        entry = {
             'data': value,
-            'timestamp': datetime.now()
+            'timestamp': time.time() if computed_at is None else computed_at,
+            'ttl': ttl,
+            'scope': scope
         }
+        stale = self._stale_ttl_seconds if stale_ttl_seconds is None else stale_ttl_seconds
+        # El backend conserva la entrada durante la ventana stale; los valores
+        # grandes dan su tamaño (nbytes) para no serializarlos sólo para medirlos
+        self._backend.set(key, entry, ttl + stale, size=getattr(value, 'nbytes', None))
+    
+    def invalidate(self, namespace: str, numbers: Optional[Iterable[str]] = None,
+                   since: Optional[int] = None) -> None:
+        """
+        Invalida las entradas con scope afectadas por cambios en los mensajes
+        
+        La marca de invalidación vive en el backend, así se comparte entre
+        workers; las entradas no se borran, se descartan al leerlas.
+        
+        Args:
+            namespace: Cuenta
+            numbers: Números de los mensajes que cambiaron (None = toda la cuenta)
+            since: Fecha más antigua de esos mensajes (epoch local; None = cualquiera)
+        """
+        if numbers is None:
+            keys = [f"invalidation:{namespace}"]
+        else:
+            # Las entradas sin filtro de número dependen de cualquier mensaje
+            keys = [self._number_key(namespace, None)]
+            keys += [self._number_key(namespace, number) for number in set(numbers)]
+        
+        now = time.time()
+        # Una marca sólo importa mientras viva alguna entrada anterior a ella
+        horizon = self._ttl_seconds + self._stale_ttl_seconds
+        
+        def add_mark(marks: Optional[list]) -> list:
+            marks = [mark for mark in (marks or []) if now - mark[0] <= horizon]
+            marks.append((now, since))
+            if len(marks) > self.MAX_INVALIDATION_MARKS:
+                # Se fusionan las dos más antiguas: la fusión invalida de más, nunca de menos
+                (_, first_since), (second_at, second_since) = marks[:2]
+                merged_since = None
+                if first_since is not None and second_since is not None:
+                    merged_since = min(first_since, second_since)
+                marks[:2] = [(second_at, merged_since)]
+            return marks
+        
+        # Atómico en el backend: dos workers que invalidan a la vez no pisan sus marcas
+        for key in keys:
+            self._backend.update(key, add_mark, horizon)
+    
+    def _is_invalidated(self, scope: CacheScope, timestamp: float) -> bool:
+        """Indica si hubo una invalidación que afecta a la entrada después de guardarla"""
+        keys = (
+            f"invalidation:{scope.namespace}",
+            self._number_key(scope.namespace, scope.number)
+        )
+        for key in keys:
+            for at, since in self._backend.get(key) or ():
+                if at <= timestamp:
+                    continue
+                if since is None or scope.until is None or since <= scope.until:
+                    return True
+        return False
+    
+    @staticmethod
+    def _number_key(namespace: str, number: Optional[str]) -> str:
+        """Clave de la marca de invalidación de un número (None = entradas sin filtro de número)"""
+        return f"invalidation:{namespace}:{number or '*'}"
+    
+    def delete(self, params: dict) -> None:
+        """
+        Elimina una entrada si existe
+        
+        Args:
+            params: Parámetros de consulta
+        """
+        self._backend.delete(self._generate_key(params))
     
     def clear_expired(self) -> int:
         """
@@ -78,23 +255,34 @@ class CacheService:
         Returns:
             Número de entradas eliminadas
         """
-        now = datetime.now()
-        keys_to_delete = []
-        
-        for key, entry in self._cache.items():
-            age = (now - entry['timestamp']).total_seconds()
-            if age > self._ttl_seconds:
-                keys_to_delete.append(key)
-        
-        for key in keys_to_delete:
-            del self._cache[key]
-        
-        return len(keys_to_delete)
+        return self._backend.clear_expired()
     
     def clear(self) -> None:
         """Limpia todo el caché"""
-        self._cache.clear()
+        self._backend.clear()
     
     def size(self) -> int:
         """Retorna el tamaño actual del caché"""
-        return len(self._cache)
+        return self._backend.size()
+    
+    def stats(self) -> dict:
+        """
+        Retorna las estadísticas del caché
+        
+        Los aciertos y fallos son del worker actual; entradas, bytes y
+        desalojos los reporta el backend.
+        
+        Returns:
+            Diccionario con contadores de aciertos, fallos y desalojos
+        """
+        lookups = self._hits + self._stale_hits + self._misses
+        
+        return {
+            'backend': self._backend.name,
+            'worker_pid': os.getpid(),
+            'hits': self._hits,
+            'stale_hits': self._stale_hits,
+            'misses': self._misses,
+            'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+            **self._backend.stats()
+        }
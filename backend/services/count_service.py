@@ -0,0 +1,179 @@
+"""
+Conteo exacto de mensajes y usuarios únicos por tramos de un día con caché
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+import logging
+
+from ..models.message import MessageFilter
+from .cache_service import CacheService
+from .request_coalescer import RequestCoalescer
+from .unique_user_counter import UniqueUserCounter
+from ..utils.distinct_counter import DistinctCounter
+
+
+logger = logging.getLogger(__name__)
+
+
+class CountService:
+    """
+    Calcula el total exacto de una búsqueda sumando conteos por día
+    
+    Cada día se cuenta una sola vez y se guarda en caché: los días cerrados no
+    vuelven a cambiar y se conservan mucho tiempo, mientras que el día en curso
+    se recuenta al expirar su TTL corto. Los días que faltan se cuentan en
+    segundo plano y el total se completa a medida que terminan.
+    
+    Junto al conteo de cada día se guarda el conjunto de números (exacto o
+    HyperLogLog) para obtener los usuarios únicos de cualquier rango
+    combinando días, sin volver a leer los mensajes.
+    """
+    
+    # Margen tras la medianoche antes de dar un día por cerrado
+    CLOSED_DAY_GRACE = timedelta(hours=1)
+    
+    def __init__(self, cache_service: CacheService, timezone_offset_hours: int = 0,
+                 open_day_ttl_seconds: int = 20, closed_day_ttl_seconds: int = 7 * 86400,
+                 max_parallel_days: int = 4, max_background_jobs: int = 2):
+        """
+        Args:
+            cache_service: Caché donde se guardan los conteos por día
+            timezone_offset_hours: Horas a restar para ajuste de zona horaria
+            open_day_ttl_seconds: TTL del conteo de un día que aún recibe mensajes
+            closed_day_ttl_seconds: TTL del conteo de un día cerrado
+            max_parallel_days: Días que un mismo trabajo cuenta en paralelo
+            max_background_jobs: Trabajos de conteo simultáneos por worker
+        """
+        self._cache = cache_service
+        self._timezone_offset = timezone_offset_hours
+        self._open_day_ttl = open_day_ttl_seconds
+        self._closed_day_ttl = closed_day_ttl_seconds
+        self._max_parallel_days = max_parallel_days
+        self._jobs = RequestCoalescer(max_background_workers=max_background_jobs)
+    
+    def get_count(self, account_sid: str, twilio_service, filters: MessageFilter) -> dict:
+        """
+        Devuelve el conteo disponible y lanza el trabajo para los días que faltan
+        
+        Args:
+            account_sid: SID de la cuenta (parte de la clave de caché)
+            twilio_service: Servicio con el que se cuentan los días pendientes
+            filters: Filtros de la búsqueda
+        
+        Returns:
+            Diccionario con total y unique_users (None si falta algún día),
+            exact, days_done y days_total
+        """
+        buckets = self.split_days(filters)
+        counted = 0
+        unique_users = UniqueUserCounter(filters)
+        missing = []
+        
+        for bucket in buckets:
+            stats = self._cache.get(self._cache_key(account_sid, bucket))
+            if not isinstance(stats, dict):
+                missing.append(bucket)
+                continue
+            counted += stats['count']
+            if not missing:
+                unique_users.numbers.merge(DistinctCounter.from_dict(stats['users']))
+        
+        if missing:
+            job_key = f"count:{account_sid}:{filters.fingerprint()}"
+            self._jobs.do_async(
+                job_key,
+                lambda: self._count_days(account_sid, twilio_service, missing)
+            )
+        
+        return {
+            'total': None if missing else counted,
+            'unique_users': None if missing else unique_users.count(),
+            'exact': not missing,
+            'days_done': len(buckets) - len(missing),
+            'days_total': len(buckets)
+        }
+    
+    def split_days(self, filters: MessageFilter) -> list[MessageFilter]:
+        """
+        Divide el rango de fechas de los filtros en tramos de un día (hora local)
+        
+        Sin fecha_inicio, todo lo anterior al mes en curso forma un único tramo
+        abierto: así se recuenta una vez al mes en lugar de cada día.
+        
+        Args:
+            filters: Filtros de la búsqueda
+        
+        Returns:
+            Filtros equivalentes, uno por tramo, del más antiguo al más reciente
+        """
+        now = self._local_now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        # fecha_final es inclusiva; los tramos son [inicio, fin)
+        if filters.fecha_final:
+            range_end = filters.fecha_final + timedelta(seconds=1)
+        else:
+            range_end = today + timedelta(days=1)
+        
+        buckets = []
+        if filters.fecha_inicio:
+            day_start = filters.fecha_inicio
+        else:
+            day_start = min(today.replace(day=1), range_end)
+            buckets.append(replace(
+                filters,
+                fecha_inicio=None,
+                fecha_final=day_start - timedelta(seconds=1)
+            ))
+        
+        while day_start < range_end:
+            next_day = day_start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            day_end = min(next_day, range_end)
+            buckets.append(replace(
+                filters,
+                fecha_inicio=day_start,
+                fecha_final=day_end - timedelta(seconds=1)
+            ))
+            day_start = day_end
+        
+        return buckets
+    
+    def _count_days(self, account_sid: str, twilio_service,
+                    buckets: list[MessageFilter]) -> None:
+        """Cuenta los días pendientes en paralelo y guarda cada uno al terminar"""
+        def count_day(bucket: MessageFilter) -> None:
+            key = self._cache_key(account_sid, bucket)
+            if isinstance(self._cache.get(key), dict):
+                # Otro worker ya lo contó
+                return
+            unique_users = UniqueUserCounter(bucket)
+            count = twilio_service.count_messages(bucket, unique_users=unique_users)
+            stats = {'count': count, 'users': unique_users.numbers.to_dict()}
+            self._cache.set(key, stats, ttl_seconds=self._ttl_for(bucket))
+        
+        # Primero los días más recientes: son los que el usuario ve primero
+        with ThreadPoolExecutor(max_workers=self._max_parallel_days,
+                                thread_name_prefix='count-days') as executor:
+            for future in [executor.submit(count_day, b) for b in reversed(buckets)]:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error al contar mensajes por día: {e}")
+    
+    def _ttl_for(self, bucket: MessageFilter) -> int:
+        """TTL largo si el tramo ya cerró, corto si todavía puede recibir mensajes"""
+        closed_before = self._local_now() - self.CLOSED_DAY_GRACE
+        if bucket.fecha_final and bucket.fecha_final < closed_before:
+            return self._closed_day_ttl
+        return self._open_day_ttl
+    
+    def _local_now(self) -> datetime:
+        """Hora actual en la zona horaria de los mensajes"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return now - timedelta(hours=self._timezone_offset)
+    
+    @staticmethod
+    def _cache_key(account_sid: str, bucket: MessageFilter) -> dict:
+        """Clave de caché del conteo y los números de un tramo"""
+        return {'day_stats': bucket.fingerprint(), 'account_sid': account_sid}
@@ -0,0 +1,91 @@
+"""
+Caché de credenciales de Twilio ya verificadas
+"""
+from typing import Callable, Optional
+import hashlib
+import hmac
+import time
+
+from .cache_service import CacheService
+from .request_coalescer import RequestCoalescer
+from . import metrics
+
+
+class CredentialCache:
+    """
+    Recuerda qué pares SID + token ya validó Twilio, con los datos de la cuenta
+    
+    La clave es un HMAC del SID y el token con el secreto de la app: el token
+    no se guarda y la clave no permite recuperarlo. Las entradas viven en el
+    CacheService, así con el backend sqlite todos los workers comparten la
+    verificación; los clientes HTTP de cada worker siguen en su
+    TwilioClientRegistry.
+    """
+    
+    def __init__(self, cache_service: CacheService, secret_key: str,
+                 ttl_seconds: int = 300,
+                 request_coalescer: Optional[RequestCoalescer] = None):
+        """
+        Args:
+            cache_service: Caché donde se guardan las verificaciones
+            secret_key: Secreto del HMAC (SECRET_KEY de la app)
+            ttl_seconds: Vigencia de una verificación (un token revocado sigue
+                entrando hasta entonces, salvo que un 401 lo descarte antes)
+            request_coalescer: Single-flight para verificaciones idénticas en vuelo
+        """
+        self._cache = cache_service
+        self._secret = secret_key.encode()
+        self._ttl_seconds = ttl_seconds
+        self._coalescer = request_coalescer or RequestCoalescer()
+    
+    def _key(self, account_sid: str, auth_token: str) -> dict:
+        """Clave de caché de unas credenciales (HMAC-SHA256 de SID y token)"""
+        digest = hmac.new(
+            self._secret,
+            f"{account_sid}:{auth_token}".encode(),
+            hashlib.sha256
+        ).hexdigest()
+        return {'credenciales': digest}
+    
+    def verify(self, account_sid: str, auth_token: str,
+               fetch_account: Callable[[], dict]) -> dict:
+        """
+        Datos de la cuenta, verificando las credenciales con Twilio sólo si hace falta
+        
+        Logins simultáneos con las mismas credenciales (varias pestañas)
+        comparten una sola verificación.
+        
+        Args:
+            account_sid: SID de la cuenta
+            auth_token: Token de autenticación
+            fetch_account: Consulta la cuenta en Twilio; lanza una excepción
+                si las credenciales son inválidas (que no se cachea)
+        
+        Returns:
+            Datos de la cuenta (friendly_name, status, verified_at)
+        """
+        key = self._key(account_sid, auth_token)
+        
+        account = self._cache.get(key)
+        if account is not None:
+            metrics.cache_lookup('credentials', 'hit')
+            return account
+        
+        metrics.cache_lookup('credentials', 'miss')
+        
+        def fetch_and_cache() -> dict:
+            verified = {**fetch_account(), 'verified_at': time.time()}
+            self._cache.set(key, verified, ttl_seconds=self._ttl_seconds, stale_ttl_seconds=0)
+            return verified
+        
+        return self._coalescer.do(key['credenciales'], fetch_and_cache)
+    
+    def forget(self, account_sid: str, auth_token: str) -> None:
+        """
+        Descarta la verificación de unas credenciales (p. ej. Twilio las rechazó)
+        
+        Args:
+            account_sid: SID de la cuenta
+            auth_token: Token de autenticación
+        """
+        self._cache.delete(self._key(account_sid, auth_token))
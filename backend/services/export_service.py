@@ -0,0 +1,125 @@
+"""
+Serialización de mensajes en streaming para exportaciones
+"""
+from typing import Iterable, Iterator
+import csv
+import io
+import json
+import zlib
+
+from ..models.message import Message
+
+
+class MessageExporter:
+    """
+    Convierte un stream de mensajes en trozos de CSV o NDJSON
+    
+    Sólo se mantiene en memoria el trozo en construcción, así una exportación
+    de millones de filas usa la misma memoria que una de cien.
+    """
+    
+    FORMATS = {
+        'csv': ('text/csv; charset=utf-8', 'csv'),
+        'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson')
+    }
+    
+    CSV_COLUMNS = ['date_sent', 'from', 'to', 'body', 'status', 'direction', 'sid']
+    
+    # Inicios de celda que una hoja de cálculo interpreta como fórmula
+    CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+    
+    # Bytes acumulados antes de entregar un trozo al servidor
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, export_format: str = 'csv'):
+        """
+        Args:
+            export_format: 'csv' o 'ndjson'
+        
+        Raises:
+            ValueError: Si el formato no está soportado
+        """
+        if export_format not in self.FORMATS:
+            raise ValueError(f"Formato de exportación no soportado: {export_format}")
+        
+        self.format = export_format
+        self.content_type, self.extension = self.FORMATS[export_format]
+    
+    def iter_chunks(self, messages: Iterable[Message]) -> Iterator[bytes]:
+        """
+        Serializa los mensajes en trozos de bytes
+        
+        Args:
+            messages: Mensajes a exportar
+        
+        Returns:
+            Iterador de trozos codificados en UTF-8
+        """
+        if self.format == 'csv':
+            return self._iter_csv(messages)
+        return self._iter_ndjson(messages)
+    
+    def _iter_csv(self, messages: Iterable[Message]) -> Iterator[bytes]:
+        """CSV con BOM para que Excel reconozca la codificación UTF-8"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        buffer.write('\ufeff')
+        writer.writerow(self.CSV_COLUMNS)
+        
+        for message in messages:
+            row = message.to_dict()
+            writer.writerow([self._csv_cell(row[column]) for column in self.CSV_COLUMNS])
+            
+            if buffer.tell() >= self.CHUNK_SIZE:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        
+        yield buffer.getvalue().encode('utf-8')
+    
+    @classmethod
+    def _csv_cell(cls, value):
+        """Antepone ' a los textos que se abrirían como fórmula (el NDJSON va sin tocar)"""
+        if isinstance(value, str) and value.startswith(cls.CSV_FORMULA_PREFIXES):
+            return "'" + value
+        return value
+    
+    def _iter_ndjson(self, messages: Iterable[Message]) -> Iterator[bytes]:
+        """Un objeto JSON por línea, con las mismas claves que /mensajes"""
+        chunk = []
+        size = 0
+        
+        for message in messages:
+            line = json.dumps(message.to_dict(), ensure_ascii=False) + '\n'
+            chunk.append(line)
+            size += len(line)
+            
+            if size >= self.CHUNK_SIZE:
+                yield ''.join(chunk).encode('utf-8')
+                chunk = []
+                size = 0
+        
+        if chunk:
+            yield ''.join(chunk).encode('utf-8')
+    
+    @staticmethod
+    def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+        """
+        Comprime un stream de trozos en formato gzip sin acumularlo
+        
+        Args:
+            chunks: Trozos sin comprimir
+            level: Nivel de compresión (1-9)
+        
+        Returns:
+            Iterador de trozos comprimidos
+        """
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        
+        yield compressor.flush()
@@ -0,0 +1,60 @@
+"""
+Cliente HTTP asíncrono de Twilio controlado por RateGovernor
+
+Módulo aparte porque importa aiohttp, que sólo se necesita con el motor asíncrono.
+"""
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.http.response import Response
+import asyncio
+import logging
+
+from ..utils.twilio_errors import parse_retry_after
+from .rate_governor import RateGovernor
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class GovernedAsyncHttpClient(AsyncTwilioHttpClient):
+    """AsyncTwilioHttpClient que pasa cada petición por el RateGovernor de la cuenta"""
+    
+    def __init__(self, governor: RateGovernor, **kwargs):
+        """
+        Args:
+            governor: Governor de la cuenta (compartido con el cliente síncrono)
+            **kwargs: Argumentos de AsyncTwilioHttpClient
+        """
+        super().__init__(**kwargs)
+        self.governor = governor
+    
+    async def request(self, method, url, params=None, data=None, headers=None,
+                      auth=None, timeout=None, allow_redirects=False) -> Response:
+        attempt = 0
+        
+        while True:
+            await self.governor.acquire_async()
+            try:
+                response = await super().request(
+                    method, url, params=params, data=data, headers=headers,
+                    auth=auth, timeout=timeout, allow_redirects=allow_redirects
+                )
+            finally:
+                self.governor.release()
+            
+            metrics.upstream_call('async', response.status_code)
+            if response.status_code != 429:
+                self.governor.on_success()
+                return response
+            
+            retry_after = parse_retry_after(response.headers)
+            self.governor.on_throttle(retry_after)
+            
+            if attempt >= self.governor.max_retries:
+                self.governor.on_exhausted()
+                return response
+            
+            delay = self.governor.backoff_delay(attempt, retry_after)
+            logger.warning(f"Twilio respondió 429, reintento {attempt + 1} en {delay:.1f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,335 @@
+"""
+Feed en vivo de mensajes nuevos: un sondeo por (cuenta, filtros) repartido a todos los clientes
+"""
+from collections import deque
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, Optional
+import queue
+import threading
+import time
+import logging
+
+from ..models.message import Message, MessageBatch, MessageFilter
+from ..utils.date_utils import to_epoch
+from ..utils.json_utils import dumps
+from ..utils.twilio_errors import is_rate_limit_error, retry_after_seconds
+
+
+logger = logging.getLogger(__name__)
+
+
+class LiveFeedFull(Exception):
+    """El worker ya atiende el máximo de clientes en vivo"""
+
+
+class LiveFeedSubscription:
+    """Cliente suscrito a un feed: recibe los lotes de mensajes nuevos en su cola"""
+    
+    def __init__(self, feed: '_FeedPoller', max_pending: int):
+        """
+        Args:
+            feed: Feed al que pertenece
+            max_pending: Lotes pendientes antes de considerar lento al cliente
+        """
+        self.feed = feed
+        self.queue: queue.Queue[list[Message]] = queue.Queue(maxsize=max_pending)
+        # El cliente no vació su cola a tiempo: se corta el stream y reconecta
+        self.overflowed = False
+    
+    def deliver(self, messages: list[Message]) -> None:
+        """Encola un lote sin bloquear el sondeo"""
+        try:
+            self.queue.put_nowait(messages)
+        except queue.Full:
+            self.overflowed = True
+    
+    def iter_events(self, heartbeat_seconds: float, max_seconds: float) -> Iterator[str]:
+        """
+        Genera los eventos SSE del cliente
+        
+        Args:
+            heartbeat_seconds: Intervalo de comentarios keep-alive sin mensajes
+            max_seconds: Duración máxima del stream (el navegador reconecta solo)
+        
+        Returns:
+            Iterador de eventos en formato text/event-stream
+        """
+        yield 'retry: 3000\n\n'
+        
+        deadline = time.monotonic() + max_seconds
+        while not self.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            
+            try:
+                messages = self.queue.get(timeout=min(heartbeat_seconds, remaining))
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            
+            yield self.format_event(messages)
+    
+    @staticmethod
+    def format_event(messages: list[Message]) -> str:
+        """
+        Evento SSE con un lote de mensajes (del más antiguo al más reciente)
+        
+        El id es "epoch:SID" del último mensaje del lote: el navegador lo
+        reenvía como Last-Event-ID al reconectar y el SID distingue los
+        mensajes de un mismo segundo.
+        """
+        data = dumps({'mensajes': MessageBatch.from_messages(messages)}).decode()
+        last = messages[-1]
+        return f"id: {to_epoch(last.date_sent)}:{last.sid}\nevent: mensajes\ndata: {data}\n\n"
+
+
+class _FeedPoller:
+    """
+    Sondeo de mensajes nuevos de una búsqueda
+    
+    Cada vuelta lee de Twilio sólo lo más reciente que
+    la marca de agua, del más nuevo al más antiguo, y corta al cruzarla. Una
+    ventana de solapamiento tolera mensajes que aparecen con unos segundos de
+    retraso; los SID ya vistos en esa ventana no se repiten.
+    """
+    
+    def __init__(self, key: str, filters: MessageFilter,
+                 service_factory: Callable, timezone_offset_hours: int,
+                 poll_seconds: float, overlap_seconds: float, replay_size: int):
+        """
+        Args:
+            key: Clave (cuenta, filtros) del feed
+            filters: Filtros de la búsqueda
+            service_factory: Crea un TwilioService de la cuenta en cada vuelta
+                (None si la cuenta no tiene credenciales vigentes)
+            timezone_offset_hours: Horas a restar para ajuste de zona horaria
+            poll_seconds: Intervalo entre sondeos
+            overlap_seconds: Ventana que se vuelve a leer en cada sondeo
+            replay_size: Mensajes recientes guardados para reanudar reconexiones
+        """
+        self.key = key
+        self.filters = filters
+        self._service_factory = service_factory
+        self._poll_seconds = poll_seconds
+        self._overlap = timedelta(seconds=overlap_seconds)
+        
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.watermark = now - timedelta(hours=timezone_offset_hours)
+        self._seen: dict[str, datetime] = {}
+        self._recent: deque[Message] = deque(maxlen=replay_size)
+        self.subscribers: set[LiveFeedSubscription] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f'live-feed-{key[-8:]}',
+            daemon=True
+        )
+    
+    def start(self) -> None:
+        """Arranca el hilo de sondeo"""
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Detiene el sondeo tras la vuelta en curso"""
+        self._stop.set()
+    
+    def add_subscriber(self, subscription: LiveFeedSubscription) -> None:
+        """Agrega un cliente al reparto"""
+        with self._lock:
+            self.subscribers.add(subscription)
+    
+    def remove_subscriber(self, subscription: LiveFeedSubscription) -> bool:
+        """Quita un cliente del reparto; retorna True si estaba suscrito"""
+        with self._lock:
+            if subscription not in self.subscribers:
+                return False
+            self.subscribers.discard(subscription)
+            return True
+    
+    def recent_since(self, last_event_id: str) -> list[Message]:
+        """
+        Mensajes repartidos después de un evento (para reanudar)
+        
+        Args:
+            last_event_id: Id "epoch:SID" del último evento recibido
+        
+        Returns:
+            Mensajes posteriores, en el orden en que se repartieron
+        """
+        epoch, _, sid = last_event_id.partition(':')
+        if not epoch.isdigit():
+            return []
+        
+        with self._lock:
+            recent = list(self._recent)
+        for i, message in enumerate(recent):
+            if message.sid == sid:
+                return recent[i + 1:]
+        # El mensaje ya salió de los recientes: se reanuda por fecha
+        return [m for m in recent if to_epoch(m.date_sent) > int(epoch)]
+    
+    def _run(self) -> None:
+        """Bucle de sondeo hasta que el feed se queda sin clientes"""
+        while not self._stop.is_set():
+            wait = self._poll_seconds
+            try:
+                self.poll()
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    wait = max(wait, retry_after_seconds(e) or 0)
+                logger.error(f"Error en sondeo del feed en vivo: {e}")
+            self._stop.wait(wait)
+    
+    def poll(self) -> list[Message]:
+        """
+        Lee los mensajes nuevos y los reparte a los suscriptores
+        
+        Returns:
+            Mensajes nuevos, del más antiguo al más reciente
+        """
+        since = self.watermark - self._overlap
+        if self.filters.fecha_inicio and self.filters.fecha_inicio > since:
+            since = self.filters.fecha_inicio
+        
+        service = self._service_factory()
+        if service is None:
+            return []  # Se retoma cuando un cliente vuelva a usar la cuenta
+        
+        new_messages = []
+        messages = service.iter_recent_messages(replace(self.filters, fecha_inicio=since))
+        try:
+            for message in messages:
+                if message.date_sent is None:
+                    continue  # Aún sin enviar: aparecerá cuando tenga fecha
+                if message.date_sent < since:
+                    break
+                if message.sid not in self._seen:
+                    self._seen[message.sid] = message.date_sent
+                    new_messages.append(message)
+        finally:
+            messages.close()
+        
+        if not new_messages:
+            return []
+        
+        new_messages.reverse()
+        self.watermark = max(self.watermark, new_messages[-1].date_sent)
+        cutoff = self.watermark - self._overlap
+        self._seen = {sid: date for sid, date in self._seen.items() if date >= cutoff}
+        
+        with self._lock:
+            self._recent.extend(new_messages)
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.deliver(new_messages)
+        
+        return new_messages
+
+
+class LiveFeedHub:
+    """
+    Registro de feeds en vivo del worker
+    
+    Todos los clientes con la misma cuenta y filtros comparten un único
+    sondeo, así la carga sobre Twilio crece con las búsquedas distintas y no
+    con el número de pestañas abiertas. Cada cliente ocupa un hilo del
+    worker mientras dura su stream: max_subscribers lo limita.
+    """
+    
+    def __init__(self, timezone_offset_hours: int = 0, poll_seconds: float = 5,
+                 overlap_seconds: float = 60, max_subscribers: int = 4,
+                 max_pending: int = 50, replay_size: int = 200):
+        """
+        Args:
+            timezone_offset_hours: Horas a restar para ajuste de zona horaria
+            poll_seconds: Intervalo entre sondeos de cada feed
+            overlap_seconds: Ventana que se vuelve a leer en cada sondeo
+            max_subscribers: Clientes simultáneos por worker
+            max_pending: Lotes pendientes por cliente antes de cortarlo
+            replay_size: Mensajes recientes por feed para reanudar reconexiones
+        """
+        self._timezone_offset = timezone_offset_hours
+        self._poll_seconds = poll_seconds
+        self._overlap_seconds = overlap_seconds
+        self._max_subscribers = max_subscribers
+        self._max_pending = max_pending
+        self._replay_size = replay_size
+        self._feeds: dict[str, _FeedPoller] = {}
+        self._subscriber_count = 0
+        self._lock = threading.Lock()
+    
+    def subscribe(self, account_sid: str, filters: MessageFilter,
+                  service_factory: Callable,
+                  last_event_id: Optional[str] = None) -> LiveFeedSubscription:
+        """
+        Suscribe un cliente al feed de su búsqueda (lo crea si no existe)
+        
+        Args:
+            account_sid: SID de la cuenta
+            filters: Filtros de la búsqueda
+            service_factory: Crea un TwilioService de la cuenta (sólo se usa si
+                el feed es nuevo: debe depender de la cuenta, no de la sesión)
+            last_event_id: Último id recibido antes de reconectar ("epoch:SID")
+        
+        Returns:
+            Suscripción del cliente
+        
+        Raises:
+            LiveFeedFull: Si el worker ya atiende el máximo de clientes
+        """
+        key = f"{account_sid}:{filters.fingerprint()}"
+        
+        with self._lock:
+            if self._subscriber_count >= self._max_subscribers:
+                raise LiveFeedFull("Demasiados clientes en vivo en este worker")
+            
+            feed = self._feeds.get(key)
+            is_new = feed is None
+            if is_new:
+                feed = _FeedPoller(
+                    key,
+                    filters,
+                    service_factory,
+                    timezone_offset_hours=self._timezone_offset,
+                    poll_seconds=self._poll_seconds,
+                    overlap_seconds=self._overlap_seconds,
+                    replay_size=self._replay_size
+                )
+                self._feeds[key] = feed
+            
+            subscription = LiveFeedSubscription(feed, self._max_pending)
+            feed.add_subscriber(subscription)
+            self._subscriber_count += 1
+        
+        if is_new:
+            feed.start()
+        
+        if last_event_id:
+            missed = feed.recent_since(last_event_id)
+            if missed:
+                subscription.deliver(missed)
+        
+        return subscription
+    
+    def unsubscribe(self, subscription: LiveFeedSubscription) -> None:
+        """Da de baja a un cliente y detiene el feed si era el último"""
+        feed = subscription.feed
+        with self._lock:
+            if not feed.remove_subscriber(subscription):
+                return
+            self._subscriber_count -= 1
+            
+            if not feed.subscribers:
+                self._feeds.pop(feed.key, None)
+                feed.stop()
+    
+    def stats(self) -> dict:
+        """Feeds activos y clientes conectados"""
+        with self._lock:
+            return {
+                'feeds': len(self._feeds),
+                'subscribers': self._subscriber_count
+            }
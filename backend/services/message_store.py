@@ -0,0 +1,638 @@
+"""
+Almacén local (SQLite) de mensajes de Twilio por cuenta
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Any
+import logging
+
+from ..models.message import Message, MessageFilter
+from ..utils.date_utils import to_epoch, from_epoch
+from ..utils.text_search import parse_body_query
+
+
+logger = logging.getLogger(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    sid TEXT PRIMARY KEY,
+    from_number TEXT NOT NULL,
+    to_number TEXT NOT NULL,
+    body TEXT,
+    status TEXT,
+    direction TEXT,
+    date_sent INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date_sent ON messages (date_sent DESC, sid DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_from ON messages (from_number, date_sent DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_to ON messages (to_number, date_sent DESC);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# Índice invertido de los cuerpos (external content: el texto vive en messages).
+# Los triggers lo mantienen al día con cada mensaje sincronizado o guardado.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    body,
+    content='messages',
+    content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, body) VALUES (new.rowid, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, body) VALUES ('delete', old.rowid, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF body ON messages
+WHEN old.body IS NOT new.body BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, body) VALUES ('delete', old.rowid, old.body);
+    INSERT INTO messages_fts (rowid, body) VALUES (new.rowid, new.body);
+END;
+"""
+
+_COLUMNS = "sid, from_number, to_number, body, status, direction, date_sent"
+
+
+# Avance de cada estado: un callback atrasado no hace retroceder al mensaje
+# (p. ej. 'sent' que llega después de 'delivered')
+_STATUS_RANK = {
+    'accepted': 0, 'scheduled': 0, 'queued': 1,
+    'sending': 2, 'receiving': 2,
+    'sent': 3, 'received': 3,
+    'delivered': 4,
+    'undelivered': 5, 'failed': 5, 'canceled': 5,
+    'read': 6
+}
+
+
+# Estados que ya no cambian (un 'delivered' de WhatsApp todavía puede pasar a 'read')
+_FINAL_STATUSES = ('received', 'undelivered', 'failed', 'canceled', 'read')
+
+
+def _status_rank(status: Optional[str]) -> int:
+    """Posición del estado en el ciclo de vida del mensaje (0 si es desconocido)"""
+    return _STATUS_RANK.get(status, 0)
+
+
+def _body_matches(body: Optional[str], query: str) -> bool:
+    """Búsqueda en el cuerpo con la misma semántica que MessageFilter.matches"""
+    return parse_body_query(query).matches(body)
+
+
+class MessageStore:
+    """Almacén SQLite con los mensajes sincronizados de una cuenta"""
+    
+    def __init__(self, db_path: str):
+        """
+        Inicializa el almacén y crea el esquema si no existe
+        
+        Args:
+            db_path: Ruta del archivo SQLite
+        """
+        self._db_path = str(db_path)
+        self._local = threading.local()
+        
+        Path(self._db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+        self.full_text_enabled = self._create_full_text_index()
+    
+    def _create_full_text_index(self) -> bool:
+        """
+        Crea el índice FTS5 de los cuerpos (y lo llena si el almacén ya tenía mensajes)
+        
+        Returns:
+            False si el SQLite instalado no tiene FTS5 (se busca recorriendo la tabla)
+        """
+        conn = self._connection()
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'"
+        ).fetchone() is not None
+        
+        try:
+            conn.executescript(_FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite sin FTS5, body_search recorrerá la tabla: {e}")
+            return False
+        
+        if not existed:
+            with self._transaction() as conn:
+                conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+        
+        return True
+    
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Obtiene la conexión del hilo actual (SQLite no comparte conexiones entre hilos)
+        
+        Returns:
+            Conexión SQLite en modo autocommit
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.create_function('body_matches', 2, _body_matches, deterministic=True)
+            conn.create_function('status_rank', 1, _status_rank, deterministic=True)
+            self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def _transaction(self):
+        """Abre una transacción de escritura (BEGIN IMMEDIATE)"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+    
+    def upsert_messages(self, messages: Iterable[Message]) -> int:
+        """
+        Inserta o actualiza mensajes (idempotente por SID)
+        
+        Args:
+            messages: Mensajes a guardar
+        
+        Returns:
+            Número de mensajes escritos
+        """
+        rows = [
+            (
+                msg.sid,
+                msg.from_number,
+                msg.to_number,
+                msg.body,
+                msg.status,
+                msg.direction,
+                to_epoch(msg.date_sent)
+            )
+            for msg in messages
+        ]
+        if not rows:
+            return 0
+        
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT INTO messages ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET "
+                "from_number = excluded.from_number, "
+                "to_number = excluded.to_number, "
+                "body = excluded.body, "
+                "status = excluded.status, "
+                "direction = excluded.direction, "
+                "date_sent = excluded.date_sent",
+                rows
+            )
+        
+        return len(rows)
+    
+    def apply_updates(self, messages: Iterable[Message]) -> int:
+        """
+        Aplica datos parciales de webhooks sin pisar lo que ya se sabe
+        
+        A diferencia de upsert_messages (datos completos de la API), un campo
+        que falta (None) conserva el valor guardado, el estado sólo avanza y
+        la fecha guardada tiene prioridad sobre la aproximada del webhook.
+        
+        Args:
+            messages: Mensajes armados a partir de los webhooks, en orden de llegada
+        
+        Returns:
+            Número de actualizaciones aplicadas
+        """
+        rows = [
+            (
+                msg.sid,
+                msg.from_number,
+                msg.to_number,
+                msg.body,
+                msg.status,
+                msg.direction,
+                to_epoch(msg.date_sent)
+            )
+            for msg in messages
+        ]
+        if not rows:
+            return 0
+        
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT INTO messages ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET "
+                "body = COALESCE(excluded.body, body), "
+                "status = CASE WHEN excluded.status IS NOT NULL "
+                "AND status_rank(excluded.status) >= status_rank(status) "
+                "THEN excluded.status ELSE status END, "
+                "direction = COALESCE(direction, excluded.direction), "
+                "date_sent = COALESCE(date_sent, excluded.date_sent)",
+                rows
+            )
+        
+        return len(rows)
+    
+    def oldest_date(self, sids: list[str]) -> Optional[int]:
+        """
+        Fecha más antigua guardada entre unos mensajes
+        
+        Args:
+            sids: SIDs de los mensajes
+        
+        Returns:
+            Epoch local, o None si ninguno tiene fecha
+        """
+        if not sids:
+            return None
+        
+        placeholders = ','.join('?' * len(sids))
+        row = self._connection().execute(
+            f"SELECT MIN(date_sent) FROM messages WHERE sid IN ({placeholders})",
+            sids
+        ).fetchone()
+        return row[0]
+    
+    def oldest_pending_date(self, since: int, until: int) -> Optional[int]:
+        """
+        Fecha del mensaje más antiguo de un rango cuyo estado todavía puede cambiar
+        
+        Args:
+            since: Inicio del rango (epoch local, inclusivo)
+            until: Fin del rango (epoch local, exclusivo)
+        
+        Returns:
+            Epoch local, o None si todos los mensajes del rango tienen un estado final
+        """
+        placeholders = ','.join('?' * len(_FINAL_STATUSES))
+        row = self._connection().execute(
+            "SELECT MIN(date_sent) FROM messages "
+            "WHERE date_sent >= ? AND date_sent < ? "
+            f"AND COALESCE(status, '') NOT IN ({placeholders})",
+            (since, until, *_FINAL_STATUSES)
+        ).fetchone()
+        return row[0]
+    
+    def known_sids(self, sids: list[str]) -> set[str]:
+        """
+        SIDs que ya están en el almacén
+        
+        Args:
+            sids: SIDs a buscar
+        
+        Returns:
+            Los que ya se guardaron (por sincronización o webhook)
+        """
+        if not sids:
+            return set()
+        
+        placeholders = ','.join('?' * len(sids))
+        rows = self._connection().execute(
+            f"SELECT sid FROM messages WHERE sid IN ({placeholders})",
+            sids
+        )
+        return {row[0] for row in rows}
+    
+    # ------------------------------------------------------------------
+    # Estado de sincronización
+    # ------------------------------------------------------------------
+    
+    def get_state(self, key: str, default: Any = None) -> Any:
+        """
+        Obtiene un valor del estado de sincronización
+        
+        Args:
+            key: Nombre del valor
+            default: Valor por defecto si no existe
+        """
+        row = self._connection().execute(
+            "SELECT value FROM sync_state WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return default
+        return row[0]
+    
+    def set_state(self, **values) -> None:
+        """Guarda uno o más valores del estado de sincronización"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                list(values.items())
+            )
+    
+    def try_acquire_lease(self, name: str, seconds: float) -> bool:
+        """
+        Intenta tomar un lease exclusivo (válido entre hilos y procesos)
+        
+        Args:
+            name: Nombre del lease
+            seconds: Duración del lease
+        
+        Returns:
+            True si se obtuvo el lease
+        """
+        key = f"lease:{name}"
+        now = time.time()
+        
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT value FROM sync_state WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[0] and row[0] > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                (key, now + seconds)
+            )
+        
+        return True
+    
+    def renew_lease(self, name: str, seconds: float) -> None:
+        """Extiende un lease ya adquirido"""
+        self.set_state(**{f"lease:{name}": time.time() + seconds})
+    
+    def release_lease(self, name: str) -> None:
+        """Libera un lease"""
+        self.set_state(**{f"lease:{name}": 0})
+    
+    def covers(self, filters: MessageFilter) -> bool:
+        """
+        Indica si el almacén tiene todos los mensajes del rango pedido
+        
+        Args:
+            filters: Filtros de la consulta
+        
+        Returns:
+            True si la consulta se puede responder localmente
+        """
+        if self.get_state('history_complete'):
+            return True
+        
+        low_water_mark = self.get_state('low_water_mark')
+        if low_water_mark is None or not filters.fecha_inicio:
+            return False
+        
+        return to_epoch(filters.fecha_inicio) >= low_water_mark
+    
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    
+    def _where(self, filters: MessageFilter, include_body: bool = True) -> tuple[str, list]:
+        """
+        Traduce los filtros a una cláusula WHERE equivalente a MessageFilter.matches
+        
+        Args:
+            filters: Filtros a traducir
+            include_body: Si se incluye body_search (False cuando el índice ya se une aparte)
+        
+        Returns:
+            Tupla (cláusula SQL, parámetros)
+        """
+        clauses = []
+        params = []
+        
+        if filters.sid:
+            clauses.append("sid = ?")
+            params.append(filters.sid)
+        if filters.fecha_inicio:
+            clauses.append("(date_sent IS NULL OR date_sent >= ?)")
+            params.append(to_epoch(filters.fecha_inicio))
+        if filters.fecha_final:
+            clauses.append("(date_sent IS NULL OR date_sent <= ?)")
+            params.append(to_epoch(filters.fecha_final))
+        if filters.numero_from:
+            clauses.append("from_number = ?")
+            params.append(filters.numero_from)
+        if filters.numero_to:
+            clauses.append("to_number = ?")
+            params.append(filters.numero_to)
+        if filters.status:
+            clauses.append("status = ?")
+            params.append(filters.status)
+        if filters.direction:
+            clauses.append("(direction = ? OR direction LIKE ?)")
+            params.extend([filters.direction, f"{filters.direction}-%"])
+        if filters.numero_from_to:
+            if filters.numero_contraparte:
+                clauses.append(
+                    "((from_number = ? AND to_number = ?) OR (from_number = ? AND to_number = ?))"
+                )
+                params.extend([
+                    filters.numero_from_to, filters.numero_contraparte,
+                    filters.numero_contraparte, filters.numero_from_to
+                ])
+            else:
+                clauses.append("(from_number = ? OR to_number = ?)")
+                params.extend([filters.numero_from_to, filters.numero_from_to])
+        if filters.body_search and include_body:
+            fts_query = self._fts_query(filters)
+            if fts_query:
+                clauses.append(
+                    "rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)"
+                )
+                params.append(fts_query)
+            else:
+                clauses.append("body_matches(body, ?)")
+                params.append(filters.body_search)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+    
+    def _fts_query(self, filters: MessageFilter) -> Optional[str]:
+        """Expresión MATCH de body_search, o None si no se puede usar el índice"""
+        if not self.full_text_enabled or not filters.body_search:
+            return None
+        return parse_body_query(filters.body_search).to_fts5()
+    
+    def find_messages(self, filters: MessageFilter, limit: int, offset: int = 0,
+                      before: Optional[tuple] = None) -> list[Message]:
+        """
+        Obtiene mensajes ordenados del más reciente al más antiguo
+        
+        Args:
+            filters: Filtros a aplicar
+            limit: Máximo de mensajes
+            offset: Mensajes a saltar
+            before: Clave (date_sent epoch, sid) del último mensaje visto (keyset)
+        
+        Returns:
+            Lista de mensajes
+        """
+        where, params = self._where(filters)
+        
+        if before is not None:
+            date_sent, sid = before
+            if date_sent is None:
+                keyset = "(date_sent IS NULL AND sid < ?)"
+                keyset_params = [sid]
+            else:
+                # Los NULL van al final en orden descendente
+                keyset = ("(date_sent < ? OR (date_sent = ? AND sid < ?) "
+                          "OR date_sent IS NULL)")
+                keyset_params = [date_sent, date_sent, sid]
+            where = f"{where} AND {keyset}" if where else f"WHERE {keyset}"
+            params = params + keyset_params
+        
+        rows = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM messages {where} "
+            "ORDER BY date_sent DESC, sid DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        
+        return [self._row_to_message(row) for row in rows]
+    
+    def find_messages_by_relevance(self, filters: MessageFilter, limit: int,
+                                   offset: int = 0) -> list[Message]:
+        """
+        Obtiene mensajes ordenados por relevancia de body_search (BM25)
+        
+        Sin índice o sin palabras que buscar se ordena por fecha.
+        
+        Args:
+            filters: Filtros a aplicar
+            limit: Máximo de mensajes
+            offset: Mensajes a saltar
+        
+        Returns:
+            Lista de mensajes, los más relevantes primero
+        """
+        fts_query = self._fts_query(filters)
+        if not fts_query:
+            return self.find_messages(filters, limit=limit, offset=offset)
+        
+        where, params = self._where(filters, include_body=False)
+        rows = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM messages "
+            "JOIN (SELECT rowid AS hit_rowid, bm25(messages_fts) AS score "
+            "      FROM messages_fts WHERE messages_fts MATCH ?) AS hits "
+            f"ON hits.hit_rowid = messages.rowid {where} "
+            "ORDER BY hits.score, date_sent DESC, sid DESC LIMIT ? OFFSET ?",
+            [fts_query] + params + [limit, offset]
+        ).fetchall()
+        
+        return [self._row_to_message(row) for row in rows]
+    
+    def iter_messages(self, filters: MessageFilter, batch_size: int = 1000) -> Iterator[Message]:
+        """
+        Recorre todos los mensajes que cumplen los filtros por lotes (keyset)
+        
+        Args:
+            filters: Filtros a aplicar
+            batch_size: Mensajes leídos por consulta
+        
+        Returns:
+            Iterador de mensajes del más reciente al más antiguo
+        """
+        before = None
+        while True:
+            batch = self.find_messages(filters, limit=batch_size, before=before)
+            yield from batch
+            
+            if len(batch) < batch_size:
+                return
+            last = batch[-1]
+            before = (to_epoch(last.date_sent), last.sid)
+    
+    def count_messages(self, filters: MessageFilter) -> int:
+        """Cuenta los mensajes que cumplen los filtros"""
+        where, params = self._where(filters)
+        return self._connection().execute(
+            f"SELECT COUNT(*) FROM messages {where}", params
+        ).fetchone()[0]
+    
+    def count_unique_users(self, filters: MessageFilter) -> int:
+        """
+        Cuenta usuarios únicos con la misma regla que UniqueUserCounter
+        
+        Args:
+            filters: Filtros aplicados
+        
+        Returns:
+            Número de usuarios únicos
+        """
+        where, params = self._where(filters)
+        service_numbers = [
+            n for n in (filters.numero_from, filters.numero_to, filters.numero_from_to) if n
+        ]
+        
+        query = (
+            "SELECT COUNT(DISTINCT number) FROM ("
+            f"SELECT from_number AS number FROM messages {where} "
+            "UNION ALL "
+            f"SELECT to_number AS number FROM messages {where}"
+            ")"
+        )
+        query_params = params + params
+        
+        if service_numbers:
+            placeholders = ", ".join("?" for _ in service_numbers)
+            query += f" WHERE number NOT IN ({placeholders})"
+            query_params += service_numbers
+        
+        distinct_numbers = self._connection().execute(query, query_params).fetchone()[0]
+        
+        # Sin filtros de número se excluye el más frecuente (el servicio),
+        # que siempre forma parte del conjunto
+        if not service_numbers and distinct_numbers:
+            return distinct_numbers - 1
+        return distinct_numbers
+    
+    @staticmethod
+    def _row_to_message(row: tuple) -> Message:
+        """Convierte una fila de SQLite a Message"""
+        return Message(
+            sid=row[0],
+            from_number=row[1],
+            to_number=row[2],
+            body=row[3],
+            status=row[4],
+            direction=row[5],
+            date_sent=from_epoch(row[6])
+        )
+
+
+class MessageStoreManager:
+    """Administra una instancia de MessageStore por cuenta de Twilio"""
+    
+    def __init__(self, base_dir: str):
+        """
+        Args:
+            base_dir: Directorio donde se guardan los archivos SQLite
+        """
+        self._base_dir = Path(base_dir)
+        self._stores: dict[str, MessageStore] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, account_sid: str) -> MessageStore:
+        """
+        Obtiene (o crea) el almacén de una cuenta
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+        
+        Returns:
+            MessageStore de la cuenta
+        """
+        if not account_sid or not account_sid.isalnum():
+            raise ValueError(f"Account SID inválido: {account_sid!r}")
+        
+        with self._lock:
+            store = self._stores.get(account_sid)
+            if store is None:
+                store = MessageStore(self._base_dir / f"{account_sid}.sqlite3")
+                self._stores[account_sid] = store
+            return store
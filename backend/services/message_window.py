@@ -0,0 +1,206 @@
+"""
+Ventanas de resultados: una lectura de Twilio sirve todas las páginas de una búsqueda
+"""
+from typing import Callable, Optional
+import time
+
+from ..models.message import MessageBatch, MessageFilter, PaginatedResponse
+from ..utils.date_utils import to_epoch
+from .cache_service import CacheService, CacheScope, generate_cache_key
+from .request_coalescer import RequestCoalescer
+from . import metrics
+
+
+def cache_scope(account_sid: str, filters: MessageFilter) -> CacheScope:
+    """
+    Datos de los que dependen los resultados de una búsqueda
+    
+    Todo mensaje que aparece en una búsqueda por número tiene ese número en
+    from o to, así que basta con vigilar uno de ellos.
+    
+    Args:
+        account_sid: SID de la cuenta
+        filters: Filtros de la búsqueda
+    
+    Returns:
+        Scope para CacheService.set
+    """
+    return CacheScope(
+        namespace=account_sid,
+        number=filters.numero_from_to or filters.numero_from or filters.numero_to,
+        until=to_epoch(filters.fecha_final)
+    )
+
+
+class MessageWindow:
+    """
+    Primeros resultados de una búsqueda, del más reciente al más antiguo
+    
+    Las páginas que caen dentro de la ventana se recortan de aquí sin volver
+    a leer Twilio. Se guarda en caché como MessageBatch (compacto y
+    serializable con pickle para el backend compartido).
+    
+    Cada página de resultados admite un máximo de filas descartadas; al
+    superarlo la página se cierra con lo que tenga y la siguiente sigue
+    leyendo con otro máximo. Si hubo cortes, las páginas ya no caen en
+    múltiplos de per_page y la ventana guarda dónde termina cada una.
+    """
+    
+    __slots__ = ('messages', 'size', 'total', 'complete', 'unique_users', 'truncated',
+                 'per_page', 'page_ends')
+    
+    def __init__(self, messages: MessageBatch, size: int, total: int,
+                 complete: bool, unique_users: int, truncated: bool = False,
+                 per_page: Optional[int] = None,
+                 page_ends: Optional[tuple[int, ...]] = None):
+        """
+        Args:
+            messages: Resultados guardados (como máximo size)
+            size: Resultados que se buscaban al leer la ventana
+            total: Resultados vistos (uno más que los guardados si se cortó al llenarse)
+            complete: True si la lectura llegó al final de la búsqueda
+            unique_users: Usuarios únicos de los resultados vistos
+            truncated: True si alguna página se cerró por el máximo de filas descartadas
+            per_page: Tamaño de página con el que se leyó la ventana
+            page_ends: Con cortes, posición en messages donde termina cada página leída
+        """
+        self.messages = messages
+        self.size = size
+        self.total = total
+        self.complete = complete
+        self.unique_users = unique_users
+        self.truncated = truncated
+        self.per_page = per_page
+        self.page_ends = page_ends
+    
+    @property
+    def nbytes(self) -> int:
+        """Tamaño aproximado en bytes, para el límite del caché"""
+        return self.messages.nbytes
+    
+    def covers(self, page: int, per_page: int) -> bool:
+        """
+        Indica si la ventana sirve la página sin volver a leer Twilio
+        
+        Sin cortes, las páginas son desplazamientos y cualquier per_page sirve.
+        Con cortes, las páginas dependen del per_page con que se leyó; una
+        página más allá de las leídas se vuelve a leer (y sigue tras el corte).
+        
+        Args:
+            page: Número de página (empieza en 1)
+            per_page: Mensajes por página
+        """
+        if self.page_ends is None:
+            return self.complete or page * per_page <= self.size
+        if per_page != self.per_page:
+            return False
+        return self.complete or page <= len(self.page_ends)
+    
+    def page(self, page: int, per_page: int) -> PaginatedResponse:
+        """
+        Recorta una página de la ventana
+        
+        Args:
+            page: Número de página (empieza en 1)
+            per_page: Mensajes por página
+        
+        Returns:
+            Respuesta paginada (total exacto si la ventana está completa)
+        """
+        if self.page_ends is None:
+            start = (page - 1) * per_page
+            end = start + per_page
+            has_more = end < self.total
+            total_pages = (self.total + per_page - 1) // per_page
+        else:
+            ends = self.page_ends
+            if page <= len(ends):
+                start, end = ends[page - 2] if page > 1 else 0, ends[page - 1]
+            else:
+                # Más allá de la última página (búsqueda completa) no queda nada
+                start = end = len(self.messages)
+            # Una página cerrada por el corte sigue en la siguiente
+            has_more = page < len(ends) or (page == len(ends) and not self.complete)
+            total_pages = len(ends) + (0 if self.complete else 1)
+        
+        return PaginatedResponse(
+            messages=list(self.messages.messages(start, end)),
+            page=page,
+            per_page=per_page,
+            total=self.total,
+            total_pages=max(total_pages, 1),
+            has_more=has_more,
+            unique_users=self.unique_users,
+            total_exact=self.complete,
+            scan_truncated=self.truncated
+        )
+
+
+class MessageWindowCache:
+    """
+    Caché de ventanas por cuenta y filtros normalizados
+    
+    La clave es el fingerprint del filtro, no los parámetros crudos de la
+    petición: todas las páginas (y tamaños de página) de una búsqueda
+    comparten una sola ventana. Una página más allá de la ventana la
+    reemplaza por otra más profunda, redondeada a window_size.
+    """
+    
+    def __init__(self, cache_service: CacheService, window_size: int = 500,
+                 request_coalescer: Optional[RequestCoalescer] = None):
+        """
+        Args:
+            cache_service: Caché donde se guardan las ventanas
+            window_size: Granularidad de la profundidad de lectura (resultados)
+            request_coalescer: Single-flight para lecturas idénticas en vuelo
+        """
+        self._cache = cache_service
+        self._window_size = window_size
+        self._coalescer = request_coalescer or RequestCoalescer()
+    
+    def window_size_for(self, page: int, per_page: int) -> int:
+        """Resultados que debe tener la ventana para servir la página"""
+        needed = page * per_page
+        return -(-needed // self._window_size) * self._window_size
+    
+    def get_page(self, account_sid: str, filters: MessageFilter, page: int, per_page: int,
+                 scan: Callable[[int, int, int], MessageWindow]) -> PaginatedResponse:
+        """
+        Sirve una página desde la ventana de la búsqueda, leyéndola si hace falta
+        
+        Args:
+            account_sid: SID de la cuenta
+            filters: Filtros de la búsqueda
+            page: Número de página
+            per_page: Mensajes por página
+            scan: Lee una ventana de Twilio (resultados, página pedida y
+                tamaño de página)
+        
+        Returns:
+            Respuesta paginada
+        """
+        key = {'window': filters.fingerprint(), 'account_sid': account_sid}
+        size = self.window_size_for(page, per_page)
+        
+        window = self._cache.get(key)
+        is_hit = window is not None and window.covers(page, per_page)
+        metrics.cache_lookup('windows', 'hit' if is_hit else 'miss')
+        if not is_hit:
+            def scan_and_cache() -> MessageWindow:
+                started = time.time()
+                new_window = scan(size, page, per_page)
+                self._cache.set(
+                    key,
+                    new_window,
+                    scope=cache_scope(account_sid, filters),
+                    computed_at=started
+                )
+                return new_window
+            
+            # Páginas de la misma búsqueda pedidas a la vez comparten la lectura
+            window = self._coalescer.do(
+                generate_cache_key({**key, 'size': size, 'page': page, 'per_page': per_page}),
+                scan_and_cache
+            )
+        
+        return window.page(page, per_page)
@@ -0,0 +1,421 @@
+"""
+Métricas en formato Prometheus y tiempos por etapa de cada petición
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator, Optional
+import bisect
+import threading
+import time
+
+
+# Límites de los histogramas de tiempo (segundos)
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Límites de los histogramas de cantidades (páginas de Twilio, filas)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    """Etiquetas en la sintaxis de Prometheus ({a="x",b="y"})"""
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Número en la sintaxis de Prometheus"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Contador monótono con etiquetas"""
+    
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = ()):
+        """
+        Args:
+            name: Nombre de la métrica (termina en _total)
+            help_text: Descripción
+            label_names: Nombres de las etiquetas
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Suma amount a la serie con esas etiquetas"""
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def render(self) -> list[str]:
+        """Líneas de la métrica en formato de texto de Prometheus"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            labels = _format_labels(dict(zip(self.label_names, key)))
+            lines.append(f'{self.name}{labels} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas"""
+    
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = TIME_BUCKETS):
+        """
+        Args:
+            name: Nombre de la métrica
+            help_text: Descripción
+            label_names: Nombres de las etiquetas
+            buckets: Límites superiores de los buckets (ordenados)
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # Por serie: [conteo por bucket (+Inf al final), suma]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels: str) -> None:
+        """Registra una observación en la serie con esas etiquetas"""
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    def render(self) -> list[str]:
+        """Líneas de la métrica en formato de texto de Prometheus"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series_list = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        
+        for key, (counts, total) in series_list:
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, 'le': _format_value(bound)})
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Métricas del proceso
+    
+    Cada worker de gunicorn tiene su propio registro: /metrics reporta el
+    worker que atiende la petición.
+    """
+    
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], list[str]]] = []
+    
+    def counter(self, name: str, help_text: str, label_names: tuple[str, ...] = ()) -> Counter:
+        """Crea y registra un contador"""
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(self, name: str, help_text: str, label_names: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = TIME_BUCKETS) -> Histogram:
+        """Crea y registra un histograma"""
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+    
+    def add_collector(self, collector: Callable[[], list[str]]) -> None:
+        """
+        Registra una función que produce líneas al momento de exportar
+        
+        Args:
+            collector: Devuelve líneas ya formateadas (p. ej. con gauge_lines)
+        """
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+def gauge_lines(name: str, help_text: str, values: dict[tuple, float],
+                label_names: tuple[str, ...] = (), metric_type: str = 'gauge') -> list[str]:
+    """
+    Formatea una métrica leída al momento de exportar (para add_collector)
+    
+    Args:
+        name: Nombre de la métrica
+        help_text: Descripción
+        values: Valor por tupla de etiquetas (() si no tiene)
+        label_names: Nombres de las etiquetas
+        metric_type: 'gauge' o 'counter'
+    
+    Returns:
+        Líneas en formato de texto de Prometheus
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+    for key, value in values.items():
+        lines.append(f'{name}{_format_labels(dict(zip(label_names, key)))} {_format_value(value)}')
+    return lines
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'twilio_monitor_request_seconds',
+    'Duración de las peticiones HTTP',
+    ('endpoint', 'status')
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    'twilio_monitor_stage_seconds',
+    'Tiempo por etapa dentro de una petición (twilio, convert, filter, unique_users, serialize)',
+    ('endpoint', 'stage')
+)
+REQUEST_UPSTREAM_CALLS = REGISTRY.histogram(
+    'twilio_monitor_request_upstream_calls',
+    'Peticiones a Twilio (páginas) por petición',
+    ('endpoint',),
+    COUNT_BUCKETS
+)
+REQUEST_ROWS = REGISTRY.histogram(
+    'twilio_monitor_request_rows',
+    'Mensajes leídos (scanned) y que cumplen los filtros (returned) por petición',
+    ('endpoint', 'kind'),
+    COUNT_BUCKETS
+)
+UPSTREAM_CALLS = REGISTRY.counter(
+    'twilio_monitor_upstream_calls_total',
+    'Peticiones HTTP a Twilio (incluye precargas y sincronizaciones en segundo plano)',
+    ('engine', 'status')
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    'twilio_monitor_cache_lookups_total',
+    'Consultas a los cachés (páginas, ventanas, servicios) por resultado',
+    ('cache', 'result')
+)
+
+
+class RequestTimings:
+    """
+    Tiempos por etapa, cantidades y notas acumulados durante una petición
+    
+    Los hilos que trabajan para la petición (descargas en paralelo, el event
+    loop) comparten el mismo objeto, así que las etapas pueden sumar más que
+    la duración total de la petición.
+    """
+    
+    __slots__ = ('started', 'stages', 'counts', 'notes', '_lock')
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.notes: dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, stage: str, seconds: float) -> None:
+        """Suma tiempo a una etapa"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+    
+    def count(self, name: str, amount: int = 1) -> None:
+        """Suma a una cantidad (upstream_calls, rows_scanned, rows_returned)"""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+    
+    def server_timing(self) -> str:
+        """Valor del encabezado Server-Timing"""
+        entries = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in self.stages.items()]
+        entries += [f'{name};desc="{amount}"' for name, amount in self.counts.items()]
+        entries += [f'{name};desc="{note}"' for name, note in self.notes.items()]
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+def begin_request() -> Any:
+    """
+    Empieza a medir la petición en curso
+    
+    Returns:
+        Token para end_request
+    """
+    return _current.set(RequestTimings())
+
+
+def end_request(token: Any) -> None:
+    """Deja de medir la petición (el hilo queda libre para la siguiente)"""
+    _current.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Mediciones de la petición en curso (None fuera de una petición)"""
+    return _current.get()
+
+
+def observe_request(timings: RequestTimings, endpoint: str, status: int) -> None:
+    """
+    Vuelca las mediciones de una petición terminada en los histogramas
+    
+    Args:
+        timings: Mediciones de la petición
+        endpoint: Endpoint de Flask que la atendió
+        status: Código HTTP de la respuesta
+    """
+    REQUEST_SECONDS.observe(time.perf_counter() - timings.started, endpoint=endpoint, status=str(status))
+    for stage, seconds in timings.stages.items():
+        STAGE_SECONDS.observe(seconds, endpoint=endpoint, stage=stage)
+    
+    counts = timings.counts
+    if 'upstream_calls' in counts:
+        REQUEST_UPSTREAM_CALLS.observe(counts['upstream_calls'], endpoint=endpoint)
+    if 'rows_scanned' in counts:
+        REQUEST_ROWS.observe(counts['rows_scanned'], endpoint=endpoint, kind='scanned')
+        REQUEST_ROWS.observe(counts.get('rows_returned', 0), endpoint=endpoint, kind='returned')
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Suma tiempo medido por el llamador a una etapa de la petición en curso"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Suma a una cantidad de la petición en curso"""
+    timings = _current.get()
+    if timings is not None:
+        timings.count(name, amount)
+
+
+def note(name: str, value: str) -> None:
+    """Anota un resultado en la petición en curso (p. ej. cache=hit)"""
+    timings = _current.get()
+    if timings is not None:
+        timings.notes[name] = value
+
+
+def cache_lookup(cache: str, result: str) -> None:
+    """
+    Registra una consulta a un caché
+    
+    Args:
+        cache: 'pages', 'windows' o 'services'
+        result: 'hit', 'stale' o 'miss'
+    """
+    CACHE_LOOKUPS.inc(cache=cache, result=result)
+    note(f'{cache}_cache', result)
+
+
+def upstream_call(engine: str, status: int) -> None:
+    """Registra una petición HTTP a Twilio"""
+    UPSTREAM_CALLS.inc(engine=engine, status=str(status))
+    count('upstream_calls')
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Mide el bloque como parte de una etapa de la petición en curso"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, time.perf_counter() - started)
+
+
+def _close(iterator: Iterator) -> None:
+    """Cierra un iterador si es un generador (libera el stream de Twilio)"""
+    close = getattr(iterator, 'close', None)
+    if close is not None:
+        close()
+
+
+def timed_iter(iterable: Iterable, stage: str) -> Iterator:
+    """
+    Mide el tiempo que tarda un iterable en producir cada elemento
+    
+    El tiempo se suma elemento por elemento: lo que leen otros hilos para la
+    petición ya figura cuando ésta responde, aunque ellos sigan leyendo.
+    
+    Args:
+        iterable: Iterable a medir (p. ej. el stream de Twilio)
+        stage: Etapa a la que se suma el tiempo
+    
+    Returns:
+        Iterador con los mismos elementos
+    """
+    timings = _current.get()
+    iterator = iter(iterable)
+    perf_counter = time.perf_counter
+    try:
+        while True:
+            started = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                if timings is not None:
+                    timings.add(stage, perf_counter() - started)
+            yield item
+    finally:
+        _close(iterator)
+
+
+def timed_map(fn: Callable[[Any], Any], iterable: Iterable, stage: str) -> Iterator:
+    """
+    Aplica fn a cada elemento midiendo sólo el tiempo de fn
+    
+    Args:
+        fn: Función a aplicar (p. ej. Message.from_twilio_message)
+        iterable: Elementos de entrada
+        stage: Etapa a la que se suma el tiempo
+    
+    Returns:
+        Iterador con los resultados
+    """
+    timings = _current.get()
+    iterator = iter(iterable)
+    perf_counter = time.perf_counter
+    try:
+        for item in iterator:
+            if timings is None:
+                yield fn(item)
+                continue
+            started = perf_counter()
+            result = fn(item)
+            timings.add(stage, perf_counter() - started)
+            yield result
+    finally:
+        _close(iterator)
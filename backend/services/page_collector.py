@@ -0,0 +1,117 @@
+"""
+Acumulador de páginas sobre un stream ordenado de mensajes
+"""
+from typing import Callable, Optional
+
+from ..models.message import Message, MessageFilter, PaginatedResponse
+from .unique_user_counter import UniqueUserCounter
+
+
+class PageCollector:
+    """
+    Aplica los filtros y recorta la página pedida mientras se recorre un stream
+    
+    Es independiente de cómo se descargan los mensajes, así el motor síncrono
+    y el asíncrono comparten exactamente la misma lógica de paginación.
+    """
+    
+    def __init__(self, filters: MessageFilter, page: int, per_page: int,
+                 matcher: Optional[Callable[[Message], bool]] = None,
+                 max_discarded: int = 1000):
+        """
+        Args:
+            filters: Filtros a aplicar
+            page: Número de página (empieza en 1)
+            per_page: Mensajes por página
+            matcher: Filtros que faltan por aplicar al stream (default: todos)
+            max_discarded: Mensajes sin coincidencia que admite cada página de
+                resultados; al superarlos la página se cierra con lo que tenga
+                y la siguiente sigue leyendo (scan_truncated en la respuesta)
+        """
+        self.filters = filters
+        self.matcher = matcher or filters.compile_matcher()
+        self.page = page
+        self.per_page = per_page
+        self.target_end = page * per_page
+        self.max_discarded = max_discarded
+        
+        self.results: list[Message] = []
+        self.messages_processed = 0
+        self.pages_closed = 0
+        self.in_page = 0
+        self.discarded = 0
+        self.truncated = False
+        self.stopped = False
+        
+        # Usuarios únicos de toda la búsqueda, sin guardar los mensajes
+        self.unique_users = UniqueUserCounter(filters)
+    
+    @property
+    def upstream_limit(self) -> int:
+        """Máximo de mensajes a leer de Twilio: cada página con sus descartes, y uno más"""
+        return self.target_end + (self.page + 1) * (self.max_discarded + 1)
+    
+    def add(self, message: Message) -> bool:
+        """
+        Procesa un mensaje del stream
+        
+        Las páginas se cierran igual que en MessageWindow: al llenarse o al
+        superar el máximo de descartes, así ambos caminos dan las mismas páginas.
+        
+        Args:
+            message: Siguiente mensaje del stream
+        
+        Returns:
+            True si ya no hace falta seguir leyendo
+        """
+        if not self.matcher(message):
+            self.discarded += 1
+            if self.discarded > self.max_discarded:
+                self.truncated = True
+                self._close_page()
+                self.stopped = self.pages_closed >= self.page
+            return self.stopped
+        
+        self.unique_users.add(message)
+        self.messages_processed += 1
+        
+        # Con uno más allá de la página ya se sabe que hay más
+        if self.pages_closed == self.page:
+            self.stopped = True
+            return True
+        
+        if self.pages_closed == self.page - 1:
+            self.results.append(message)
+        self.in_page += 1
+        if self.in_page == self.per_page:
+            self._close_page()
+        return False
+    
+    def _close_page(self) -> None:
+        """Cierra la página en curso; la siguiente empieza con otro máximo de descartes"""
+        self.pages_closed += 1
+        self.in_page = 0
+        self.discarded = 0
+    
+    def to_response(self) -> PaginatedResponse:
+        """
+        Construye la respuesta paginada con lo acumulado
+        
+        Returns:
+            Respuesta paginada (total y total_pages estimados mientras la
+            lectura no haya llegado al final de la búsqueda)
+        """
+        pages = self.pages_closed
+        if not self.stopped and self.in_page:
+            pages += 1  # Última página, incompleta
+        
+        return PaginatedResponse(
+            messages=self.results,
+            page=self.page,
+            per_page=self.per_page,
+            total=self.messages_processed,
+            total_pages=max(pages + (1 if self.stopped else 0), 1),
+            has_more=self.stopped,
+            unique_users=self.unique_users.count(),
+            scan_truncated=self.truncated
+        )
@@ -0,0 +1,113 @@
+"""
+Precarga en segundo plano de la página siguiente de una búsqueda
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+import threading
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class PagePrefetcher:
+    """
+    Precarga la página siguiente mientras el usuario lee la actual
+    
+    Cada usuario (sesión) tiene una sola búsqueda vigente: al pedir una
+    página con otros filtros, las precargas pendientes de la búsqueda
+    anterior se descartan sin llegar a Twilio. Los hilos y las tareas en
+    cola están acotados; si la cola está llena la precarga simplemente no
+    se hace.
+    """
+    
+    # Sesiones recordadas (las más antiguas se olvidan)
+    MAX_OWNERS = 1024
+    
+    def __init__(self, max_workers: int = 2, max_pending: int = 8):
+        """
+        Args:
+            max_workers: Hilos que ejecutan precargas
+            max_pending: Precargas en cola o en curso como máximo
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='page-prefetch'
+        )
+        self._max_pending = max_pending
+        self._pending: set[str] = set()
+        self._searches: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._scheduled = 0
+        self._completed = 0
+        self._cancelled = 0
+        self._dropped = 0
+    
+    def set_search(self, owner: str, search_key: str) -> None:
+        """
+        Registra la búsqueda que el usuario está viendo
+        
+        Args:
+            owner: Identificador de la sesión
+            search_key: Cuenta y filtros de la búsqueda
+        """
+        with self._lock:
+            self._searches[owner] = search_key
+            self._searches.move_to_end(owner)
+            while len(self._searches) > self.MAX_OWNERS:
+                self._searches.popitem(last=False)
+    
+    def schedule(self, owner: str, search_key: str, task_key: str,
+                 fn: Callable[[], Any]) -> bool:
+        """
+        Encola una precarga salvo que ya esté en cola o no haya lugar
+        
+        Args:
+            owner: Identificador de la sesión
+            search_key: Búsqueda a la que pertenece la página
+            task_key: Clave de la página (misma que usa CacheService)
+            fn: Consulta y guarda la página en caché
+        
+        Returns:
+            True si se encoló
+        """
+        with self._lock:
+            if task_key in self._pending:
+                return False
+            if len(self._pending) >= self._max_pending:
+                self._dropped += 1
+                return False
+            self._pending.add(task_key)
+            self._scheduled += 1
+        
+        self._executor.submit(self._run, owner, search_key, task_key, fn)
+        return True
+    
+    def _run(self, owner: str, search_key: str, task_key: str, fn: Callable[[], Any]) -> None:
+        """Ejecuta la precarga si la búsqueda sigue vigente"""
+        try:
+            with self._lock:
+                is_current = self._searches.get(owner) == search_key
+                if not is_current:
+                    self._cancelled += 1
+            if is_current:
+                fn()
+                with self._lock:
+                    self._completed += 1
+        except Exception as e:
+            logger.warning(f"Error al precargar página: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(task_key)
+    
+    def stats(self) -> dict:
+        """Contadores de precargas de este worker"""
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'scheduled': self._scheduled,
+                'completed': self._completed,
+                'cancelled': self._cancelled,
+                'dropped': self._dropped
+            }
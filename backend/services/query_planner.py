@@ -0,0 +1,190 @@
+"""
+Planificador de consultas: cómo leer de Twilio los mensajes de un MessageFilter
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+import math
+
+from ..models.message import Message, MessageFilter
+
+
+@dataclass
+class QueryPlan:
+    """Streams de Twilio a leer para una búsqueda y lo que queda por filtrar en memoria"""
+    
+    strategy: str  # 'sid', 'empty', 'stream', 'streams' o 'scan'
+    streams: list[dict]  # Parámetros de Twilio de cada stream (se combinan por fecha)
+    matcher: Callable[[Message], bool]  # Filtros residuales compilados
+    estimated_rows: float = 0.0  # Mensajes que se espera leer de Twilio
+    estimated_cost: float = 0.0  # Filas leídas + peticiones, en filas equivalentes
+
+
+class QueryPlanner:
+    """
+    Elige el plan más barato para leer una búsqueda desde Twilio
+    
+    Twilio sólo filtra por from, to y fecha. Cada sentido de una conversación
+    es un stream; los números de los filtros se unifican con cada sentido
+    (un sentido incompatible se descarta y uno contenido en otro sobra). Si
+    la conversación necesita dos streams, se compara su costo con el de un
+    solo stream por fecha que filtra la conversación en memoria: en rangos
+    cortos una sola petición sale más barata que dos. Lo que Twilio no
+    garantiza se evalúa con MessageFilter.compile_matcher.
+    """
+    
+    # Fracción estimada de los mensajes de la cuenta en los que participa un número
+    NUMBER_SELECTIVITY = 0.05
+    
+    # Costo de una petición a Twilio, en filas leídas equivalentes (latencia fija)
+    REQUEST_COST_ROWS = 100
+    
+    # Días que se suponen para búsquedas sin fecha_inicio
+    OPEN_RANGE_DAYS = 30
+    
+    def __init__(self, page_size: int = 100, messages_per_day: float = 2000):
+        """
+        Args:
+            page_size: Mensajes por página de Twilio
+            messages_per_day: Volumen supuesto de la cuenta (para estimar costos)
+        """
+        self._page_size = page_size
+        self._messages_per_day = messages_per_day
+    
+    def plan(self, filters: MessageFilter) -> QueryPlan:
+        """
+        Plan de lectura de una búsqueda
+        
+        Args:
+            filters: Filtros de la búsqueda
+        
+        Returns:
+            Plan con los streams y el matcher residual
+        """
+        if filters.sid:
+            # Se lee el mensaje por SID; el resto de filtros se evalúa sobre él
+            return QueryPlan(
+                'sid',
+                [],
+                filters.compile_matcher(pushed={'sid'}),
+                1.0,
+                self.REQUEST_COST_ROWS + 1.0
+            )
+        
+        base_params = {}
+        if filters.fecha_inicio:
+            base_params['date_sent_after'] = filters.fecha_inicio
+        if filters.fecha_final:
+            base_params['date_sent_before'] = filters.fecha_final
+        range_rows = self._range_rows(filters)
+        
+        streams = self._direction_streams(filters)
+        if not streams:
+            return self._empty_plan()
+        
+        candidates = [self._streams_plan(filters, streams, base_params, range_rows)]
+        if len(streams) > 1:
+            candidates.append(self._scan_plan(filters, streams, base_params, range_rows))
+        
+        return min(candidates, key=lambda plan: plan.estimated_cost)
+    
+    def _direction_streams(self, filters: MessageFilter) -> list[dict]:
+        """
+        Restricciones from/to de cada stream necesario
+        
+        Returns:
+            Lista de restricciones ({'from_': ..., 'to': ...}); vacía si
+            ningún mensaje puede cumplir los filtros
+        """
+        fixed = {}
+        if filters.numero_from:
+            fixed['from_'] = filters.numero_from
+        if filters.numero_to:
+            fixed['to'] = filters.numero_to
+        
+        if not filters.numero_from_to:
+            return [fixed]
+        
+        # Twilio no admite OR entre from y to: un stream por sentido
+        outgoing = {'from_': filters.numero_from_to}
+        incoming = {'to': filters.numero_from_to}
+        if filters.numero_contraparte:
+            outgoing['to'] = filters.numero_contraparte
+            incoming['from_'] = filters.numero_contraparte
+        
+        streams = []
+        for direction in (outgoing, incoming):
+            unified = _unify(direction, fixed)
+            if unified is not None:
+                streams.append(unified)
+        
+        # Un stream con más restricciones que otro sólo trae repetidos
+        return [
+            stream for i, stream in enumerate(streams)
+            if not any(
+                j != i and other.items() <= stream.items() and (other != stream or j < i)
+                for j, other in enumerate(streams)
+            )
+        ]
+    
+    def _streams_plan(self, filters: MessageFilter, streams: list[dict],
+                      base_params: dict, range_rows: float) -> QueryPlan:
+        """Un stream por sentido, con todos los números resueltos en Twilio"""
+        pushed = set()
+        if filters.numero_from_to:
+            pushed.add('numero_from_to')  # Cada sentido ya es parte de la conversación
+        if filters.numero_from and all(stream.get('from_') == filters.numero_from for stream in streams):
+            pushed.add('numero_from')
+        if filters.numero_to and all(stream.get('to') == filters.numero_to for stream in streams):
+            pushed.add('numero_to')
+        
+        rows = [range_rows * self.NUMBER_SELECTIVITY ** len(stream) for stream in streams]
+        return QueryPlan(
+            'streams' if len(streams) > 1 else 'stream',
+            [{**base_params, **stream} for stream in streams],
+            filters.compile_matcher(pushed=pushed),
+            sum(rows),
+            sum(self._stream_cost(stream_rows) for stream_rows in rows)
+        )
+    
+    def _scan_plan(self, filters: MessageFilter, streams: list[dict],
+                   base_params: dict, range_rows: float) -> QueryPlan:
+        """Un solo stream con lo común a todos los sentidos; la conversación se filtra en memoria"""
+        common = dict(set.intersection(*(set(stream.items()) for stream in streams)))
+        pushed = {
+            field for field, param in (('numero_from', 'from_'), ('numero_to', 'to'))
+            if param in common
+        }
+        rows = range_rows * self.NUMBER_SELECTIVITY ** len(common)
+        return QueryPlan(
+            'scan',
+            [{**base_params, **common}],
+            filters.compile_matcher(pushed=pushed),
+            rows,
+            self._stream_cost(rows)
+        )
+    
+    def _stream_cost(self, rows: float) -> float:
+        """Costo de leer un stream: filas más una petición por página (al menos una)"""
+        requests = max(1, math.ceil(rows / self._page_size))
+        return rows + requests * self.REQUEST_COST_ROWS
+    
+    def _range_rows(self, filters: MessageFilter) -> float:
+        """Mensajes estimados de la cuenta en el rango de fechas de la búsqueda"""
+        end = filters.fecha_final or datetime.now()
+        start = filters.fecha_inicio or end - timedelta(days=self.OPEN_RANGE_DAYS)
+        days = max((end - start).total_seconds(), 60) / 86400
+        return days * self._messages_per_day
+    
+    @staticmethod
+    def _empty_plan() -> QueryPlan:
+        """Plan de una búsqueda que ningún mensaje puede cumplir"""
+        return QueryPlan('empty', [], lambda message: False)
+
+
+def _unify(direction: dict, fixed: dict) -> Optional[dict]:
+    """Combina las restricciones de un sentido con from/to fijos (None si se contradicen)"""
+    for param, value in fixed.items():
+        if direction.get(param, value) != value:
+            return None
+    return {**direction, **fixed}
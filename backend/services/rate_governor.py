@@ -0,0 +1,265 @@
+"""
+Control adaptativo de tasa y concurrencia hacia la API de Twilio
+"""
+from twilio.http.http_client import TwilioHttpClient
+from twilio.http.response import Response
+from typing import Optional
+import asyncio
+import random
+import threading
+import time
+import logging
+
+from ..utils.twilio_errors import RateLimitExceeded, parse_retry_after
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateGovernor:
+    """
+    Token bucket con ajuste AIMD y límite de peticiones simultáneas por cuenta
+    
+    Cada respuesta correcta sube la tasa un poco (aumento aditivo) y cada 429
+    la reduce a la mitad (disminución multiplicativa) y pausa la cuenta durante
+    el Retry-After. Así se sostiene la tasa más alta que Twilio acepte.
+    """
+    
+    # Tiempo mínimo entre dos reducciones: varios 429 de la misma ráfaga cuentan una vez
+    DECREASE_COOLDOWN_SECONDS = 1.0
+    
+    # Intervalo de sondeo del motor asíncrono cuando no hay turno
+    ASYNC_POLL_SECONDS = 0.05
+    
+    def __init__(self, initial_rate: float = 10.0, min_rate: float = 1.0,
+                 max_rate: float = 100.0, max_concurrency: int = 8,
+                 increase_step: float = 1.0, decrease_factor: float = 0.5,
+                 max_retries: int = 4, backoff_base: float = 0.5,
+                 backoff_cap: float = 20.0, max_wait_seconds: float = 30.0):
+        """
+        Args:
+            initial_rate: Peticiones por segundo al arrancar
+            min_rate: Tasa mínima tras reducciones
+            max_rate: Tasa máxima tras aumentos
+            max_concurrency: Peticiones simultáneas por cuenta
+            increase_step: Aumento de la tasa por respuesta correcta
+            decrease_factor: Factor aplicado a la tasa con cada 429
+            max_retries: Reintentos de una petición rechazada con 429
+            backoff_base: Espera base del backoff exponencial (segundos)
+            backoff_cap: Espera máxima de un reintento (segundos)
+            max_wait_seconds: Espera máxima por un turno antes de rendirse
+        """
+        self.max_retries = max_retries
+        self._rate = initial_rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._max_concurrency = max_concurrency
+        self._increase_step = increase_step
+        self._decrease_factor = decrease_factor
+        self._backoff_base = backoff_base
+        self._backoff_cap = backoff_cap
+        self._max_wait = max_wait_seconds
+        
+        self._tokens = float(max_concurrency)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        
+        self._requests = 0
+        self._throttled = 0
+        self._retries = 0
+        self._exhausted = 0
+        self._wait_seconds = 0.0
+        self._max_in_flight = 0
+    
+    def _try_acquire(self) -> float:
+        """
+        Intenta tomar un token y un turno de concurrencia (con el lock tomado)
+        
+        Returns:
+            0 si se obtuvo el turno; si no, segundos sugeridos de espera
+        """
+        now = time.monotonic()
+        self._tokens = min(
+            float(self._max_concurrency),
+            self._tokens + (now - self._last_refill) * self._rate
+        )
+        self._last_refill = now
+        
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight >= self._max_concurrency:
+            return self.ASYNC_POLL_SECONDS
+        if self._tokens < 1:
+            return (1 - self._tokens) / self._rate
+        
+        self._tokens -= 1
+        self._in_flight += 1
+        self._requests += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        return 0.0
+    
+    def acquire(self) -> None:
+        """
+        Espera un turno para hacer una petición (hilos de Flask)
+        
+        Raises:
+            RateLimitExceeded: Si no hay turno dentro de max_wait_seconds
+        """
+        started = time.monotonic()
+        
+        with self._condition:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    break
+                
+                remaining = self._max_wait - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise RateLimitExceeded(
+                        "Twilio está limitando la cuenta, intenta de nuevo en unos segundos",
+                        retry_after=wait
+                    )
+                self._condition.wait(min(wait, remaining))
+            
+            self._wait_seconds += time.monotonic() - started
+    
+    async def acquire_async(self) -> None:
+        """
+        Espera un turno sin bloquear el event loop
+        
+        Raises:
+            RateLimitExceeded: Si no hay turno dentro de max_wait_seconds
+        """
+        started = time.monotonic()
+        
+        while True:
+            with self._condition:
+                wait = self._try_acquire()
+                if wait == 0:
+                    self._wait_seconds += time.monotonic() - started
+                    return
+            
+            remaining = self._max_wait - (time.monotonic() - started)
+            if remaining <= 0:
+                raise RateLimitExceeded(
+                    "Twilio está limitando la cuenta, intenta de nuevo en unos segundos",
+                    retry_after=wait
+                )
+            await asyncio.sleep(min(wait, remaining, self.ASYNC_POLL_SECONDS * 4))
+    
+    def release(self) -> None:
+        """Libera el turno de concurrencia tomado con acquire"""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+    
+    def on_success(self) -> None:
+        """Aumento aditivo tras una respuesta aceptada"""
+        with self._condition:
+            self._rate = min(self._max_rate, self._rate + self._increase_step)
+    
+    def on_throttle(self, retry_after: Optional[float]) -> None:
+        """
+        Disminución multiplicativa tras un 429
+        
+        Args:
+            retry_after: Segundos indicados por Twilio (Retry-After)
+        """
+        with self._condition:
+            now = time.monotonic()
+            self._throttled += 1
+            
+            if now - self._last_decrease >= self.DECREASE_COOLDOWN_SECONDS:
+                self._rate = max(self._min_rate, self._rate * self._decrease_factor)
+                self._last_decrease = now
+            
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._tokens = min(self._tokens, 0.0)
+    
+    def backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """
+        Espera antes de reintentar: Retry-After o backoff exponencial con jitter
+        
+        Args:
+            attempt: Número de reintento (empieza en 0)
+            retry_after: Segundos indicados por Twilio
+        
+        Returns:
+            Segundos a esperar
+        """
+        with self._condition:
+            self._retries += 1
+        
+        jitter = random.uniform(0, self._backoff_base)
+        if retry_after is not None:
+            return retry_after + jitter
+        return min(self._backoff_cap, self._backoff_base * 2 ** attempt) + jitter
+    
+    def on_exhausted(self) -> None:
+        """Registra una petición que se rindió tras agotar los reintentos"""
+        with self._condition:
+            self._exhausted += 1
+    
+    def stats(self) -> dict:
+        """Métricas de limitación de la cuenta"""
+        with self._condition:
+            return {
+                'rate': round(self._rate, 2),
+                'in_flight': self._in_flight,
+                'max_in_flight': self._max_in_flight,
+                'requests': self._requests,
+                'throttled': self._throttled,
+                'retries': self._retries,
+                'exhausted': self._exhausted,
+                'wait_seconds': round(self._wait_seconds, 3)
+            }
+
+
+class GovernedHttpClient(TwilioHttpClient):
+    """TwilioHttpClient que pasa cada petición por el RateGovernor de la cuenta"""
+    
+    def __init__(self, governor: RateGovernor, **kwargs):
+        """
+        Args:
+            governor: Governor de la cuenta
+            **kwargs: Argumentos de TwilioHttpClient
+        """
+        super().__init__(**kwargs)
+        self.governor = governor
+    
+    def request(self, method, url, params=None, data=None, headers=None,
+                auth=None, timeout=None, allow_redirects=False) -> Response:
+        attempt = 0
+        
+        while True:
+            self.governor.acquire()
+            try:
+                response = super().request(
+                    method, url, params=params, data=data, headers=headers,
+                    auth=auth, timeout=timeout, allow_redirects=allow_redirects
+                )
+            finally:
+                self.governor.release()
+            
+            metrics.upstream_call('sync', response.status_code)
+            if response.status_code != 429:
+                self.governor.on_success()
+                return response
+            
+            retry_after = parse_retry_after(response.headers)
+            self.governor.on_throttle(retry_after)
+            
+            if attempt >= self.governor.max_retries:
+                # El SDK convierte el 429 en excepción con los encabezados intactos
+                self.governor.on_exhausted()
+                return response
+            
+            delay = self.governor.backoff_delay(attempt, retry_after)
+            logger.warning(f"Twilio respondió 429, reintento {attempt + 1} en {delay:.1f}s")
+            attempt += 1
+            time.sleep(delay)
@@ -0,0 +1,108 @@
+"""
+Coalescencia de peticiones (single-flight) para consultas idénticas en vuelo
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import threading
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """Ejecución en vuelo compartida por todos los que piden la misma clave"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class RequestCoalescer:
+    """
+    Garantiza una sola ejecución por clave a la vez
+    
+    Las peticiones concurrentes con la misma clave esperan a la que ya está
+    en vuelo y comparten su resultado (o su excepción).
+    """
+    
+    def __init__(self, max_background_workers: int = 4):
+        """
+        Args:
+            max_background_workers: Hilos para refrescos en segundo plano
+        """
+        self._in_flight: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_background_workers,
+            thread_name_prefix='cache-refresh'
+        )
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Ejecuta fn una sola vez para todas las peticiones concurrentes con la clave
+        
+        Args:
+            key: Clave de la consulta (misma que usa CacheService)
+            fn: Función que consulta el origen
+            
+        Returns:
+            Resultado de fn (propio o compartido)
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._in_flight[key] = call
+        
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        self._run(key, call, fn)
+        if call.error is not None:
+            raise call.error
+        return call.result
+    
+    def do_async(self, key: str, fn: Callable[[], Any]) -> bool:
+        """
+        Lanza fn en segundo plano salvo que ya haya una ejecución en vuelo
+        
+        Se usa para stale-while-revalidate: quien llama responde con el valor
+        obsoleto y sólo un refresco por clave llega al origen.
+        
+        Args:
+            key: Clave de la consulta
+            fn: Función que consulta el origen
+            
+        Returns:
+            True si se lanzó un refresco nuevo
+        """
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            call = _Call()
+            self._in_flight[key] = call
+        
+        self._executor.submit(self._run, key, call, fn)
+        return True
+    
+    def in_flight(self) -> int:
+        """Número de consultas en vuelo"""
+        return len(self._in_flight)
+    
+    def _run(self, key: str, call: _Call, fn: Callable[[], Any]) -> None:
+        """Ejecuta fn, publica el resultado y libera la clave"""
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            logger.error(f"Error en consulta coalescida {key}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
@@ -0,0 +1,125 @@
+"""
+Catálogo de servicios (números de teléfono) de cada cuenta
+"""
+from twilio.rest import Client
+from typing import Optional
+import time
+
+from ..utils.json_utils import EncodedResponse
+from .cache_service import CacheService, generate_cache_key
+from .request_coalescer import RequestCoalescer
+from . import metrics
+
+
+class ServiceCatalog:
+    """
+    Números de la cuenta para el selector de servicios, cacheados por cuenta
+    
+    La lista casi nunca cambia: se sirve desde caché y, pasado
+    refresh_seconds, se sigue sirviendo mientras se vuelve a leer en segundo
+    plano (hasta max_age_seconds; después la lectura vuelve a ser bloqueante).
+    Se recorren todas las páginas de IncomingPhoneNumbers.
+    """
+    
+    # Números por página de Twilio (el máximo que acepta la API)
+    PAGE_SIZE = 1000
+    
+    def __init__(self, cache_service: CacheService,
+                 request_coalescer: Optional[RequestCoalescer] = None,
+                 refresh_seconds: int = 900, max_age_seconds: int = 86400):
+        """
+        Args:
+            cache_service: Caché donde se guarda el catálogo de cada cuenta
+            request_coalescer: Single-flight para lecturas de la misma cuenta
+            refresh_seconds: Antigüedad a partir de la cual se refresca en segundo plano
+            max_age_seconds: Antigüedad máxima con la que se sirve el catálogo
+        """
+        self._cache = cache_service
+        self._coalescer = request_coalescer or RequestCoalescer()
+        self._refresh_seconds = refresh_seconds
+        self._max_age_seconds = max(max_age_seconds, refresh_seconds)
+    
+    def get(self, account_sid: str, client: Client) -> EncodedResponse:
+        """
+        Catálogo de la cuenta, desde caché si está disponible
+        
+        Args:
+            account_sid: SID de la cuenta
+            client: Cliente de Twilio de la cuenta (para leer o refrescar)
+        
+        Returns:
+            Respuesta serializada {'success': True, 'services': [...]}; el
+            ETag sólo cambia si cambian los números
+        """
+        key = {'servicios': account_sid}
+        flight_key = generate_cache_key(key)
+        
+        def fetch_and_cache() -> EncodedResponse:
+            started = time.time()
+            encoded = EncodedResponse({
+                'success': True,
+                'services': self.fetch_services(client)
+            })
+            self._cache.set(
+                key,
+                encoded,
+                ttl_seconds=self._refresh_seconds,
+                stale_ttl_seconds=self._max_age_seconds - self._refresh_seconds,
+                computed_at=started
+            )
+            return encoded
+        
+        cached, is_stale = self._cache.get_with_staleness(key)
+        if cached is not None:
+            metrics.cache_lookup('services', 'stale' if is_stale else 'hit')
+            if is_stale:
+                self._coalescer.do_async(flight_key, fetch_and_cache)
+            return cached
+        
+        metrics.cache_lookup('services', 'miss')
+        return self._coalescer.do(flight_key, fetch_and_cache)
+    
+    def fetch_services(self, client: Client) -> list[dict]:
+        """
+        Lee de Twilio todos los números entrantes de la cuenta
+        
+        Args:
+            client: Cliente de Twilio de la cuenta
+        
+        Returns:
+            Lista de servicios (un número de WhatsApp por número entrante)
+        """
+        services = []
+        seen_numbers = set()
+        
+        for number in client.incoming_phone_numbers.stream(page_size=self.PAGE_SIZE):
+            base_number = number.phone_number
+            
+            # Evitar duplicados
+            if base_number in seen_numbers:
+                continue
+            seen_numbers.add(base_number)
+            
+            # Crear servicio con prefijo whatsapp: (asumiendo que todos usan WhatsApp)
+            # Si usas SMS regular, ajusta esta lógica
+            phone_number = f"whatsapp:{base_number}"
+            service_type = 'WhatsApp'
+            
+            # Si prefieres detectar automáticamente, descomenta esto:
+            # if hasattr(number, 'sms_url') and number.sms_url:
+            #     if 'whatsapp' in str(number.sms_url).lower():
+            #         service_type = 'WhatsApp'
+            #         phone_number = f"whatsapp:{base_number}"
+            #     else:
+            #         service_type = 'SMS'
+            #         phone_number = base_number
+            
+            services.append({
+                'sid': number.sid,
+                'phone_number': phone_number,
+                'friendly_name': number.friendly_name or base_number,
+                'service_type': service_type,
+                'capabilities': number.capabilities
+            })
+        
+        return services
@@ -0,0 +1,171 @@
+"""
+Descarga paralela por tramos de fecha para rangos amplios
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Optional
+import contextvars
+import math
+import queue
+import threading
+
+from ..models.message import Message
+
+
+_DONE = object()
+
+
+class ShardedFetcher:
+    """
+    Divide un rango de fechas en tramos y los descarga en paralelo
+    
+    Los tramos se entregan en orden (del más reciente al más antiguo), así el
+    consumidor ve el mismo orden que un único stream de Twilio. Cada tramo tiene
+    una cola acotada, por lo que la memoria no depende del tamaño del rango.
+    """
+    
+    def __init__(self, concurrency: int = 4, shard_hours: int = 24,
+                 max_shards: int = 32, buffer_size: int = 5000,
+                 alignment: timedelta = timedelta(0)):
+        """
+        Args:
+            concurrency: Tramos descargándose a la vez
+            shard_hours: Duración de cada tramo
+            max_shards: Máximo de tramos (se agrandan si el rango es muy amplio)
+            buffer_size: Mensajes adelantados por tramo
+            alignment: Desfase de los cortes respecto a la medianoche (p. ej. para
+                cortar en la medianoche UTC cuando las fechas son locales)
+        """
+        self._concurrency = concurrency
+        self._shard_hours = shard_hours
+        self._max_shards = max_shards
+        self._buffer_size = buffer_size
+        self._origin = datetime(1970, 1, 1) + alignment
+    
+    def split(self, start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+        """
+        Divide [start, end) en tramos, del más reciente al más antiguo
+        
+        Los cortes caen en múltiplos de shard_hours desde el origen alineado, así
+        cada tramo coincide con días completos del filtro de Twilio.
+        
+        Args:
+            start: Inicio del rango
+            end: Fin del rango (exclusivo)
+        
+        Returns:
+            Lista de tramos (inicio, fin)
+        """
+        shard = timedelta(hours=self._shard_hours)
+        shard *= max(math.ceil((end - start) / shard / self._max_shards), 1)
+        
+        boundary = self._origin + ((end - self._origin) // shard) * shard
+        if boundary >= end:
+            boundary -= shard
+        
+        shards = []
+        shard_end = end
+        while shard_end > start:
+            shard_start = max(boundary, start)
+            shards.append((shard_start, shard_end))
+            shard_end = shard_start
+            boundary -= shard
+        
+        return shards
+    
+    def iter_messages(
+        self,
+        fetch_shard: Callable[[datetime, datetime], Iterator[Message]],
+        start: datetime,
+        end: datetime,
+        limit: Optional[int] = None
+    ) -> Iterator[Message]:
+        """
+        Recorre el rango completo descargando los tramos en paralelo
+        
+        Args:
+            fetch_shard: Función que devuelve el stream de Twilio de un tramo
+            start: Inicio del rango
+            end: Fin del rango (exclusivo)
+        
+        Returns:
+            Iterador de mensajes del más reciente al más antiguo
+        """
+        shards = self.split(start, end)
+        stop = threading.Event()
+        buffers = [queue.Queue(maxsize=self._buffer_size) for _ in shards]
+        
+        # Pool propio por recorrido: los tramos se encolan en orden, así el que
+        # espera el consumidor siempre ya empezó y no hay bloqueos entre peticiones
+        executor = ThreadPoolExecutor(
+            max_workers=min(self._concurrency, len(shards)) or 1,
+            thread_name_prefix='twilio-shard'
+        )
+        
+        delivered = 0
+        
+        try:
+            for index, (shard_start, shard_end) in enumerate(shards):
+                # Con el contexto de la petición: sus lecturas cuentan en sus métricas
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._run_shard,
+                    fetch_shard,
+                    shard_start,
+                    shard_end,
+                    index == 0,
+                    buffers[index],
+                    stop
+                )
+            
+            for buffer in buffers:
+                while limit is None or delivered < limit:
+                    entry = buffer.get()
+                    if entry is _DONE:
+                        break
+                    ok, value = entry
+                    if not ok:
+                        raise value
+                    delivered += 1
+                    yield value
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _run_shard(self, fetch_shard, shard_start: datetime, shard_end: datetime,
+                   include_undated: bool, buffer: queue.Queue, stop: threading.Event) -> None:
+        """
+        Descarga un tramo y lo deja en su cola
+        
+        Twilio filtra por día, así que cada tramo recorta por fecha exacta para
+        no repetir mensajes del tramo vecino. Los 429 los reintenta el
+        RateGovernor del cliente: un error que llega aquí ya es definitivo.
+        """
+        def put(entry) -> bool:
+            while not stop.is_set():
+                try:
+                    buffer.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        stream = None
+        try:
+            stream = fetch_shard(shard_start, shard_end)
+            for message in stream:
+                if message.date_sent is None:
+                    in_shard = include_undated
+                else:
+                    in_shard = shard_start <= message.date_sent < shard_end
+                if in_shard and not put((True, message)):
+                    return
+        except Exception as e:
+            put((False, e))
+            return
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+        
+        put(_DONE)
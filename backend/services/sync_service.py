@@ -0,0 +1,339 @@
+"""
+Motor de sincronización incremental entre Twilio y el almacén local
+"""
+from datetime import datetime, timedelta, timezone
+import threading
+import time
+import logging
+
+from ..models.message import Message
+from ..utils.date_utils import to_epoch, from_epoch
+from .message_store import MessageStore
+
+
+logger = logging.getLogger(__name__)
+
+
+class MessageSyncService:
+    """Sincroniza los mensajes de una cuenta de Twilio hacia su MessageStore"""
+    
+    BATCH_SIZE = 500
+    LEASE_SECONDS = 120
+    
+    def __init__(self, client, store: MessageStore, timezone_offset_hours: int = 0,
+                 page_size: int = 100, backfill_days: int = 30,
+                 sync_interval_seconds: int = 20, overlap_seconds: int = 300,
+                 webhook_sync_interval_seconds: int = 300,
+                 status_refresh_interval_seconds: int = 600,
+                 status_refresh_window_seconds: int = 6 * 3600):
+        """
+        Inicializa el motor de sincronización
+        
+        Args:
+            client: Cliente de Twilio ya autenticado
+            store: Almacén local de la cuenta
+            timezone_offset_hours: Horas a restar para ajuste de zona horaria
+            page_size: Tamaño de página para consultas a Twilio
+            backfill_days: Días de historial a descargar (0 = todo el historial)
+            sync_interval_seconds: Intervalo mínimo entre sincronizaciones incrementales
+            overlap_seconds: Ventana que se vuelve a leer para capturar cambios de estado
+            webhook_sync_interval_seconds: Intervalo mientras llegan webhooks de la
+                cuenta y la última sincronización confirmó que cubren todos sus
+                mensajes (el almacén ya está al día; la sincronización sólo cubre huecos)
+            status_refresh_interval_seconds: Intervalo entre relecturas de los
+                mensajes anteriores al solapamiento con estado no final
+            status_refresh_window_seconds: Antigüedad máxima de esos mensajes
+        """
+        self._client = client
+        self._store = store
+        self._timezone_offset = timezone_offset_hours
+        self._page_size = page_size
+        self._backfill_days = backfill_days
+        self._sync_interval = sync_interval_seconds
+        self._overlap = overlap_seconds
+        self._webhook_sync_interval = webhook_sync_interval_seconds
+        self._status_refresh_interval = status_refresh_interval_seconds
+        self._status_refresh_window = status_refresh_window_seconds
+    
+    def ensure_synced(self) -> None:
+        """
+        Mantiene el almacén al día sin hacer esperar a la petición
+        
+        Lanza en segundo plano el backfill inicial si no ha terminado y una
+        sincronización incremental si ya pasó el intervalo. La petición se
+        sirve con lo que ya tiene el almacén.
+        """
+        if not self._store.get_state('backfill_complete'):
+            self._start_backfill()
+        
+        interval = self._webhook_sync_interval if self._webhooks_cover() else self._sync_interval
+        last_sync_at = self._store.get_state('last_sync_at')
+        if last_sync_at and time.time() - last_sync_at < interval:
+            return
+        
+        self._start_incremental()
+    
+    def sync_incremental(self) -> int:
+        """
+        Ejecuta una sincronización incremental en el hilo actual
+        
+        Returns:
+            Número de mensajes sincronizados (0 si otro proceso la está ejecutando)
+        """
+        if self._store.get_state('high_water_mark') is None:
+            # El backfill todavía no fija el punto de partida
+            return 0
+        
+        if not self._store.try_acquire_lease('incremental', self.LEASE_SECONDS):
+            return 0
+        
+        return self._run_incremental()
+    
+    def _start_incremental(self) -> None:
+        """Lanza la sincronización incremental en un hilo si nadie la está ejecutando"""
+        if self._store.get_state('high_water_mark') is None:
+            return
+        
+        if not self._store.try_acquire_lease('incremental', self.LEASE_SECONDS):
+            return
+        
+        thread = threading.Thread(
+            target=self._run_incremental,
+            name='message-store-sync',
+            daemon=True
+        )
+        thread.start()
+    
+    def _webhooks_cover(self) -> bool:
+        """Indica si llegan webhooks y la última sincronización confirmó que cubren la cuenta"""
+        last_webhook_at = self._store.get_state('last_webhook_at')
+        return bool(
+            last_webhook_at and time.time() - last_webhook_at < self._webhook_sync_interval
+            and self._store.get_state('webhook_coverage')
+        )
+    
+    def _run_incremental(self) -> int:
+        """
+        Descarga sólo los mensajes más nuevos que la marca de agua alta (con el lease tomado)
+        
+        También comprueba si los webhooks cubren la cuenta: si todos los
+        mensajes nuevos de esta sincronización ya habían llegado por webhook
+        (p. ej. los enviados por la API sin status callback no llegan), se
+        guarda webhook_coverage y ensure_synced puede espaciar las
+        sincronizaciones. Sin webhooks, además relee de vez en cuando los
+        estados que pueden haber cambiado fuera del solapamiento.
+        
+        Returns:
+            Número de mensajes sincronizados
+        """
+        high_water_mark = self._store.get_state('high_water_mark')
+        synced = 0
+        new_messages = 0
+        covered = 0
+        try:
+            threshold = high_water_mark - self._overlap
+            messages_stream = self._client.messages.stream(
+                page_size=self._page_size,
+                date_sent_after=self._to_utc(threshold)
+            )
+            
+            batch = []
+            for twilio_msg in messages_stream:
+                message = Message.from_twilio_message(twilio_msg, self._timezone_offset)
+                
+                # Twilio devuelve primero los más recientes: al cruzar el umbral terminamos
+                if message.date_sent and to_epoch(message.date_sent) < threshold:
+                    break
+                
+                batch.append(message)
+                if len(batch) >= self.BATCH_SIZE:
+                    batch_new, batch_covered = self._webhook_coverage(batch, high_water_mark)
+                    new_messages += batch_new
+                    covered += batch_covered
+                    synced += self._flush(batch)
+                    batch = []
+            
+            batch_new, batch_covered = self._webhook_coverage(batch, high_water_mark)
+            new_messages += batch_new
+            covered += batch_covered
+            synced += self._flush(batch)
+            
+            state = {'last_sync_at': time.time()}
+            if new_messages:
+                # Sin mensajes nuevos no hay nada que confirme ni desmienta la cobertura
+                state['webhook_coverage'] = int(covered == new_messages)
+            self._store.set_state(**state)
+            
+            # Con webhooks los cambios de estado ya llegan por status callback
+            if not self._webhooks_cover():
+                self._refresh_statuses(threshold)
+        
+        except Exception as e:
+            logger.error(f"Error en sincronización incremental: {e}")
+        finally:
+            self._store.release_lease('incremental')
+        
+        return synced
+    
+    def _refresh_statuses(self, threshold: int) -> int:
+        """
+        Relee los mensajes anteriores al solapamiento cuyo estado todavía puede cambiar
+        
+        El solapamiento sólo vuelve a leer los últimos minutos: un 'sent' que
+        pasa a 'delivered', o un 'delivered' que pasa a 'read' una hora
+        después, no se vería. Cada status_refresh_interval se relee desde el
+        más antiguo de esos mensajes (dentro de status_refresh_window) hasta
+        donde empieza el solapamiento.
+        
+        Args:
+            threshold: Inicio del solapamiento de esta sincronización (epoch local)
+        
+        Returns:
+            Número de mensajes releídos
+        """
+        now = time.time()
+        last_refresh_at = self._store.get_state('last_status_refresh_at')
+        if last_refresh_at and now - last_refresh_at < self._status_refresh_interval:
+            return 0
+        
+        refreshed = 0
+        oldest = self._store.oldest_pending_date(threshold - self._status_refresh_window, threshold)
+        if oldest is not None:
+            messages_stream = self._client.messages.stream(
+                page_size=self._page_size,
+                date_sent_after=self._to_utc(oldest),
+                date_sent_before=self._to_utc(threshold)
+            )
+            
+            batch = []
+            for twilio_msg in messages_stream:
+                batch.append(Message.from_twilio_message(twilio_msg, self._timezone_offset))
+                if len(batch) >= self.BATCH_SIZE:
+                    refreshed += self._flush(batch)
+                    self._store.renew_lease('incremental', self.LEASE_SECONDS)
+                    batch = []
+            refreshed += self._flush(batch)
+        
+        self._store.set_state(last_status_refresh_at=now)
+        return refreshed
+    
+    def _webhook_coverage(self, batch: list[Message], high_water_mark: int) -> tuple[int, int]:
+        """
+        Cuenta los mensajes nuevos del lote y cuántos ya habían llegado por webhook
+        
+        Args:
+            batch: Mensajes de la sincronización, antes de guardarlos
+            high_water_mark: Marca de agua alta anterior a la sincronización
+        
+        Returns:
+            Tupla (mensajes nuevos, mensajes nuevos ya guardados)
+        """
+        new_sids = [
+            msg.sid for msg in batch
+            if msg.date_sent is None or to_epoch(msg.date_sent) > high_water_mark
+        ]
+        return len(new_sids), len(self._store.known_sids(new_sids))
+    
+    def _start_backfill(self) -> None:
+        """Inicia el backfill en un hilo si ningún otro proceso lo está ejecutando"""
+        if not self._store.try_acquire_lease('backfill', self.LEASE_SECONDS):
+            return
+        
+        thread = threading.Thread(
+            target=self._run_backfill,
+            name='message-store-backfill',
+            daemon=True
+        )
+        thread.start()
+    
+    def _run_backfill(self) -> None:
+        """
+        Descarga el historial del más reciente al más antiguo
+        
+        Si se interrumpe, retoma desde la marca de agua baja guardada.
+        """
+        try:
+            boundary = None
+            params = {}
+            
+            if self._backfill_days > 0:
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+                start = now - timedelta(hours=self._timezone_offset, days=self._backfill_days)
+                boundary = to_epoch(start)
+                params['date_sent_after'] = self._to_utc(boundary)
+            
+            low_water_mark = self._store.get_state('low_water_mark')
+            if low_water_mark is not None:
+                params['date_sent_before'] = self._to_utc(low_water_mark)
+            
+            messages_stream = self._client.messages.stream(
+                page_size=self._page_size,
+                **params
+            )
+            
+            batch = []
+            for twilio_msg in messages_stream:
+                batch.append(Message.from_twilio_message(twilio_msg, self._timezone_offset))
+                if len(batch) >= self.BATCH_SIZE:
+                    self._flush(batch, extend_low_water_mark=True)
+                    self._store.renew_lease('backfill', self.LEASE_SECONDS)
+                    batch = []
+            
+            self._flush(batch, extend_low_water_mark=True)
+            
+            if boundary is None:
+                self._store.set_state(backfill_complete=1, history_complete=1)
+            else:
+                self._store.set_state(backfill_complete=1, low_water_mark=boundary)
+            
+            if self._store.get_state('high_water_mark') is None:
+                # Cuenta sin mensajes: arrancar el incremental desde ahora
+                self._store.set_state(high_water_mark=boundary or to_epoch(datetime(1970, 1, 1)))
+            
+            logger.info("Backfill del almacén local completado")
+        
+        except Exception as e:
+            logger.error(f"Error en backfill del almacén local: {e}")
+        finally:
+            self._store.release_lease('backfill')
+    
+    def _flush(self, batch: list[Message], extend_low_water_mark: bool = False) -> int:
+        """
+        Guarda un lote y actualiza las marcas de agua
+        
+        Args:
+            batch: Mensajes a guardar
+            extend_low_water_mark: Si el lote extiende el rango cubierto hacia atrás
+        
+        Returns:
+            Número de mensajes guardados
+        """
+        if not batch:
+            return 0
+        
+        written = self._store.upsert_messages(batch)
+        
+        dates = [to_epoch(msg.date_sent) for msg in batch if msg.date_sent]
+        if not dates:
+            return written
+        
+        state = {}
+        high_water_mark = self._store.get_state('high_water_mark')
+        if high_water_mark is None or max(dates) > high_water_mark:
+            state['high_water_mark'] = max(dates)
+        
+        if extend_low_water_mark:
+            # Puede haber más mensajes en el mismo segundo en la página siguiente
+            covered = min(dates) + 1
+            low_water_mark = self._store.get_state('low_water_mark')
+            if low_water_mark is None or covered < low_water_mark:
+                state['low_water_mark'] = covered
+        
+        if state:
+            self._store.set_state(**state)
+        
+        return written
+    
+    def _to_utc(self, local_epoch: int) -> datetime:
+        """Convierte una marca local (epoch ajustado a zona horaria) a datetime UTC"""
+        return from_epoch(local_epoch) + timedelta(hours=self._timezone_offset)
@@ -0,0 +1,341 @@
+"""
+Registro de clientes de Twilio reutilizables por cuenta
+"""
+from twilio.rest import Client
+from requests.adapters import HTTPAdapter
+from typing import Callable, Optional, TypeVar
+import hashlib
+import threading
+import time
+import weakref
+import logging
+
+from ..utils.async_utils import run_in_loop
+from .rate_governor import RateGovernor, GovernedHttpClient
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class _RegistryEntry:
+    """Cliente HTTP registrado junto con los clientes de Twilio que lo usan"""
+    
+    def __init__(self, http_client, auth_token: str, token_hash: str):
+        self.http_client = http_client
+        self.auth_token = auth_token
+        self.token_hash = token_hash
+        self.last_used = time.time()
+        self.leases = 0
+        self.retired = False
+
+
+class TwilioClientRegistry:
+    """
+    Mantiene un cliente de Twilio (con su pool HTTP keep-alive) por Account SID
+    
+    Evita crear un Client y pagar un handshake TLS nuevo en cada petición.
+    Cada token de la cuenta tiene su propio pool (un token secundario o
+    rotado no desplaza al otro). Cada llamada a get_client() entrega un
+    Client propio sobre el pool compartido: mientras exista, el pool no se
+    cierra, así un desalojo por inactividad o un token invalidado no corta
+    una exportación o un feed en curso. Un token nuevo se prueba con verify()
+    antes de registrarlo. Los clientes síncrono y asíncrono de una cuenta comparten
+    su RateGovernor, así todas las peticiones de la cuenta respetan el mismo límite.
+    """
+    
+    def __init__(self, pool_size: int = 10, idle_seconds: int = 900,
+                 timeout: Optional[float] = None,
+                 governor_options: Optional[dict] = None,
+                 api_base_url: str = ''):
+        """
+        Args:
+            pool_size: Conexiones HTTP persistentes por cuenta
+            idle_seconds: Segundos sin uso antes de desalojar un cliente
+            timeout: Timeout de las peticiones HTTP (segundos)
+            governor_options: Argumentos de RateGovernor para cada cuenta
+            api_base_url: URL base de la API de mensajes (vacío = la de Twilio)
+        """
+        self._pool_size = pool_size
+        self._idle_seconds = idle_seconds
+        self._timeout = timeout
+        self._governor_options = governor_options or {}
+        self._api_base_url = api_base_url
+        self._governors: dict[str, RateGovernor] = {}
+        self._entries: dict[tuple[str, str, str], _RegistryEntry] = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+    
+    def get_client(self, account_sid: str, auth_token: str) -> Client:
+        """
+        Obtiene el cliente de la cuenta, creándolo si no existe
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+            auth_token: Token de autenticación
+            
+        Returns:
+            Cliente de Twilio con pool de conexiones (el pool sigue abierto
+            mientras exista el cliente)
+        """
+        return self._get('sync', account_sid, auth_token)
+    
+    def get_async_client(self, account_sid: str, auth_token: str) -> Client:
+        """
+        Obtiene el cliente asíncrono (AsyncTwilioHttpClient) de la cuenta
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+            auth_token: Token de autenticación
+            
+        Returns:
+            Cliente de Twilio para usar en el event loop compartido
+        """
+        return self._get('async', account_sid, auth_token)
+    
+    def get_latest_client(self, account_sid: str) -> Optional[Client]:
+        """
+        Obtiene un cliente de la cuenta con el token usado más recientemente
+        
+        Para trabajos de la cuenta que no pertenecen a una sesión (p. ej. el
+        sondeo de un feed en vivo): un token invalidado deja de usarse y se
+        toma el de la última sesión que usó la cuenta.
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+        
+        Returns:
+            Cliente de Twilio, o None si la cuenta no tiene un pool vigente
+        """
+        with self._lock:
+            entries = [
+                entry for (kind, sid, _), entry in self._entries.items()
+                if kind == 'sync' and sid == account_sid
+            ]
+            if not entries:
+                return None
+            entry = max(entries, key=lambda candidate: candidate.last_used)
+            entry.leases += 1
+            self._reused += 1
+        
+        return self._lease(account_sid, entry)
+    
+    def get_governor(self, account_sid: str) -> RateGovernor:
+        """
+        Obtiene el RateGovernor de la cuenta, creándolo si no existe
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+            
+        Returns:
+            Governor compartido por los clientes de la cuenta
+        """
+        with self._lock:
+            return self._get_governor(account_sid)
+    
+    def _get_governor(self, account_sid: str) -> RateGovernor:
+        """Busca o crea el governor de la cuenta (llamar con el lock tomado)"""
+        governor = self._governors.get(account_sid)
+        if governor is None:
+            governor = RateGovernor(**self._governor_options)
+            self._governors[account_sid] = governor
+        return governor
+    
+    def verify(self, account_sid: str, auth_token: str,
+               check: Callable[[Client], T]) -> T:
+        """
+        Prueba unas credenciales sin desplazar el cliente registrado de la cuenta
+        
+        Si el token es el del cliente registrado se usa ese cliente; si no, la
+        prueba se hace con un cliente temporal que se cierra al terminar.
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+            auth_token: Token de autenticación a probar
+            check: Consulta a Twilio con el cliente (lanza si se rechazan)
+        
+        Returns:
+            Lo que retorne check
+        """
+        token_hash = hashlib.sha256(auth_token.encode()).hexdigest()
+        
+        with self._lock:
+            registered = ('sync', account_sid, token_hash) in self._entries
+        
+        if registered:
+            return check(self.get_client(account_sid, auth_token))
+        
+        with self._lock:
+            governor = self._get_governor(account_sid)
+        http_client = self._create_http_client(governor)
+        try:
+            return check(self._new_client(account_sid, auth_token, http_client))
+        finally:
+            self._close(http_client)
+    
+    def invalidate(self, account_sid: str, auth_token: Optional[str] = None) -> None:
+        """
+        Descarta los clientes de una cuenta (p. ej. credenciales rechazadas)
+        
+        Args:
+            account_sid: SID de la cuenta de Twilio
+            auth_token: Descartar sólo los clientes creados con este token
+        """
+        token_hash = hashlib.sha256(auth_token.encode()).hexdigest() if auth_token else None
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if key[1] == account_sid and token_hash in (None, key[2])
+            ]
+            closable = [self._retire(key) for key in keys]
+        for http_client in closable:
+            if http_client is not None:
+                self._close(http_client)
+    
+    def _get(self, kind: str, account_sid: str, auth_token: str) -> Client:
+        """Busca o crea el pool del tipo indicado ('sync' o 'async') y entrega un cliente sobre él"""
+        token_hash = hashlib.sha256(auth_token.encode()).hexdigest()
+        key = (kind, account_sid, token_hash)
+        now = time.time()
+        
+        with self._lock:
+            closable = self._evict_idle(now)
+            
+            entry = self._entries.get(key)
+            if entry is None:
+                governor = self._get_governor(account_sid)
+                if kind == 'async':
+                    http_client = run_in_loop(self._create_async_http_client(governor))
+                else:
+                    http_client = self._create_http_client(governor)
+                entry = _RegistryEntry(http_client, auth_token, token_hash)
+                self._entries[key] = entry
+                self._created += 1
+            else:
+                self._reused += 1
+            
+            entry.last_used = now
+            entry.leases += 1
+        
+        for http_client in closable:
+            self._close(http_client)
+        
+        return self._lease(account_sid, entry)
+    
+    def _lease(self, account_sid: str, entry: _RegistryEntry) -> Client:
+        """Entrega un cliente sobre un pool cuyo uso ya se contó en leases"""
+        client = self._new_client(account_sid, entry.auth_token, entry.http_client)
+        # El pool queda en uso hasta que el cliente se libera
+        weakref.finalize(client, self._release, entry)
+        return client
+    
+    def _release(self, entry: _RegistryEntry) -> None:
+        """Termina un uso del pool; cierra el pool retirado cuando ya nadie lo usa"""
+        with self._lock:
+            entry.leases -= 1
+            entry.last_used = time.time()
+            closable = entry.retired and entry.leases == 0
+        if closable:
+            self._close(entry.http_client)
+    
+    def _retire(self, key: tuple[str, str, str]):
+        """
+        Saca un pool del registro (llamar con el lock tomado)
+        
+        Returns:
+            El cliente HTTP si ya se puede cerrar; si no, lo cierra el último _release
+        """
+        entry = self._entries.pop(key)
+        entry.retired = True
+        return entry.http_client if entry.leases == 0 else None
+    
+    def stats(self) -> dict:
+        """Retorna estadísticas del registro"""
+        with self._lock:
+            governors = list(self._governors.items())
+        
+        throttle = {}
+        for account_sid, governor in governors:
+            # Sólo el final del SID: /health no debe exponer cuentas completas
+            throttle[f"...{account_sid[-6:]}"] = governor.stats()
+        
+        return {
+            'clients': len(self._entries),
+            'created': self._created,
+            'reused': self._reused,
+            'throttle': throttle
+        }
+    
+    def _create_http_client(self, governor: RateGovernor) -> GovernedHttpClient:
+        """Crea una sesión HTTP con su propio pool de conexiones"""
+        http_client = GovernedHttpClient(
+            governor,
+            pool_connections=True,
+            timeout=self._timeout
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self._pool_size,
+            pool_maxsize=self._pool_size
+        )
+        http_client.session.mount('https://', adapter)
+        return http_client
+    
+    async def _create_async_http_client(self, governor: RateGovernor):
+        """Crea una sesión HTTP asíncrona dentro del event loop compartido"""
+        # Importación diferida: aiohttp sólo se necesita con el motor asíncrono
+        from aiohttp import ClientSession, TCPConnector
+        from .governed_async_http_client import GovernedAsyncHttpClient
+        
+        http_client = GovernedAsyncHttpClient(
+            governor,
+            pool_connections=False,
+            timeout=self._timeout
+        )
+        http_client.session = ClientSession(
+            connector=TCPConnector(limit_per_host=self._pool_size)
+        )
+        return http_client
+    
+    def _new_client(self, account_sid: str, auth_token: str, http_client) -> Client:
+        """
+        Crea un Client sobre una sesión HTTP existente (no abre conexiones)
+        
+        El dominio api (mensajes, cuentas y números) apunta a api_base_url si se configuró.
+        """
+        client = Client(account_sid, auth_token, http_client=http_client)
+        if self._api_base_url:
+            client.api.base_url = self._api_base_url
+        return client
+    
+    def _evict_idle(self, now: float) -> list:
+        """
+        Desaloja los pools sin uso reciente y sin clientes vivos (llamar con el lock tomado)
+        
+        Returns:
+            Clientes HTTP a cerrar (fuera del lock)
+        """
+        idle = [
+            key for key, entry in self._entries.items()
+            if entry.leases == 0 and now - entry.last_used > self._idle_seconds
+        ]
+        closable = [self._retire(key) for key in idle]
+        
+        # El governor se descarta junto con el último pool de la cuenta
+        active = {account_sid for _, account_sid, _ in self._entries}
+        for account_sid in list(self._governors):
+            if account_sid not in active:
+                del self._governors[account_sid]
+        return closable
+    
+    @staticmethod
+    def _close(http_client) -> None:
+        """Cierra una sesión HTTP descartada"""
+        try:
+            if getattr(http_client, 'is_async', False):
+                run_in_loop(http_client.close())
+            elif getattr(http_client, 'session', None) is not None:
+                http_client.session.close()
+        except Exception as e:
+            logger.warning(f"Error al cerrar sesión HTTP de Twilio: {e}")
@@ -2,10 +2,28 @@
 Servicio para interactuar con la API de Twilio
 """
 from twilio.rest import Client
-from typing import Optional
+from twilio.base import values
+from typing import Callable, Optional, Iterator
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
 import logging
+import time
 
-from ..models.message import Message, MessageFilter, PaginatedResponse
+from ..models.message import Message, MessageBatch, MessageFilter, PaginatedResponse
+from ..utils.cursor_utils import encode_cursor, decode_cursor
+from ..utils.date_utils import to_epoch
+from ..utils.async_utils import run_in_loop
+from ..utils.stream_utils import prefetch_iterator, merge_newest_first, take_until_before
+from ..utils.twilio_errors import is_rate_limit_error
+from .message_store import MessageStore
+from .page_collector import PageCollector
+from .message_window import MessageWindow, MessageWindowCache
+from .async_twilio_service import AsyncTwilioService
+from .sync_service import MessageSyncService
+from .sharded_fetcher import ShardedFetcher
+from .unique_user_counter import UniqueUserCounter
+from .query_planner import QueryPlan, QueryPlanner
+from . import metrics
 
 
 logger = logging.getLogger(__name__)
@@ -14,8 +32,27 @@ logger = logging.getLogger(__name__)
 class TwilioService:
     """Servicio para consultar mensajes de Twilio"""
     
+    # Máximo de páginas de Twilio que se leen por petición en modo cursor
+    CURSOR_MAX_UPSTREAM_PAGES = 10
+    
+    # Lecturas más cortas no compensan los tramos que se descargan por adelantado
+    # (se compara con las filas que se espera leer, no con el máximo de descartes)
+    SHARD_MIN_SCAN = 5000
+    
     def __init__(self, account_sid: str, auth_token: str, 
-                 timezone_offset_hours: int = 0, page_size: int = 100):
+                 timezone_offset_hours: int = 0, page_size: int = 100,
+                 message_store: Optional[MessageStore] = None,
+                 store_backfill_days: int = 30,
+                 store_sync_interval_seconds: int = 20,
+                 store_webhook_sync_interval_seconds: int = 300,
+                 client: Optional[Client] = None,
+                 async_client: Optional[Client] = None,
+                 shard_concurrency: int = 0,
+                 shard_hours: int = 24,
+                 shard_min_range_hours: int = 72,
+                 plan_messages_per_day: float = 2000,
+                 max_discarded_rows: int = 1000,
+                 window_cache: Optional[MessageWindowCache] = None):
         """
         Inicializa el servicio de Twilio
         
@@ -24,10 +61,59 @@ class TwilioService:
             auth_token: Token de autenticación
             timezone_offset_hours: Horas a restar para ajuste de zona horaria
             page_size: Tamaño de página para consultas a Twilio
+            message_store: Almacén local de la cuenta (opcional)
+            store_backfill_days: Días de historial a sincronizar en el almacén
+            store_sync_interval_seconds: Intervalo mínimo entre sincronizaciones
+            store_webhook_sync_interval_seconds: Intervalo mientras llegan webhooks
+            client: Cliente de Twilio ya creado (p. ej. del TwilioClientRegistry)
+            async_client: Cliente con AsyncTwilioHttpClient; activa el motor asíncrono
+            shard_concurrency: Tramos de fecha descargados en paralelo (0 = desactivado)
+            shard_hours: Duración de cada tramo
+            shard_min_range_hours: Rango mínimo de fechas para dividir la consulta
+            plan_messages_per_day: Volumen supuesto de la cuenta al elegir cómo leer
+                de Twilio (ver QueryPlanner)
+            max_discarded_rows: Mensajes sin coincidencia que una búsqueda lee de
+                Twilio por cada página de resultados antes de cortar la lectura
+                (scan_truncated en la respuesta)
+            window_cache: Ventanas de resultados compartidas entre páginas (opcional)
         """
-        self._client = Client(account_sid, auth_token)
+        self._account_sid = account_sid
+        self._client = client or Client(account_sid, auth_token)
         self._timezone_offset = timezone_offset_hours
         self._page_size = page_size
+        self._message_store = message_store
+        self._sync_service = None
+        self._async_service = None
+        self._sharded_fetcher = None
+        self._shard_min_range = timedelta(hours=shard_min_range_hours)
+        self._window_cache = window_cache
+        self._planner = QueryPlanner(page_size=page_size, messages_per_day=plan_messages_per_day)
+        self._max_discarded_rows = max_discarded_rows
+        
+        if shard_concurrency > 0:
+            self._sharded_fetcher = ShardedFetcher(
+                concurrency=shard_concurrency,
+                shard_hours=shard_hours,
+                alignment=timedelta(hours=-timezone_offset_hours)
+            )
+        
+        if async_client is not None:
+            self._async_service = AsyncTwilioService(
+                async_client,
+                timezone_offset_hours=timezone_offset_hours,
+                page_size=page_size
+            )
+        
+        if message_store is not None:
+            self._sync_service = MessageSyncService(
+                self._client,
+                message_store,
+                timezone_offset_hours=timezone_offset_hours,
+                page_size=page_size,
+                backfill_days=store_backfill_days,
+                sync_interval_seconds=store_sync_interval_seconds,
+                webhook_sync_interval_seconds=store_webhook_sync_interval_seconds
+            )
     
     def get_message_by_sid(self, sid: str) -> Optional[Message]:
         """
@@ -39,10 +125,15 @@ class TwilioService:
         Returns:
             Mensaje encontrado o None si no existe
         """
+        if self._async_service is not None:
+            return run_in_loop(self._async_service.get_message_by_sid(sid))
+        
         try:
             twilio_msg = self._client.messages(sid).fetch()
             return Message.from_twilio_message(twilio_msg, self._timezone_offset)
         except Exception as e:
+            if is_rate_limit_error(e):
+                raise
             logger.error(f"Error al obtener mensaje con SID {sid}: {e}")
             return None
     
@@ -50,7 +141,8 @@ class TwilioService:
         self,
         filters: MessageFilter,
         page: int = 1,
-        per_page: int = 50
+        per_page: int = 50,
+        order_by_relevance: bool = False
     ) -> PaginatedResponse:
         """
         Obtiene mensajes paginados aplicando filtros
@@ -59,14 +151,17 @@ class TwilioService:
             filters: Filtros a aplicar
             page: Número de página (empieza en 1)
             per_page: Mensajes por página
-            
+            order_by_relevance: Ordenar por relevancia de body_search (sólo
+                desde el almacén local; Twilio siempre entrega por fecha)
+        
         Returns:
             Respuesta paginada con mensajes
         """
-        # Si hay SID específico, búsqueda directa
-        if filters.sid:
-            message = self.get_message_by_sid(filters.sid)
-            messages = [message] if message and filters.matches(message) else []
+        plan = self._plan(filters)
+        
+        # Si hay SID específico, búsqueda directa (sin streams también si los filtros se contradicen)
+        if not plan.streams:
+            messages = self._lookup(filters, plan)
             
             # Calcular usuarios únicos (excluir el servicio)
             unique_users = self._count_unique_users(messages, filters)
@@ -78,15 +173,428 @@ class TwilioService:
                 total=len(messages),
                 total_pages=1,
                 has_more=False,
-                unique_users=unique_users
+                unique_users=unique_users,
+                total_exact=True
             )
         
+        # Responder desde el almacén local si cubre el rango pedido
+        if self._sync_service is not None:
+            self._sync_service.ensure_synced()
+            if self._message_store.covers(filters):
+                with metrics.timed('store'):
+                    return self._query_store(filters, page, per_page, order_by_relevance)
+        
         # Búsqueda paginada
-        return self._fetch_paginated_messages(filters, page, per_page)
+        return self._fetch_paginated_messages(filters, plan, page, per_page)
+    
+    def iter_messages(self, filters: MessageFilter) -> Iterator[Message]:
+        """
+        Recorre todos los mensajes que cumplen los filtros, sin paginar
+        
+        Lee del almacén local si cubre el rango; si no, del stream de Twilio.
+        Los mensajes se producen uno a uno, así la memoria no depende del total.
+        
+        Args:
+            filters: Filtros a aplicar
+        
+        Returns:
+            Iterador de mensajes del más reciente al más antiguo
+        """
+        plan = self._plan(filters)
+        
+        if not plan.streams:
+            yield from self._lookup(filters, plan)
+            return
+        
+        if self._sync_service is not None:
+            self._sync_service.ensure_synced()
+            if self._message_store.covers(filters):
+                yield from self._message_store.iter_messages(filters)
+                return
+        
+        for message in self._iter_filtered_upstream(filters, plan):
+            if plan.matcher(message):
+                yield message
+    
+    def iter_recent_messages(self, filters: MessageFilter) -> Iterator[Message]:
+        """
+        Recorre los mensajes directamente en Twilio, sin pasar por el almacén local
+        
+        Para sondeos en vivo: el almacén se sincroniza cada varios segundos y
+        el llamador corta el recorrido al llegar a lo que ya había visto.
+        
+        Args:
+            filters: Filtros a aplicar (fecha_inicio acota la lectura)
+        
+        Returns:
+            Iterador de mensajes del más reciente al más antiguo
+        """
+        plan = self._plan(filters)
+        messages = self._iter_filtered_upstream(filters, plan, utc_range=True)
+        try:
+            for message in messages:
+                if plan.matcher(message):
+                    yield message
+        finally:
+            close = getattr(messages, 'close', None)
+            if close is not None:
+                close()
+    
+    def count_messages(self, filters: MessageFilter,
+                       unique_users: Optional[UniqueUserCounter] = None) -> int:
+        """
+        Cuenta exactamente los mensajes que cumplen los filtros
+        
+        Con el almacén local es un COUNT; si no, recorre el stream de Twilio
+        sin guardar los mensajes.
+        
+        Args:
+            filters: Filtros a aplicar
+            unique_users: Contador que se alimenta con los mismos mensajes (opcional)
+        
+        Returns:
+            Número de mensajes
+        """
+        plan = self._plan(filters)
+        
+        if plan.streams and self._sync_service is not None:
+            self._sync_service.ensure_synced()
+            if self._message_store.covers(filters):
+                if unique_users is None:
+                    return self._message_store.count_messages(filters)
+                messages = self._message_store.iter_messages(filters)
+                return self._count_into(messages, plan.matcher, unique_users)
+        
+        messages = self._iter_filtered_upstream(filters, plan, utc_range=True)
+        return self._count_into(messages, plan.matcher, unique_users)
+    
+    @staticmethod
+    def _count_into(messages: Iterator[Message], matcher: Callable[[Message], bool],
+                    unique_users: Optional[UniqueUserCounter]) -> int:
+        """Cuenta los mensajes que cumplen los filtros alimentando el contador de usuarios"""
+        total = 0
+        for message in messages:
+            if matcher(message):
+                total += 1
+                if unique_users is not None:
+                    unique_users.add(message)
+        return total
+    
+    def _query_store(
+        self,
+        filters: MessageFilter,
+        page: int,
+        per_page: int,
+        order_by_relevance: bool = False
+    ) -> PaginatedResponse:
+        """
+        Responde la búsqueda paginada desde el almacén local
+        
+        Args:
+            filters: Filtros a aplicar
+            page: Número de página
+            per_page: Mensajes por página
+            order_by_relevance: Ordenar por relevancia de body_search
+        
+        Returns:
+            Respuesta paginada con total exacto
+        """
+        total = self._message_store.count_messages(filters)
+        if order_by_relevance and filters.body_search:
+            find_messages = self._message_store.find_messages_by_relevance
+        else:
+            find_messages = self._message_store.find_messages
+        messages = find_messages(
+            filters,
+            limit=per_page,
+            offset=(page - 1) * per_page
+        )
+        total_pages = (total + per_page - 1) // per_page
+        
+        return PaginatedResponse(
+            messages=messages,
+            page=page,
+            per_page=per_page,
+            total=total,
+            total_pages=total_pages,
+            has_more=page < total_pages,
+            unique_users=self._message_store.count_unique_users(filters),
+            total_exact=True
+        )
+    
+    def get_messages_by_cursor(
+        self,
+        filters: MessageFilter,
+        per_page: int = 50,
+        cursor: Optional[str] = None
+    ) -> PaginatedResponse:
+        """
+        Obtiene la siguiente página de mensajes a partir de un cursor opaco
+        
+        A diferencia de get_paginated_messages, no vuelve a recorrer el stream
+        desde el inicio: el cursor guarda la posición (page token de Twilio o
+        último date_sent/sid visto en el almacén local).
+        
+        Args:
+            filters: Filtros a aplicar
+            per_page: Mensajes por página
+            cursor: Cursor devuelto en la respuesta anterior (None = primera página)
+        
+        Returns:
+            Respuesta paginada con next_cursor
+        
+        Raises:
+            ValueError: Si el cursor es inválido o no corresponde a los filtros
+        """
+        state = decode_cursor(cursor) if cursor else {}
+        fingerprint = filters.fingerprint()
+        
+        if state and state.get('f') != fingerprint:
+            raise ValueError("El cursor no corresponde a los filtros de la búsqueda")
+        
+        plan = self._plan(filters)
+        
+        # Con SID no hay nada que paginar
+        if not plan.streams:
+            return self.get_paginated_messages(filters, 1, per_page)
+        
+        if self._sync_service is not None and state.get('m') in (None, 's'):
+            if not state:
+                self._sync_service.ensure_synced()
+            if state.get('m') == 's' or self._message_store.covers(filters):
+                return self._query_store_by_cursor(filters, per_page, state, fingerprint)
+        
+        if len(plan.streams) > 1:
+            return self._fetch_conversation_by_cursor(filters, plan, per_page, state, fingerprint)
+        
+        return self._fetch_messages_by_cursor(filters, plan, per_page, state, fingerprint)
+    
+    def _fetch_conversation_by_cursor(
+        self,
+        filters: MessageFilter,
+        plan: QueryPlan,
+        per_page: int,
+        state: dict,
+        fingerprint: str
+    ) -> PaginatedResponse:
+        """
+        Modo cursor para conversaciones sin almacén local
+        
+        Una conversación combina dos streams de Twilio, así que no hay un único
+        page token que guardar: el cursor guarda el número de mensajes ya vistos.
+        
+        Args:
+            filters: Filtros a aplicar
+            plan: Plan de lectura (dos streams)
+            per_page: Mensajes por página
+            state: Estado decodificado del cursor
+            fingerprint: Hash de los filtros
+        
+        Returns:
+            Respuesta paginada con next_cursor
+        """
+        seen = state.get('n', 0)
+        response = self._fetch_paginated_messages(filters, plan, seen // per_page + 1, per_page)
+        
+        if response.has_more:
+            response.next_cursor = encode_cursor({
+                'f': fingerprint,
+                'm': 'o',
+                'n': seen + len(response.messages)
+            })
+        
+        return response
+    
+    def _query_store_by_cursor(
+        self,
+        filters: MessageFilter,
+        per_page: int,
+        state: dict,
+        fingerprint: str
+    ) -> PaginatedResponse:
+        """
+        Página por keyset (date_sent, sid) sobre el almacén local
+        
+        Args:
+            filters: Filtros a aplicar
+            per_page: Mensajes por página
+            state: Estado decodificado del cursor
+            fingerprint: Hash de los filtros
+        
+        Returns:
+            Respuesta paginada con next_cursor
+        """
+        before = (state['d'], state['s']) if 's' in state else None
+        messages = self._message_store.find_messages(
+            filters,
+            limit=per_page + 1,
+            before=before
+        )
+        
+        has_more = len(messages) > per_page
+        messages = messages[:per_page]
+        seen = state.get('n', 0)
+        total = self._message_store.count_messages(filters)
+        
+        next_cursor = None
+        if has_more:
+            last = messages[-1]
+            next_cursor = encode_cursor({
+                'f': fingerprint,
+                'm': 's',
+                'n': seen + len(messages),
+                'd': to_epoch(last.date_sent),
+                's': last.sid
+            })
+        
+        return PaginatedResponse(
+            messages=messages,
+            page=seen // per_page + 1,
+            per_page=per_page,
+            total=total,
+            total_pages=(total + per_page - 1) // per_page,
+            has_more=has_more,
+            unique_users=self._message_store.count_unique_users(filters),
+            next_cursor=next_cursor,
+            total_exact=True
+        )
+    
+    def _fetch_messages_by_cursor(
+        self,
+        filters: MessageFilter,
+        plan: QueryPlan,
+        per_page: int,
+        state: dict,
+        fingerprint: str
+    ) -> PaginatedResponse:
+        """
+        Página sobre Twilio retomando desde el page token guardado en el cursor
+        
+        Args:
+            filters: Filtros a aplicar
+            plan: Plan de lectura (un solo stream)
+            per_page: Mensajes por página
+            state: Estado decodificado del cursor
+            fingerprint: Hash de los filtros
+        
+        Returns:
+            Respuesta paginada con next_cursor
+        """
+        page_token = state.get('t')
+        page_number = state.get('p')
+        offset = state.get('o', 0)
+        seen = state.get('n', 0)
+        
+        results = []
+        next_state = None
+        scanned = 0
+        exhausted = False
+        boundary = filters.fecha_inicio
+        
+        with metrics.timed('twilio'):
+            twilio_page = self._client.messages.page(
+                page_token=page_token if page_token is not None else values.unset,
+                page_number=page_number if page_number is not None else values.unset,
+                page_size=self._page_size,
+                **plan.streams[0]
+            )
+        pages_read = 1
+        
+        while True:
+            with metrics.timed('twilio'):
+                records = list(twilio_page)
+            consumed = offset
+            
+            messages = metrics.timed_map(
+                lambda twilio_msg: Message.from_twilio_message(twilio_msg, self._timezone_offset),
+                records[offset:],
+                'convert'
+            )
+            for message in messages:
+                # Del más reciente al más antiguo: pasado fecha_inicio no queda nada
+                if boundary is not None and message.date_sent is not None and message.date_sent < boundary:
+                    exhausted = True
+                    break
+                consumed += 1
+                if plan.matcher(message):
+                    results.append(message)
+                    if len(results) == per_page:
+                        break
+            
+            scanned += consumed - offset
+            if exhausted:
+                break
+            next_page_url = twilio_page.next_page_url
+            
+            # Quedan registros en esta misma página: retomar desde ahí
+            if len(results) == per_page and consumed < len(records):
+                next_state = {'t': page_token, 'p': page_number, 'o': consumed}
+                break
+            
+            if not next_page_url:
+                break
+            
+            page_token, page_number = self._parse_page_url(next_page_url)
+            offset = 0
+            
+            if len(results) == per_page or pages_read >= self.CURSOR_MAX_UPSTREAM_PAGES:
+                next_state = {'t': page_token, 'p': page_number, 'o': 0}
+                break
+            
+            with metrics.timed('twilio'):
+                twilio_page = self._client.messages.get_page(next_page_url)
+            pages_read += 1
+        
+        metrics.count('rows_scanned', scanned)
+        metrics.count('rows_returned', len(results))
+        
+        # Se alcanzó el máximo de páginas sin llenar la página pedida
+        truncated = next_state is not None and len(results) < per_page
+        if truncated:
+            metrics.note('scan', 'truncated')
+        
+        next_cursor = None
+        if next_state is not None:
+            next_state.update({'f': fingerprint, 'm': 'u', 'n': seen + len(results)})
+            next_cursor = encode_cursor(next_state)
+        
+        total = seen + len(results)
+        
+        return PaginatedResponse(
+            messages=results,
+            page=seen // per_page + 1,
+            per_page=per_page,
+            total=total,
+            total_pages=(total + per_page - 1) // per_page + (1 if next_cursor else 0),
+            has_more=next_cursor is not None,
+            unique_users=self._count_unique_users(results, filters),
+            next_cursor=next_cursor,
+            scan_truncated=truncated
+        )
+    
+    @staticmethod
+    def _parse_page_url(page_url: str) -> tuple[Optional[str], Optional[int]]:
+        """
+        Extrae PageToken y Page de la URL de página que devuelve Twilio
+        
+        Sólo se guardan esos valores en el cursor (nunca la URL completa), para
+        que un cursor manipulado no pueda dirigir peticiones autenticadas a otro host.
+        
+        Args:
+            page_url: URL de la siguiente página
+        
+        Returns:
+            Tupla (page_token, page_number)
+        """
+        query = parse_qs(urlparse(page_url).query)
+        page_token = query.get('PageToken', [None])[0]
+        page_number = query.get('Page', [None])[0]
+        return page_token, int(page_number) if page_number is not None else None
     
     def _fetch_paginated_messages(
         self,
         filters: MessageFilter,
+        plan: QueryPlan,
         page: int,
         per_page: int
     ) -> PaginatedResponse:
@@ -95,88 +603,338 @@ class TwilioService:
         
         Args:
             filters: Filtros a aplicar
+            plan: Plan de lectura de los filtros
             page: Número de página
             per_page: Mensajes por página
             
         Returns:
             Respuesta paginada
         """
-        results = []
-        messages_processed = 0
-        target_start = (page - 1) * per_page
-        target_end = target_start + per_page
+        if self._window_cache is not None:
+            # Todas las páginas de la búsqueda salen de una misma lectura
+            return self._window_cache.get_page(
+                self._account_sid,
+                filters,
+                page,
+                per_page,
+                lambda size, scan_page, scan_per_page: self._scan_window(
+                    filters, plan, size, scan_page, scan_per_page
+                )
+            )
+        
+        collector = PageCollector(
+            filters,
+            page,
+            per_page,
+            matcher=plan.matcher,
+            max_discarded=self._max_discarded_rows
+        )
         
-        # Para contar usuarios únicos en toda la búsqueda
-        all_matching_messages = []
+        messages = None
         
+        # Los errores se propagan: una página vacía haría creer que no hay mensajes
         try:
-            # Obtener parámetros para Twilio
-            twilio_params = filters.to_twilio_params()
-            
-            # Stream de mensajes
-            messages_stream = self._client.messages.stream(
-                page_size=self._page_size,
-                limit=target_end + 1000,  # Buffer para filtros adicionales
-                **twilio_params
+            messages = self._iter_filtered_upstream(
+                filters,
+                plan,
+                collector.upstream_limit,
+                expected_rows=collector.target_end + 1
             )
-            
-            for twilio_msg in messages_stream:
-                message = Message.from_twilio_message(
-                    twilio_msg, 
-                    self._timezone_offset
-                )
+            for message in messages:
+                if collector.add(message):
+                    break
+        except Exception as e:
+            logger.error(f"Error al consultar mensajes: {e}")
+            raise
+        finally:
+            if messages is not None and hasattr(messages, 'close'):
+                messages.close()
+        
+        if collector.truncated:
+            metrics.note('scan', 'truncated')
+        return collector.to_response()
+    
+    def _scan_window(self, filters: MessageFilter, plan: QueryPlan, size: int,
+                     page: int, per_page: int) -> MessageWindow:
+        """
+        Lee de Twilio los primeros resultados de una búsqueda
+        
+        Cada página de resultados admite max_discarded_rows mensajes sin
+        coincidencia: al superarlos se cierra con lo que tenga (scan_truncated)
+        y la siguiente sigue leyendo con otro máximo. La lectura termina al
+        llenar la ventana, al acabarse la búsqueda (o cruzar fecha_inicio) o
+        al cerrarse por un corte la página pedida o una posterior.
+        
+        Args:
+            filters: Filtros a aplicar
+            plan: Plan de lectura de los filtros
+            size: Resultados a guardar
+            page: Página pedida
+            per_page: Mensajes por página
+        
+        Returns:
+            Ventana con hasta size resultados
+        """
+        max_discarded = self._max_discarded_rows
+        pages = size // per_page
+        capacity = pages * per_page
+        # Cota exacta: cada página lee sus resultados y hasta max_discarded + 1
+        # descartes, y tras la última se busca uno más para saber si hay más
+        limit = capacity + (pages + 1) * (max_discarded + 1)
+        unique_users = UniqueUserCounter(filters)
+        results = []
+        page_ends = []
+        total = 0
+        read = 0
+        in_page = 0
+        discarded = 0
+        complete = False
+        truncated = False
+        # Tiempos acumulados aquí: sumarlos a la petición en cada mensaje costaría más
+        perf_counter = time.perf_counter
+        filter_seconds = 0.0
+        unique_seconds = 0.0
+        
+        messages = self._iter_filtered_upstream(filters, plan, limit, expected_rows=capacity + 1)
+        try:
+            for message in messages:
+                read += 1
+                started = perf_counter()
+                matched = plan.matcher(message)
+                filter_seconds += perf_counter() - started
+                if not matched:
+                    discarded += 1
+                    if discarded > max_discarded:
+                        # La página se cierra aquí; la siguiente empieza otro máximo
+                        truncated = True
+                        page_ends.append(len(results))
+                        in_page = 0
+                        discarded = 0
+                        if len(page_ends) >= page:
+                            break
+                    continue
                 
-                if filters.matches(message):
-                    # Guardar todos los mensajes que coinciden para contar usuarios
-                    all_matching_messages.append(message)
-                    
-                    if messages_processed >= target_start and len(results) < per_page:
-                        results.append(message)
-                    
-                    messages_processed += 1
-                    
-                    # Optimización: salir si ya tenemos suficientes
-                    if len(results) >= per_page and messages_processed > target_end:
-                        break
+                started = perf_counter()
+                unique_users.add(message)
+                unique_seconds += perf_counter() - started
+                total += 1
+                if len(page_ends) == pages:
+                    break  # Hay más resultados que la ventana
+                results.append(message)
+                in_page += 1
+                if in_page == per_page:
+                    page_ends.append(len(results))
+                    in_page = 0
+                    discarded = 0
+            else:
+                # El stream terminó (o cruzó fecha_inicio): no hay más
+                complete = True
+                if in_page:
+                    page_ends.append(len(results))
+        except Exception as e:
+            logger.error(f"Error al consultar mensajes: {e}")
+            raise
+        finally:
+            if hasattr(messages, 'close'):
+                messages.close()
+            metrics.record_stage('filter', filter_seconds)
+            metrics.record_stage('unique_users', unique_seconds)
+            metrics.count('rows_scanned', read)
+            metrics.count('rows_returned', len(results))
+            if truncated:
+                metrics.note('scan', 'truncated')
+        
+        return MessageWindow(
+            MessageBatch.from_messages(results),
+            size=capacity,
+            total=total,
+            complete=complete,
+            unique_users=unique_users.count(),
+            truncated=truncated,
+            per_page=per_page,
+            page_ends=tuple(page_ends) if truncated else None
+        )
+    
+    def _iter_filtered_upstream(self, filters: MessageFilter, plan: QueryPlan,
+                                limit: Optional[int] = None,
+                                utc_range: bool = False,
+                                expected_rows: Optional[int] = None) -> Iterator[Message]:
+        """
+        Recorre Twilio según el plan de la búsqueda
+        
+        Varios streams (p. ej. ambos sentidos de una conversación) se combinan
+        por fecha; los rangos de fecha amplios se dividen en tramos que se
+        descargan en paralelo. La lectura se corta en el primer mensaje
+        anterior a fecha_inicio. Los mensajes no se filtran aquí: el llamador
+        aplica plan.matcher.
+        
+        Args:
+            filters: Filtros de la búsqueda
+            plan: Plan de lectura (ver QueryPlanner)
+            limit: Máximo de mensajes a leer
+            utc_range: Convertir las fechas locales a UTC en los parámetros de
+                Twilio (necesario cuando el rango no viene ajustado por la ruta)
+            expected_rows: Mensajes que se espera leer si casi todos coinciden
+                (decide si se divide en tramos; default: limit)
+        
+        Returns:
+            Iterador de mensajes del más reciente al más antiguo
+        """
+        if expected_rows is None:
+            expected_rows = limit
+        messages = self._iter_plan_streams(filters, plan, limit, utc_range, expected_rows)
+        if filters.fecha_inicio is None:
+            return messages
+        return take_until_before(messages, filters.fecha_inicio)
+    
+    def _iter_plan_streams(self, filters: MessageFilter, plan: QueryPlan,
+                           limit: Optional[int], utc_range: bool,
+                           expected_rows: Optional[int]) -> Iterator[Message]:
+        """Streams de Twilio del plan combinados en uno (ver _iter_filtered_upstream)"""
+        if not plan.streams:
+            return iter(self._lookup(filters, plan))
+        
+        if len(plan.streams) > 1:
+            streams = plan.streams
+            if utc_range:
+                streams = [
+                    self._utc_range_params(params, filters.fecha_inicio, filters.fecha_final)
+                    for params in streams
+                ]
+            # Conversación: ambos sentidos en paralelo, combinados por fecha
+            return merge_newest_first(*(
+                prefetch_iterator(self._iter_upstream(params, limit))
+                for params in streams
+            ))
+        
+        twilio_params = plan.streams[0]
+        
+        if self._should_shard(filters, expected_rows):
+            # El último tramo incluye fecha_final (el filtro es inclusivo)
+            range_end = filters.fecha_final + timedelta(seconds=1)
             
-            # Calcular usuarios únicos (excluir el servicio)
-            unique_users = self._count_unique_users(all_matching_messages, filters)
+            def fetch_shard(shard_start: datetime, shard_end: datetime) -> Iterator[Message]:
+                # Los tramos están alineados a la medianoche UTC, así no se solapan
+                shard_params = self._utc_range_params(
+                    twilio_params,
+                    shard_start,
+                    shard_end - timedelta(seconds=1)
+                )
+                return self._iter_upstream(shard_params)
             
-            # Calcular total de páginas (estimado)
-            total_pages = max(
-                (messages_processed + per_page - 1) // per_page,
-                page
+            return self._sharded_fetcher.iter_messages(
+                fetch_shard,
+                filters.fecha_inicio,
+                range_end,
+                limit=limit
             )
-            has_more = len(results) == per_page
-            
-            return PaginatedResponse(
-                messages=results,
-                page=page,
-                per_page=per_page,
-                total=messages_processed,
-                total_pages=total_pages,
-                has_more=has_more,
-                unique_users=unique_users
+        
+        if utc_range:
+            twilio_params = self._utc_range_params(
+                twilio_params,
+                filters.fecha_inicio,
+                filters.fecha_final
             )
-            
-        except Exception as e:
-            logger.error(f"Error al consultar mensajes: {e}")
-            return PaginatedResponse(
-                messages=[],
-                page=page,
-                per_page=per_page,
-                total=0,
-                total_pages=0,
-                has_more=False,
-                unique_users=0
+        
+        return self._iter_upstream(twilio_params, limit)
+    
+    def _plan(self, filters: MessageFilter) -> QueryPlan:
+        """Plan de lectura de los filtros (queda anotado en Server-Timing)"""
+        plan = self._planner.plan(filters)
+        metrics.note('plan', plan.strategy)
+        return plan
+    
+    def _lookup(self, filters: MessageFilter, plan: QueryPlan) -> list[Message]:
+        """
+        Resultados de un plan sin streams: el mensaje de filters.sid si cumple
+        los demás filtros, o ninguno si los filtros se contradicen
+        
+        Args:
+            filters: Filtros de la búsqueda
+            plan: Plan 'sid' o 'empty'
+        
+        Returns:
+            Lista con cero o un mensaje
+        """
+        if plan.strategy != 'sid':
+            return []
+        
+        message = self.get_message_by_sid(filters.sid)
+        return [message] if message and plan.matcher(message) else []
+    
+    def _utc_range_params(self, twilio_params: dict, start: Optional[datetime],
+                          end: Optional[datetime]) -> dict:
+        """
+        Parámetros de Twilio para un rango local [start, end] (ambos inclusivos)
+        
+        Twilio filtra DateSent por día UTC, así que los extremos locales se
+        convierten a UTC para no perder los mensajes del final del día local.
+        
+        Args:
+            twilio_params: Parámetros base
+            start: Inicio del rango en hora local
+            end: Fin del rango en hora local
+        
+        Returns:
+            Copia de los parámetros con las fechas en UTC
+        """
+        utc_offset = timedelta(hours=self._timezone_offset)
+        params = dict(twilio_params)
+        if start is not None:
+            params['date_sent_after'] = start + utc_offset
+        if end is not None:
+            params['date_sent_before'] = end + utc_offset
+        return params
+    
+    def _should_shard(self, filters: MessageFilter, expected_rows: Optional[int]) -> bool:
+        """Indica si conviene dividir la lectura en tramos (rango amplio y lectura profunda)"""
+        if self._sharded_fetcher is None:
+            return False
+        if expected_rows is not None and expected_rows < self.SHARD_MIN_SCAN:
+            return False
+        if not filters.fecha_inicio or not filters.fecha_final:
+            return False
+        return filters.fecha_final - filters.fecha_inicio >= self._shard_min_range
+    
+    def _iter_upstream(self, twilio_params: dict, limit: Optional[int] = None) -> Iterator[Message]:
+        """
+        Recorre los mensajes de Twilio (del más reciente al más antiguo)
+        
+        Con el motor asíncrono activo, las páginas se descargan en el event loop
+        compartido y la siguiente se pide mientras se procesa la actual.
+        
+        Args:
+            twilio_params: Parámetros de filtro para Twilio
+            limit: Máximo de mensajes a leer
+        
+        Returns:
+            Iterador de mensajes
+        """
+        if self._async_service is not None:
+            # La conversión ocurre en el event loop (ver AsyncTwilioService.iter_pages)
+            return metrics.timed_iter(
+                self._async_service.iter_messages_blocking(twilio_params, limit),
+                'twilio'
             )
+        
+        messages_stream = self._client.messages.stream(
+            page_size=self._page_size,
+            limit=limit,
+            **twilio_params
+        )
+        return metrics.timed_map(
+            lambda twilio_msg: Message.from_twilio_message(twilio_msg, self._timezone_offset),
+            metrics.timed_iter(messages_stream, 'twilio'),
+            'convert'
+        )
     
-    def _count_unique_users(self, messages: list[Message], filters: MessageFilter) -> int:
+    @staticmethod
+    def _count_unique_users(messages: list[Message], filters: MessageFilter) -> int:
         """
         Cuenta el número de usuarios únicos que interactuaron
         
-        Excluye el número del servicio (que puede estar en filters.numero_from o numero_to)
-        y cuenta solo los números de usuarios únicos.
+        Excluye el número del servicio (filtros from/to/from_to o, sin filtros
+        de número, el más frecuente). Ver UniqueUserCounter.
         
         Args:
             messages: Lista de mensajes a analizar
@@ -185,37 +943,8 @@ class TwilioService:
         Returns:
             Número de usuarios únicos
         """
-        if not messages:
-            return 0
-        
-        # Identificar el número del servicio
-        # El servicio puede estar en from o to dependiendo del filtro
-        service_numbers = set()
-        
-        # Si hay un filtro from_to, probablemente sea el servicio
-        # En el contexto de la app, el servicio es el que filtramos
-        if filters.numero_from:
-            service_numbers.add(filters.numero_from)
-        if filters.numero_to:
-            service_numbers.add(filters.numero_to)
-        
-        # Si no hay filtros específicos, intentar detectar el servicio
-        # (el que aparece más frecuentemente)
-        if not service_numbers:
-            from collections import Counter
-            all_numbers = [msg.from_number for msg in messages] + [msg.to_number for msg in messages]
-            number_counts = Counter(all_numbers)
-            if number_counts:
-                # El número más frecuente probablemente sea el servicio
-                most_common = number_counts.most_common(1)[0][0]
-                service_numbers.add(most_common)
-        
-        # Recolectar todos los números únicos, excluyendo los del servicio
-        user_numbers = set()
-        for msg in messages:
-            if msg.from_number not in service_numbers:
-                user_numbers.add(msg.from_number)
-            if msg.to_number not in service_numbers:
-                user_numbers.add(msg.to_number)
-        
-        return len(user_numbers)
\ No newline at end of file
+        with metrics.timed('unique_users'):
+            counter = UniqueUserCounter(filters)
+            for message in messages:
+                counter.add(message)
+            return counter.count()
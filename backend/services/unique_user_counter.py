@@ -0,0 +1,53 @@
+"""
+Conteo incremental de usuarios únicos de una búsqueda
+"""
+from typing import Optional
+
+from ..models.message import Message, MessageFilter
+from ..utils.distinct_counter import DistinctCounter
+
+
+class UniqueUserCounter:
+    """
+    Cuenta los números que interactuaron con el servicio, sin guardar mensajes
+    
+    Los números de servicio de los filtros (from, to, from_to) no se cuentan.
+    Sin filtros de número el servicio es el número más frecuente, que siempre
+    forma parte del conjunto: se descuenta uno al final. Por eso el conjunto se
+    guarda "crudo" y los contadores de distintos días se pueden combinar antes
+    de aplicar la regla.
+    """
+    
+    def __init__(self, filters: MessageFilter, numbers: Optional[DistinctCounter] = None):
+        """
+        Args:
+            filters: Filtros de la búsqueda (identifican los números del servicio)
+            numbers: Contador de números ya existente (p. ej. leído de caché)
+        """
+        self._service_numbers = {
+            number for number in (
+                filters.numero_from,
+                filters.numero_to,
+                filters.numero_from_to
+            ) if number
+        }
+        self.numbers = numbers or DistinctCounter()
+    
+    def add(self, message: Message) -> None:
+        """Agrega los números de un mensaje"""
+        if message.from_number not in self._service_numbers:
+            self.numbers.add(message.from_number)
+        if message.to_number not in self._service_numbers:
+            self.numbers.add(message.to_number)
+    
+    def merge(self, other: 'UniqueUserCounter') -> None:
+        """Combina los números de otro contador (p. ej. de otro día)"""
+        self.numbers.merge(other.numbers)
+    
+    def count(self) -> int:
+        """Número de usuarios únicos"""
+        distinct_numbers = self.numbers.count()
+        
+        if not self._service_numbers and distinct_numbers:
+            return distinct_numbers - 1
+        return distinct_numbers
@@ -0,0 +1,139 @@
+"""
+Ingesta de webhooks de Twilio por lotes hacia el almacén local
+"""
+from collections import defaultdict
+from typing import Optional
+import queue
+import threading
+import time
+import logging
+
+from ..models.message import Message
+from .cache_service import CacheService
+from .message_store import MessageStoreManager
+
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookIngestor:
+    """
+    Cola acotada de eventos de webhook con un escritor por lotes
+    
+    La petición del webhook sólo encola el evento; un hilo escritor agrupa
+    lo pendiente, lo aplica al almacén de cada cuenta en una transacción e
+    invalida una vez por lote las búsquedas cacheadas de los números y fechas
+    afectados. Así una ráfaga de miles de callbacks por segundo cuesta unas
+    pocas escrituras.
+    """
+    
+    def __init__(self, cache_service: CacheService,
+                 message_store_manager: Optional[MessageStoreManager] = None,
+                 max_queue: int = 20000, batch_size: int = 500,
+                 flush_interval_seconds: float = 0.2, enqueue_timeout_seconds: float = 1.0):
+        """
+        Args:
+            cache_service: Caché cuyas páginas se invalidan por cuenta
+            message_store_manager: Almacenes locales (None = sólo invalidar caché)
+            max_queue: Eventos pendientes como máximo
+            batch_size: Eventos por lote de escritura
+            flush_interval_seconds: Espera máxima para completar un lote
+            enqueue_timeout_seconds: Espera por espacio en la cola antes de rechazar
+        """
+        self._cache = cache_service
+        self._stores = message_store_manager
+        self._queue: queue.Queue[tuple[str, Message]] = queue.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_seconds
+        self._enqueue_timeout = enqueue_timeout_seconds
+        self._received = 0
+        self._rejected = 0
+        self._written = 0
+        self._batches = 0
+        # submit corre en los hilos de las peticiones y _flush en el escritor
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='webhook-writer',
+            daemon=True
+        )
+        self._thread.start()
+    
+    def submit(self, account_sid: str, message: Message) -> bool:
+        """
+        Encola el evento de un mensaje
+        
+        Args:
+            account_sid: Cuenta a la que pertenece el mensaje
+            message: Datos del webhook (None en los campos que no trae)
+        
+        Returns:
+            False si la cola siguió llena durante la espera (responder 503)
+        """
+        try:
+            self._queue.put((account_sid, message), timeout=self._enqueue_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            return False
+        
+        with self._stats_lock:
+            self._received += 1
+        return True
+    
+    def _run(self) -> None:
+        """Bucle del escritor: toma un lote y lo aplica"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._flush_interval
+            
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                self._flush(batch)
+            except Exception as e:
+                logger.error(f"Error al aplicar lote de webhooks: {e}")
+    
+    def _flush(self, batch: list[tuple[str, Message]]) -> None:
+        """Aplica un lote agrupado por cuenta e invalida las búsquedas afectadas"""
+        by_account: dict[str, list[Message]] = defaultdict(list)
+        for account_sid, message in batch:
+            by_account[account_sid].append(message)
+        
+        for account_sid, messages in by_account.items():
+            since = None
+            if self._stores is not None:
+                store = self._stores.get(account_sid)
+                written = store.apply_updates(messages)
+                with self._stats_lock:
+                    self._written += written
+                store.set_state(last_webhook_at=time.time())
+                # Un status callback puede tocar un mensaje de hace días: manda la fecha guardada
+                since = store.oldest_date(list({message.sid for message in messages}))
+            
+            numbers = {message.from_number for message in messages}
+            numbers |= {message.to_number for message in messages}
+            if '' in numbers:
+                numbers = None  # Sin From/To no se sabe qué búsquedas toca
+            self._cache.invalidate(account_sid, numbers, since)
+        
+        with self._stats_lock:
+            self._batches += 1
+    
+    def stats(self) -> dict:
+        """Contadores de la ingesta en este worker"""
+        with self._stats_lock:
+            return {
+                'received': self._received,
+                'rejected': self._rejected,
+                'written': self._written,
+                'batches': self._batches,
+                'pending': self._queue.qsize()
+            }
@@ -0,0 +1,102 @@
+"""
+Utilidades para ejecutar corrutinas desde código síncrono (Flask)
+"""
+import asyncio
+import os
+import threading
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+
+class BackgroundEventLoop:
+    """Event loop de asyncio que corre en un hilo daemon propio"""
+    
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name='twilio-async-loop',
+            daemon=True
+        )
+        self._thread.start()
+    
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        Ejecuta una corrutina en el loop y espera su resultado
+        
+        Args:
+            coro: Corrutina a ejecutar
+            timeout: Segundos máximos de espera
+            
+        Returns:
+            Resultado de la corrutina
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result(timeout)
+    
+    def iterate(self, agen: AsyncIterator) -> Iterator:
+        """
+        Expone un generador asíncrono como iterador síncrono
+        
+        Cada elemento se pide al loop bajo demanda; si el consumidor deja de
+        iterar, el generador se cierra en el loop (cancelando descargas pendientes).
+        
+        Args:
+            agen: Generador asíncrono
+            
+        Returns:
+            Iterador síncrono con los mismos elementos
+        """
+        try:
+            while True:
+                has_item, item = self.run(_anext(agen))
+                if not has_item:
+                    return
+                yield item
+        finally:
+            self.run(agen.aclose())
+
+
+async def _anext(agen: AsyncIterator) -> tuple[bool, Any]:
+    """Siguiente elemento de un generador asíncrono como (hay_elemento, elemento)"""
+    try:
+        return True, await agen.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+
+_loop_lock = threading.Lock()
+_loop_instance: Optional[BackgroundEventLoop] = None
+_loop_pid: Optional[int] = None
+
+
+def get_background_loop() -> BackgroundEventLoop:
+    """
+    Obtiene el event loop compartido del proceso
+    
+    Se crea de forma perezosa y se recrea tras un fork (workers de gunicorn),
+    porque un loop no sobrevive al proceso que lo creó.
+    
+    Returns:
+        Event loop en segundo plano
+    """
+    global _loop_instance, _loop_pid
+    
+    with _loop_lock:
+        if _loop_instance is None or _loop_pid != os.getpid():
+            _loop_instance = BackgroundEventLoop()
+            _loop_pid = os.getpid()
+        return _loop_instance
+
+
+def run_in_loop(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """
+    Ejecuta una corrutina en el event loop compartido (fachada síncrona)
+    
+    Args:
+        coro: Corrutina a ejecutar
+        timeout: Segundos máximos de espera
+        
+    Returns:
+        Resultado de la corrutina
+    """
+    return get_background_loop().run(coro, timeout)
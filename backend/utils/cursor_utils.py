@@ -0,0 +1,94 @@
+"""
+Utilidades para cursores opacos de paginación
+"""
+import base64
+import binascii
+import json
+
+
+# Campos conocidos del estado y sus tipos (None = el campo puede ser nulo)
+CURSOR_FIELDS = {
+    'f': (str,),  # Hash de los filtros
+    'm': (str,),  # Modo: 's' almacén, 'u' page token de Twilio, 'o' desplazamiento
+    'n': (int,),  # Mensajes ya entregados
+    'd': (int, type(None)),  # Epoch del último mensaje entregado (keyset del almacén)
+    's': (str,),  # SID del último mensaje entregado (keyset del almacén)
+    't': (str, type(None)),  # Page token de Twilio
+    'p': (int, type(None)),  # Número de página de Twilio
+    'o': (int,),  # Registros ya consumidos de la página de Twilio
+}
+
+# Contadores y posiciones: nunca negativos
+_CURSOR_COUNTERS = ('n', 'p', 'o')
+
+# Campos que sólo tienen sentido juntos
+_CURSOR_FIELD_PAIRS = (('d', 's'),)
+
+
+def encode_cursor(state: dict) -> str:
+    """
+    Codifica el estado de paginación como un token opaco para el cliente
+    
+    Args:
+        state: Diccionario serializable con el estado del cursor
+    
+    Returns:
+        Token base64 url-safe sin relleno
+    """
+    raw = json.dumps(state, separators=(',', ':'), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> dict:
+    """
+    Decodifica un token generado por encode_cursor
+    
+    Args:
+        token: Token recibido del cliente
+    
+    Returns:
+        Diccionario con el estado del cursor
+    
+    Raises:
+        ValueError: Si el token no es válido
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Cursor inválido: {e}")
+    
+    if not isinstance(state, dict):
+        raise ValueError("Cursor inválido")
+    
+    _validate_state(state)
+    return state
+
+
+def _validate_state(state: dict) -> None:
+    """
+    Comprueba campos y tipos del estado de un cursor
+    
+    Un cursor manipulado debe terminar en un 400, no en un KeyError o
+    TypeError al usarlo.
+    
+    Args:
+        state: Estado decodificado
+    
+    Raises:
+        ValueError: Si sobra o falta algún campo, o alguno tiene otro tipo
+    """
+    for field, value in state.items():
+        types = CURSOR_FIELDS.get(field)
+        if types is None:
+            raise ValueError(f"Cursor inválido: campo desconocido '{field}'")
+        # bool es subclase de int, pero no es un valor válido
+        if isinstance(value, bool) or not isinstance(value, types):
+            raise ValueError(f"Cursor inválido: tipo incorrecto en '{field}'")
+        if field in _CURSOR_COUNTERS and value is not None and value < 0:
+            raise ValueError(f"Cursor inválido: '{field}' negativo")
+    
+    for pair in _CURSOR_FIELD_PAIRS:
+        present = [field in state for field in pair]
+        if any(present) and not all(present):
+            raise ValueError(f"Cursor inválido: {' y '.join(pair)} deben ir juntos")
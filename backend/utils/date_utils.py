@@ -1,7 +1,8 @@
 """
 Utilidades para manejo de fechas
 """
-from datetime import datetime
+import calendar
+from datetime import datetime, timedelta
 from typing import Optional
 
 
@@ -31,3 +32,33 @@ def parse_datetime(date_string: Optional[str]) -> Optional[datetime]:
         pass
     
     return None
+
+
+def to_epoch(value: Optional[datetime]) -> Optional[int]:
+    """
+    Convierte un datetime naive a segundos epoch (tratándolo como UTC)
+    
+    Args:
+        value: Fecha a convertir
+        
+    Returns:
+        Segundos desde epoch o None si no hay fecha
+    """
+    if value is None:
+        return None
+    return calendar.timegm(value.timetuple())
+
+
+def from_epoch(value: Optional[int]) -> Optional[datetime]:
+    """
+    Convierte segundos epoch a un datetime naive (inverso de to_epoch)
+    
+    Args:
+        value: Segundos desde epoch
+        
+    Returns:
+        Objeto datetime o None si no hay valor
+    """
+    if value is None:
+        return None
+    return datetime(1970, 1, 1) + timedelta(seconds=value)
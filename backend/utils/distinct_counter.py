@@ -0,0 +1,127 @@
+"""
+Conteo de elementos distintos en streaming (conjunto exacto o HyperLogLog)
+"""
+from typing import Iterable, Optional
+import hashlib
+import math
+
+
+class DistinctCounter:
+    """
+    Cuenta valores distintos con memoria acotada
+    
+    Mientras hay pocos valores guarda el conjunto exacto; al superar el umbral
+    pasa a HyperLogLog (2^precision registros de un byte, error ~1.04/sqrt(m)).
+    Dos contadores con la misma precisión se pueden combinar con merge().
+    """
+    
+    def __init__(self, exact_threshold: int = 1000, precision: int = 14):
+        """
+        Args:
+            exact_threshold: Valores distintos guardados exactamente antes de pasar a HLL
+            precision: Bits de índice del HyperLogLog (m = 2^precision registros)
+        """
+        self.exact_threshold = exact_threshold
+        self.precision = precision
+        self._values: Optional[set[str]] = set()
+        self._registers: Optional[bytearray] = None
+    
+    @property
+    def is_exact(self) -> bool:
+        """True mientras el conteo es exacto (aún no pasó a HyperLogLog)"""
+        return self._registers is None
+    
+    def add(self, value: str) -> None:
+        """Agrega un valor"""
+        if self._registers is None:
+            self._values.add(value)
+            if len(self._values) > self.exact_threshold:
+                self._to_sketch()
+        else:
+            self._add_hash(self._hash(value))
+    
+    def update(self, values: Iterable[str]) -> None:
+        """Agrega varios valores"""
+        for value in values:
+            self.add(value)
+    
+    def discard(self, value: str) -> None:
+        """Quita un valor del conjunto exacto (un sketch no admite borrados)"""
+        if self._registers is None:
+            self._values.discard(value)
+    
+    def merge(self, other: 'DistinctCounter') -> None:
+        """
+        Combina otro contador en este (unión de conjuntos)
+        
+        Args:
+            other: Contador con la misma precisión
+        """
+        if other.precision != self.precision:
+            raise ValueError("Sólo se pueden combinar contadores con la misma precisión")
+        
+        if other._registers is None:
+            for value in other._values:
+                self.add(value)
+            return
+        
+        if self._registers is None:
+            self._to_sketch()
+        for index, rank in enumerate(other._registers):
+            if rank > self._registers[index]:
+                self._registers[index] = rank
+    
+    def count(self) -> int:
+        """Número (exacto o estimado) de valores distintos"""
+        if self._registers is None:
+            return len(self._values)
+        
+        m = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self._registers)
+        
+        # Corrección para cardinalidades bajas (linear counting)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        
+        return int(round(estimate))
+    
+    def to_dict(self) -> dict:
+        """Representación serializable (para caché)"""
+        if self._registers is None:
+            return {'p': self.precision, 't': self.exact_threshold, 'values': sorted(self._values)}
+        return {'p': self.precision, 't': self.exact_threshold, 'registers': bytes(self._registers)}
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'DistinctCounter':
+        """Reconstruye un contador desde to_dict()"""
+        counter = cls(exact_threshold=data['t'], precision=data['p'])
+        if 'registers' in data:
+            counter._values = None
+            counter._registers = bytearray(data['registers'])
+        else:
+            counter._values = set(data['values'])
+        return counter
+    
+    def _to_sketch(self) -> None:
+        """Pasa del conjunto exacto a HyperLogLog"""
+        self._registers = bytearray(1 << self.precision)
+        for value in self._values:
+            self._add_hash(self._hash(value))
+        self._values = None
+    
+    def _add_hash(self, hashed: int) -> None:
+        """Actualiza el registro que corresponde al hash de 64 bits"""
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        rest = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - rest.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+    
+    @staticmethod
+    def _hash(value: str) -> int:
+        """Hash estable de 64 bits (igual entre procesos, a diferencia de hash())"""
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
@@ -0,0 +1,105 @@
+"""
+Serialización JSON de respuestas que contienen lotes de mensajes
+"""
+from typing import Any, Optional
+import hashlib
+import json
+
+from ..models.message import MessageBatch
+
+try:
+    # Opcional: si está instalado, los valores sueltos se codifican con orjson
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _encode_value(value: Any) -> bytes:
+    """Codifica un valor JSON cualquiera"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+
+def _encode_batch(batch: MessageBatch) -> bytes:
+    """Codifica un lote de mensajes como arreglo JSON"""
+    if orjson is not None:
+        return orjson.dumps(batch.to_rows())
+    return batch.to_json().encode()
+
+
+def dumps(data: dict[str, Any]) -> bytes:
+    """
+    Serializa un diccionario de respuesta a JSON (UTF-8)
+    
+    Los valores MessageBatch de primer nivel se insertan con su propia
+    serialización en columnas, sin pasar por un dict por mensaje.
+    
+    Args:
+        data: Respuesta (p. ej. PaginatedResponse.to_payload())
+    
+    Returns:
+        JSON codificado
+    """
+    parts = []
+    for key, value in data.items():
+        if isinstance(value, MessageBatch):
+            encoded = _encode_batch(value)
+        else:
+            encoded = _encode_value(value)
+        parts.append(_encode_value(key) + b':' + encoded)
+    return b'{' + b','.join(parts) + b'}'
+
+
+class EncodedResponse:
+    """
+    Respuesta ya serializada que se guarda en caché junto con sus datos
+    
+    Un acierto de caché sirve body tal cual, y el ETag (hash del contenido)
+    permite responder 304 a los clientes que ya tienen esa misma versión.
+    """
+    
+    __slots__ = ('data', 'body', 'etag', 'source_etag')
+    
+    def __init__(self, data: dict[str, Any], source_etag: Optional[str] = None):
+        """
+        Args:
+            data: Respuesta a serializar
+            source_etag: ETag de la respuesta de la que esta es una variante
+        """
+        self.data = data
+        self.body = dumps(data)
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.source_etag = source_etag
+    
+    @property
+    def nbytes(self) -> int:
+        """Tamaño aproximado en bytes: el cuerpo más los datos, de tamaño parecido"""
+        return 2 * len(self.body)
+    
+    def with_overrides(self, overrides: dict[str, Any],
+                       cached: Optional['EncodedResponse'] = None) -> 'EncodedResponse':
+        """
+        Versión de la respuesta con algunos campos sustituidos
+        
+        Una variante guardada antes (p. ej. en el caché compartido) se reutiliza
+        si sale de esta misma respuesta con los mismos campos: así las consultas
+        siguientes no vuelven a serializar la página.
+        
+        Args:
+            overrides: Campos de primer nivel a sustituir
+            cached: Variante guardada de una consulta anterior (opcional)
+        
+        Returns:
+            Esta misma respuesta si no cambia nada, cached si sigue sirviendo,
+            o una variante serializada nueva
+        """
+        if all(self.data.get(key) == value for key, value in overrides.items()):
+            return self
+        
+        if cached is not None and cached.source_etag == self.etag and all(
+            cached.data.get(key) == value for key, value in overrides.items()
+        ):
+            return cached
+        
+        return EncodedResponse({**self.data, **overrides}, source_etag=self.etag)
@@ -0,0 +1,137 @@
+"""
+Utilidades para combinar streams ordenados de mensajes
+"""
+from datetime import datetime
+from typing import Iterable, Iterator
+import contextvars
+import heapq
+import queue
+import threading
+
+from ..models.message import Message
+
+
+_DONE = object()
+
+
+def prefetch_iterator(iterable: Iterable, buffer_size: int = 200) -> Iterator:
+    """
+    Consume un iterable en un hilo propio y entrega sus elementos por una cola acotada
+    
+    Permite que varios streams de Twilio se descarguen en paralelo mientras
+    el consumidor los combina. Si el consumidor deja de iterar, el hilo se detiene.
+    
+    Args:
+        iterable: Iterable a consumir (p. ej. un stream de Twilio)
+        buffer_size: Máximo de elementos adelantados en memoria
+        
+    Returns:
+        Iterador con los mismos elementos, en el mismo orden
+    """
+    items = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def worker():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((True, item)):
+                    return
+        except BaseException as e:
+            put((False, e))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            put(_DONE)
+    
+    # El hilo hereda el contexto: sus lecturas cuentan en las métricas de la petición
+    thread = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(worker,),
+        name='stream-prefetch',
+        daemon=True
+    )
+    thread.start()
+    
+    try:
+        while True:
+            entry = items.get()
+            if entry is _DONE:
+                return
+            ok, value = entry
+            if not ok:
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
+def take_until_before(messages: Iterable[Message], boundary: datetime) -> Iterator[Message]:
+    """
+    Corta un stream ordenado del más reciente al más antiguo al cruzar boundary
+    
+    Todo lo que sigue al primer mensaje anterior a boundary también es
+    anterior: se deja de leer ahí mismo (Twilio filtra DateSent por día UTC
+    completo y entregaría el resto del día). Los mensajes sin fecha van al
+    principio del stream y no lo cortan.
+    
+    Args:
+        messages: Stream ordenado por date_sent descendente
+        boundary: Fecha más antigua que interesa (inclusiva)
+    
+    Returns:
+        Iterador con los mensajes desde boundary; al terminar cierra el stream
+    """
+    iterator = iter(messages)
+    try:
+        for message in iterator:
+            if message.date_sent is not None and message.date_sent < boundary:
+                return
+            yield message
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+def _date_key(message: Message) -> datetime:
+    """Clave de orden: los mensajes sin fecha (en cola) se consideran los más nuevos"""
+    return message.date_sent or datetime.max
+
+
+def merge_newest_first(*streams: Iterable[Message]) -> Iterator[Message]:
+    """
+    Combina streams ordenados del más reciente al más antiguo en uno solo
+    
+    Los mensajes repetidos (p. ej. un número que se escribe a sí mismo aparece
+    en ambos sentidos) se entregan una sola vez.
+    
+    Args:
+        streams: Streams ordenados por date_sent descendente
+        
+    Returns:
+        Iterador combinado en el mismo orden
+    """
+    current_key = None
+    seen_sids = set()
+    
+    for message in heapq.merge(*streams, key=_date_key, reverse=True):
+        key = _date_key(message)
+        # Los duplicados comparten fecha: basta recordar los SIDs del segundo actual
+        if key != current_key:
+            current_key = key
+            seen_sids.clear()
+        if message.sid in seen_sids:
+            continue
+        seen_sids.add(message.sid)
+        yield message
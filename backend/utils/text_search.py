@@ -0,0 +1,145 @@
+"""
+Búsqueda de texto en el cuerpo de los mensajes (prefijos, frases y sin acentos)
+"""
+from functools import lru_cache
+from typing import Optional
+import re
+import unicodedata
+
+
+# Misma segmentación que el tokenizador unicode61 de SQLite FTS5:
+# letras y números forman palabras, todo lo demás separa
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_PHRASE_RE = re.compile(r'"([^"]*)"')
+
+
+def normalize_text(text: str) -> str:
+    """
+    Minúsculas y sin diacríticos ("Canción" -> "cancion")
+    
+    Args:
+        text: Texto original
+    
+    Returns:
+        Texto normalizado
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Divide un texto en palabras normalizadas
+    
+    Args:
+        text: Texto original
+    
+    Returns:
+        Lista de palabras en el orden en que aparecen
+    """
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+class BodyQuery:
+    """
+    Consulta de body_search ya interpretada
+    
+    Las palabras sueltas buscan por prefijo ("confirm" encuentra "confirmado")
+    y el texto entre comillas busca la frase exacta. Todas las partes deben
+    aparecer (AND). La misma consulta se evalúa en memoria (matches) y en el
+    índice FTS5 del almacén local (to_fts5), con resultados equivalentes.
+    """
+    
+    def __init__(self, text: str):
+        """
+        Args:
+            text: Texto de búsqueda tal como lo escribió el usuario
+        """
+        self.text = text
+        self.phrases: list[tuple[str, ...]] = []
+        self.prefixes: list[str] = []
+        
+        for phrase in _PHRASE_RE.findall(text):
+            tokens = tuple(tokenize(phrase))
+            if tokens:
+                self.phrases.append(tokens)
+        self.prefixes = tokenize(_PHRASE_RE.sub(' ', text))
+    
+    @property
+    def is_empty(self) -> bool:
+        """True si la consulta no tiene palabras (sólo signos o espacios)"""
+        return not self.phrases and not self.prefixes
+    
+    def matches(self, body: Optional[str]) -> bool:
+        """
+        Evalúa la consulta sobre el cuerpo de un mensaje
+        
+        Args:
+            body: Cuerpo del mensaje
+        
+        Returns:
+            True si el cuerpo cumple la consulta
+        """
+        if not body:
+            return False
+        
+        if self.is_empty:
+            # Sin palabras que indexar: búsqueda literal sin distinguir mayúsculas
+            return self.text.lower() in body.lower()
+        
+        tokens = tokenize(body)
+        
+        for prefix in self.prefixes:
+            if not any(token.startswith(prefix) for token in tokens):
+                return False
+        
+        for phrase in self.phrases:
+            size = len(phrase)
+            if not any(
+                tuple(tokens[i:i + size]) == phrase
+                for i in range(len(tokens) - size + 1)
+            ):
+                return False
+        
+        return True
+    
+    @property
+    def canonical(self) -> str:
+        """
+        Forma canónica de la consulta (para claves de caché)
+        
+        Dos textos con la misma forma canónica encuentran los mismos mensajes:
+        "Confirmado  pedido" y "confirmado, PEDIDO" comparten entrada.
+        """
+        if self.is_empty:
+            return self.text.lower()
+        return self.to_fts5()
+    
+    def to_fts5(self) -> Optional[str]:
+        """
+        Expresión MATCH de FTS5 equivalente
+        
+        Returns:
+            Expresión FTS5, o None si la consulta no tiene palabras
+        """
+        if self.is_empty:
+            return None
+        
+        # Los tokens sólo tienen letras y números: entre comillas no hay nada que escapar
+        terms = [f'"{prefix}"*' for prefix in self.prefixes]
+        terms += [f'"{" ".join(phrase)}"' for phrase in self.phrases]
+        return ' '.join(terms)
+
+
+@lru_cache(maxsize=256)
+def parse_body_query(text: str) -> BodyQuery:
+    """
+    Interpreta (y memoriza) un texto de body_search
+    
+    Args:
+        text: Texto de búsqueda
+    
+    Returns:
+        BodyQuery reutilizable
+    """
+    return BodyQuery(text)
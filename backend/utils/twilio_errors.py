@@ -0,0 +1,90 @@
+"""
+Utilidades para clasificar errores de la API de Twilio
+"""
+from typing import Optional
+
+from twilio.base.exceptions import TwilioException, TwilioRestException
+
+
+class RateLimitExceeded(Exception):
+    """Twilio sigue limitando la cuenta después de agotar los reintentos"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _error_response(error: BaseException):
+    """Respuesta HTTP asociada al error (Page la adjunta como segundo argumento)"""
+    if isinstance(error, TwilioException) and len(error.args) > 1:
+        return error.args[1]
+    return None
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """
+    Código HTTP de un error de Twilio
+    
+    Args:
+        error: Excepción lanzada por el SDK
+    
+    Returns:
+        Código HTTP o None si no se conoce
+    """
+    if isinstance(error, TwilioRestException):
+        return error.status
+    
+    response = _error_response(error)
+    return getattr(response, 'status_code', None)
+
+
+def is_auth_error(error: BaseException) -> bool:
+    """Indica si Twilio rechazó las credenciales (HTTP 401 o código 20003)"""
+    if getattr(error, 'code', None) == 20003:
+        return True
+    return error_status(error) == 401
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Indica si Twilio rechazó la petición por límite de tasa (HTTP 429)"""
+    if isinstance(error, RateLimitExceeded):
+        return True
+    return error_status(error) == 429
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Lee el encabezado Retry-After (en segundos) de una respuesta
+    
+    Args:
+        headers: Encabezados de la respuesta HTTP
+    
+    Returns:
+        Segundos a esperar o None si no viene o no es numérico
+    """
+    headers = headers or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    if value is None:
+        return None
+    
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Segundos indicados por el encabezado Retry-After, si Twilio lo envió
+    
+    Args:
+        error: Excepción lanzada por el SDK
+    
+    Returns:
+        Segundos a esperar o None
+    """
+    if isinstance(error, RateLimitExceeded):
+        return error.retry_after
+    
+    response = _error_response(error)
+    return parse_retry_after(getattr(response, 'headers', None))
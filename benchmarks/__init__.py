@@ -0,0 +1,3 @@
+"""
+Benchmarks del monitor contra una API de Twilio simulada (ver benchmarks/run.py)
+"""
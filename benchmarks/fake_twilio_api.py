@@ -0,0 +1,464 @@
+"""
+API de mensajes de Twilio simulada para benchmarks
+
+Sirve una cuenta sintética y reproducible (misma semilla = mismos mensajes)
+con los endpoints que usa el monitor: listado paginado de mensajes con
+filtros From/To/DateSent, fetch por SID, cuenta y números entrantes. Cada
+respuesta espera una latencia configurable, como una página real de Twilio.
+
+Uso:
+    python -m benchmarks.fake_twilio_api --messages 100000 --port 8765
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse, parse_qsl, urlencode
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+
+
+ACCOUNT_SID = 'AC' + 'b' * 32
+
+_WORDS = [
+    'hola', 'pedido', 'envío', 'gracias', 'canción', 'precio', 'ayuda', 'factura',
+    'confirmado', 'mañana', 'entrega', 'pago', 'cuenta', 'número', 'tienda', 'oferta'
+]
+_OUTBOUND_STATUSES = ['delivered', 'read', 'sent', 'delivered', 'read', 'failed', 'undelivered']
+
+_MESSAGES_RE = re.compile(r'^/2010-04-01/Accounts/(AC\w+)/Messages\.json$')
+_MESSAGE_RE = re.compile(r'^/2010-04-01/Accounts/(AC\w+)/Messages/(SM[0-9a-f]{32})\.json$')
+_ACCOUNT_RE = re.compile(r'^/2010-04-01/Accounts/(AC\w+)\.json$')
+_NUMBERS_RE = re.compile(r'^/2010-04-01/Accounts/(AC\w+)/IncomingPhoneNumbers\.json$')
+
+
+class SyntheticAccount:
+    """
+    Mensajes sintéticos de una cuenta, del más reciente al más antiguo
+    
+    Se guardan en columnas (arrays) para que una cuenta de 1M de mensajes
+    quepa en unas decenas de MB; los cuerpos se generan al serializar.
+    """
+    
+    def __init__(self, messages: int, days: int = 30, users: int = 5000,
+                 services: int = 2, seed: int = 1, anchor: Optional[int] = None):
+        """
+        Args:
+            messages: Número de mensajes
+            days: Días que cubren (el más reciente es anchor)
+            users: Números de usuario distintos
+            services: Números de servicio de la cuenta
+            seed: Semilla de la generación
+            anchor: Fecha del mensaje más reciente (epoch UTC; default: ahora)
+        """
+        rnd = random.Random(seed)
+        self.seed = seed
+        self.anchor = int(anchor if anchor is not None else time.time())
+        self.service_numbers = [f'whatsapp:+1839274{i:04d}' for i in range(services)]
+        self.numbers = self.service_numbers + [f'whatsapp:+52155{i:07d}' for i in range(users)]
+        
+        spacing = days * 86400 / messages
+        self.dates = array('q')
+        self.from_idx = array('I')
+        self.to_idx = array('I')
+        self.inbound = bytearray(messages)
+        
+        for i in range(messages):
+            # Decreciente: el mensaje i cae dentro de su propio intervalo
+            self.dates.append(self.anchor - int((i + rnd.random()) * spacing))
+            service = rnd.randrange(services)
+            user = services + min(int(rnd.paretovariate(1.2)) - 1, users - 1)
+            if rnd.random() < 0.5:
+                self.inbound[i] = 1
+                self.from_idx.append(user)
+                self.to_idx.append(service)
+            else:
+                self.from_idx.append(service)
+                self.to_idx.append(user)
+        
+        # Índices por número (cada lista también queda del más reciente al más antiguo)
+        self.number_ids = {number: i for i, number in enumerate(self.numbers)}
+        self.by_from: dict[int, array] = {}
+        self.by_to: dict[int, array] = {}
+        for i in range(messages):
+            self.by_from.setdefault(self.from_idx[i], array('I')).append(i)
+            self.by_to.setdefault(self.to_idx[i], array('I')).append(i)
+    
+    def __len__(self) -> int:
+        return len(self.dates)
+    
+    @staticmethod
+    def sid(index: int) -> str:
+        """SID del mensaje en la posición index"""
+        return f'SM{index:032x}'
+    
+    def index_of(self, sid: str) -> Optional[int]:
+        """Posición de un SID, o None si no existe"""
+        index = int(sid[2:], 16)
+        return index if index < len(self) else None
+    
+    def body(self, index: int) -> str:
+        """Cuerpo del mensaje (determinista, sin guardarse)"""
+        state = (index * 2654435761 + self.seed) & 0xFFFFFFFF
+        words = []
+        for _ in range(3 + state % 6):
+            state = (state * 1103515245 + 12345) & 0x7FFFFFFF
+            words.append(_WORDS[(state >> 16) % len(_WORDS)])
+        return ' '.join(words)
+    
+    def to_json(self, index: int) -> dict:
+        """Mensaje en el formato de la API 2010-04-01"""
+        inbound = self.inbound[index]
+        sid = self.sid(index)
+        date = formatdate(self.dates[index], usegmt=True)
+        if inbound:
+            status = 'received'
+        else:
+            status = _OUTBOUND_STATUSES[(index * 7919) % len(_OUTBOUND_STATUSES)]
+        return {
+            'sid': sid,
+            'account_sid': ACCOUNT_SID,
+            'from': self.numbers[self.from_idx[index]],
+            'to': self.numbers[self.to_idx[index]],
+            'body': self.body(index),
+            'status': status,
+            'direction': 'inbound' if inbound else 'outbound-api',
+            'date_sent': date,
+            'date_created': date,
+            'date_updated': date,
+            'num_segments': '1',
+            'num_media': '0',
+            'price': None,
+            'price_unit': 'USD',
+            'error_code': None,
+            'error_message': None,
+            'api_version': '2010-04-01',
+            'uri': f'/2010-04-01/Accounts/{ACCOUNT_SID}/Messages/{sid}.json',
+            'subresource_uris': {}
+        }
+    
+    def select(self, params: dict) -> tuple:
+        """
+        Posiciones de los mensajes que cumplen los filtros de la API
+        
+        DateSent>, DateSent< y DateSent filtran por día UTC completo, igual
+        que Twilio.
+        
+        Returns:
+            Secuencia indexable de posiciones, del más reciente al más antiguo
+        """
+        candidates = range(len(self))
+        from_id = self.number_ids.get(params['From']) if 'From' in params else -1
+        to_id = self.number_ids.get(params['To']) if 'To' in params else -1
+        if from_id is None or to_id is None:
+            return ()
+        
+        if from_id >= 0 and to_id >= 0:
+            # Se recorre la lista más corta y se comprueba la otra columna
+            by_from = self.by_from.get(from_id, ())
+            by_to = self.by_to.get(to_id, ())
+            if len(by_from) <= len(by_to):
+                candidates = [i for i in by_from if self.to_idx[i] == to_id]
+            else:
+                candidates = [i for i in by_to if self.from_idx[i] == from_id]
+        elif from_id >= 0:
+            candidates = self.by_from.get(from_id, array('I'))
+        elif to_id >= 0:
+            candidates = self.by_to.get(to_id, array('I'))
+        
+        newest, oldest = None, None
+        if 'DateSent' in params:
+            newest = oldest = params['DateSent']
+        newest = params.get('DateSent<', newest)
+        oldest = params.get('DateSent>', oldest)
+        
+        def date_key(position: int) -> int:
+            return -self.dates[position]
+        
+        start, end = 0, len(candidates)
+        if newest is not None:
+            limit = _day_start(newest) + 86400
+            start = bisect_left(candidates, -limit + 1, key=date_key)
+        if oldest is not None:
+            end = bisect_right(candidates, -_day_start(oldest), key=date_key)
+        
+        return candidates[start:max(start, end)]
+
+
+def _day_start(value: str) -> int:
+    """Medianoche UTC del día de una fecha ISO de la API"""
+    day = datetime.strptime(value[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    return int(day.timestamp())
+
+
+class FakeTwilioAPI:
+    """Estado del servidor: cuenta, latencia, límite de peticiones y contadores"""
+    
+    def __init__(self, account: SyntheticAccount, latency_ms: float = 150,
+                 jitter_ms: float = 50, per_record_us: float = 200, max_rps: float = 0):
+        """
+        Args:
+            account: Cuenta sintética
+            latency_ms: Latencia base por petición
+            jitter_ms: Variación aleatoria de la latencia
+            per_record_us: Latencia extra por mensaje de la página
+            max_rps: Peticiones/s antes de responder 429 (0 = sin límite)
+        """
+        self.account = account
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_record_us = per_record_us
+        self.max_rps = max_rps
+        self._random = random.Random(account.seed)
+        self._lock = threading.Lock()
+        self._tokens = max_rps
+        self._refilled_at = time.monotonic()
+        self.counters: dict[str, int] = {}
+    
+    def count(self, kind: str) -> None:
+        """Suma una petición al contador del tipo indicado"""
+        with self._lock:
+            self.counters[kind] = self.counters.get(kind, 0) + 1
+    
+    def allow(self) -> bool:
+        """Token bucket de max_rps peticiones por segundo"""
+        if not self.max_rps:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_rps, self._tokens + (now - self._refilled_at) * self.max_rps)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+    
+    def wait(self, records: int = 0) -> None:
+        """Simula la latencia de Twilio"""
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        delay = max(0.0, self.latency_ms + jitter) / 1000 + records * self.per_record_us / 1e6
+        time.sleep(delay)
+    
+    def list_messages(self, path: str, params: dict) -> dict:
+        """Página del listado de mensajes (PageToken = posición de inicio)"""
+        page_size = min(int(params.get('PageSize', 50)), 1000)
+        page = int(params.get('Page', 0))
+        token = params.get('PageToken', '')
+        offset = int(token[2:]) if token.startswith('PA') else page * page_size
+        
+        selected = self.account.select(params)
+        chunk = selected[offset:offset + page_size]
+        
+        next_page_uri = None
+        if offset + page_size < len(selected):
+            next_params = {
+                **params,
+                'PageSize': page_size,
+                'Page': page + 1,
+                'PageToken': f'PA{offset + page_size}'
+            }
+            next_page_uri = f'{path}?{urlencode(next_params)}'
+        
+        return {
+            'messages': [self.account.to_json(i) for i in chunk],
+            'first_page_uri': f'{path}?PageSize={page_size}&Page=0',
+            'next_page_uri': next_page_uri,
+            'previous_page_uri': None,
+            'page': page,
+            'page_size': page_size,
+            'start': offset,
+            'end': offset + len(chunk) - 1,
+            'uri': f'{path}?{urlencode(params)}'
+        }
+    
+    def incoming_numbers(self, path: str, params: dict) -> dict:
+        """Página de los números de servicio de la cuenta"""
+        page_size = min(int(params.get('PageSize', 50)), 1000)
+        page = int(params.get('Page', 0))
+        service_numbers = self.account.service_numbers
+        offset = page * page_size
+        
+        numbers = [
+            {
+                'sid': f'PN{i:032x}',
+                'account_sid': ACCOUNT_SID,
+                'phone_number': service_numbers[i].replace('whatsapp:', ''),
+                'friendly_name': f'Servicio {i + 1}',
+                'capabilities': {'sms': True, 'mms': False, 'voice': False},
+                'sms_url': ''
+            }
+            for i in range(offset, min(offset + page_size, len(service_numbers)))
+        ]
+        
+        next_page_uri = None
+        if offset + page_size < len(service_numbers):
+            next_page_uri = f'{path}?{urlencode({**params, "PageSize": page_size, "Page": page + 1})}'
+        
+        return {
+            'incoming_phone_numbers': numbers,
+            'next_page_uri': next_page_uri,
+            'page': page,
+            'page_size': page_size,
+            'start': offset,
+            'end': offset + len(numbers) - 1,
+            'uri': path
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Rutas de la API simulada (más /__stats y /__reset para el runner)"""
+    
+    protocol_version = 'HTTP/1.1'
+    api: FakeTwilioAPI
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente canceló la página (p. ej. la precarga del motor asíncrono)
+            self.close_connection = True
+    
+    def do_POST(self):
+        if self.path == '/__reset':
+            with self.api._lock:
+                self.api.counters.clear()
+            self._send(200, {})
+        else:
+            self._send(405, {'code': 20004, 'message': 'Method not allowed', 'status': 405})
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        api = self.api
+        
+        if url.path == '/__stats':
+            with api._lock:
+                counters = dict(api.counters)
+            self._send(200, {'requests': counters, 'messages': len(api.account)})
+            return
+        
+        if not api.allow():
+            api.count('rate_limited')
+            self._send(429, {'code': 20429, 'message': 'Too Many Requests', 'status': 429})
+            return
+        
+        match = _MESSAGES_RE.match(url.path)
+        if match:
+            api.count('list')
+            payload = api.list_messages(url.path, params)
+            api.wait(len(payload['messages']))
+            self._send(200, payload)
+            return
+        
+        match = _MESSAGE_RE.match(url.path)
+        if match:
+            api.count('fetch')
+            api.wait()
+            index = api.account.index_of(match.group(2))
+            if index is None:
+                self._send(404, {'code': 20404, 'message': 'Not found', 'status': 404})
+            else:
+                self._send(200, api.account.to_json(index))
+            return
+        
+        match = _NUMBERS_RE.match(url.path)
+        if match:
+            api.count('numbers')
+            api.wait()
+            self._send(200, api.incoming_numbers(url.path, params))
+            return
+        
+        match = _ACCOUNT_RE.match(url.path)
+        if match:
+            api.count('account')
+            api.wait()
+            self._send(200, {
+                'sid': match.group(1),
+                'friendly_name': 'Cuenta de benchmark',
+                'status': 'active',
+                'type': 'Full'
+            })
+            return
+        
+        self._send(404, {'code': 20404, 'message': 'Not found', 'status': 404})
+
+
+def serve(api: FakeTwilioAPI, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    Crea el servidor HTTP de la API simulada (llamar serve_forever)
+    
+    Args:
+        api: Estado de la API
+        host: Interfaz
+        port: Puerto (0 = uno libre)
+    
+    Returns:
+        Servidor listo para atender
+    """
+    handler = type('Handler', (_Handler,), {'api': api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    """Arranca la API simulada e imprime su URL en la primera línea"""
+    parser = argparse.ArgumentParser(description='API de mensajes de Twilio simulada')
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--services', type=int, default=2, help='Números de servicio de la cuenta')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--anchor', type=int, default=None, help='Epoch del mensaje más reciente')
+    parser.add_argument('--latency-ms', type=float, default=150)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--per-record-us', type=float, default=200)
+    parser.add_argument('--max-rps', type=float, default=0)
+    parser.add_argument('--port', type=int, default=0)
+    args = parser.parse_args()
+    
+    account = SyntheticAccount(
+        args.messages,
+        days=args.days,
+        users=args.users,
+        services=args.services,
+        seed=args.seed,
+        anchor=args.anchor
+    )
+    api = FakeTwilioAPI(
+        account,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        per_record_us=args.per_record_us,
+        max_rps=args.max_rps
+    )
+    server = serve(api, port=args.port)
+    host, port = server.server_address[:2]
+    print(f'http://{host}:{port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,437 @@
+"""
+Benchmarks reproducibles del monitor contra la API de Twilio simulada
+
+Levanta benchmarks.fake_twilio_api en un subproceso, crea la app Flask en
+este proceso apuntando a ella (TWILIO_API_BASE_URL) y ejecuta escenarios
+fijos con el cliente de pruebas de Flask. Por escenario reporta latencia
+p50/p95/máxima, peticiones a la API simulada y memoria (RSS) del proceso.
+
+Uso:
+    python -m benchmarks.run --messages 100000
+    python -m benchmarks.run --messages 1000000 --scenarios deep_pagination,body_search
+    python -m benchmarks.run --json resultados.json
+    python -m benchmarks.run --compare resultados.json
+
+Con la misma semilla, tamaño y --anchor los datos y las peticiones son
+idénticos entre corridas: sirve para comparar antes y después de un cambio.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.request import Request, urlopen
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def rss_mb() -> float:
+    """Memoria residente actual del proceso (MB)"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sin /proc (macOS): pico de memoria, en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Percentil por rango más cercano (0 si no hay valores)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class FakeTwilioProcess:
+    """API simulada corriendo en un subproceso"""
+    
+    def __init__(self, args: argparse.Namespace, anchor: int):
+        """
+        Args:
+            args: Argumentos del runner (tamaño de la cuenta y latencias)
+            anchor: Epoch del mensaje más reciente
+        """
+        command = [
+            sys.executable, '-m', 'benchmarks.fake_twilio_api',
+            '--messages', str(args.messages),
+            '--days', str(args.days),
+            '--users', str(args.users),
+            '--seed', str(args.seed),
+            '--anchor', str(anchor),
+            '--latency-ms', str(args.latency_ms),
+            '--jitter-ms', str(args.jitter_ms),
+            '--per-record-us', str(args.per_record_us),
+            '--max-rps', str(args.max_rps)
+        ]
+        self._process = subprocess.Popen(command, cwd=REPO_DIR, stdout=subprocess.PIPE, text=True)
+        self.url = self._process.stdout.readline().strip()
+        if not self.url:
+            raise RuntimeError('La API simulada no arrancó')
+    
+    def stats(self) -> dict:
+        """Peticiones recibidas por tipo"""
+        with urlopen(f'{self.url}/__stats') as response:
+            return json.load(response)['requests']
+    
+    def reset(self) -> None:
+        """Pone a cero los contadores"""
+        urlopen(Request(f'{self.url}/__reset', method='POST')).close()
+    
+    def stop(self) -> None:
+        """Termina el subproceso"""
+        self._process.terminate()
+        self._process.wait(timeout=10)
+
+
+class BenchmarkContext:
+    """Cliente de la app y mediciones del escenario en curso"""
+    
+    def __init__(self, app, fake: FakeTwilioProcess, account_sid: str,
+                 anchor: int, args: argparse.Namespace):
+        """
+        Args:
+            app: App Flask ya creada
+            fake: API simulada
+            account_sid: Cuenta de la API simulada
+            anchor: Epoch del mensaje más reciente
+            args: Argumentos del runner
+        """
+        from backend.config import Config
+        
+        self.app = app
+        self.fake = fake
+        self.account_sid = account_sid
+        self.args = args
+        self.repeat = args.repeat
+        self.service_number = 'whatsapp:+18392740000'
+        self.local_anchor = (
+            datetime.fromtimestamp(anchor, timezone.utc).replace(tzinfo=None)
+            - timedelta(hours=Config.TIMEZONE_OFFSET_HOURS)
+        )
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.extra: dict = {}
+        self._lock = threading.Lock()
+    
+    def day(self, days_ago: int) -> str:
+        """Fecha local (YYYY-MM-DD) relativa al mensaje más reciente"""
+        return (self.local_anchor - timedelta(days=days_ago)).date().isoformat()
+    
+    def client(self):
+        """Cliente de pruebas con sesión iniciada"""
+        client = self.app.test_client()
+        response = client.post('/api/login', json={
+            'account_sid': self.account_sid,
+            'auth_token': 'benchmark'
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f'Login falló: {response.status_code}')
+        return client
+    
+    def get(self, client, path: str, record: bool = True) -> Optional[dict]:
+        """
+        Hace una petición GET y registra su latencia
+        
+        Args:
+            client: Cliente de pruebas
+            path: Ruta con query string
+            record: False para peticiones de calentamiento
+        
+        Returns:
+            JSON de la respuesta (None si no es JSON)
+        """
+        started = time.perf_counter()
+        response = client.get(path)
+        elapsed = (time.perf_counter() - started) * 1000
+        if record:
+            with self._lock:
+                self.latencies.append(elapsed)
+                if response.status_code != 200:
+                    self.errors += 1
+        return response.get_json(silent=True)
+    
+    def settle(self, timeout: float = 60) -> None:
+        """Espera a que terminen las precargas en segundo plano"""
+        client = self.app.test_client()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            health = client.get('/health').get_json()
+            if not health.get('prefetch', {}).get('pending'):
+                return
+            time.sleep(0.1)
+
+
+# ----------------------------------------------------------------------
+# Escenarios
+# ----------------------------------------------------------------------
+
+def cold_page(ctx: BenchmarkContext) -> None:
+    """Primera página de búsquedas distintas: siempre fallo de caché"""
+    client = ctx.client()
+    for k in range(ctx.repeat):
+        ctx.get(client, f'/mensajes?page=1&per_page=50&fecha_inicio={ctx.day(k + 1)}')
+
+
+def cache_hit(ctx: BenchmarkContext) -> None:
+    """La misma página repetida: aciertos de caché"""
+    client = ctx.client()
+    path = f'/mensajes?page=1&per_page=50&from_to={ctx.service_number}&fecha_inicio={ctx.day(2)}'
+    ctx.get(client, path, record=False)
+    for _ in range(ctx.repeat * 5):
+        ctx.get(client, path)
+
+
+def deep_pagination(ctx: BenchmarkContext) -> None:
+    """Páginas 1..N de una búsqueda de 7 días, con una pausa de lectura entre clics"""
+    client = ctx.client()
+    for page in range(1, ctx.args.pages + 1):
+        ctx.get(client, f'/mensajes?page={page}&per_page=50&fecha_inicio={ctx.day(7)}')
+        time.sleep(ctx.args.think_ms / 1000)
+
+
+def body_search(ctx: BenchmarkContext) -> None:
+    """Búsquedas por contenido (prefijos, varias palabras y frases) sobre 7 días"""
+    client = ctx.client()
+    queries = ['pedido', 'gracias entrega', '"canción mañana"', 'confirm', 'inexistente']
+    for k in range(ctx.repeat):
+        for query in queries:
+            ctx.get(
+                client,
+                f'/mensajes?page=1&per_page=50&fecha_inicio={ctx.day(7 + k)}&body_search={query}'
+            )
+
+
+def wide_range(ctx: BenchmarkContext) -> None:
+    """Conversación del servicio en 30 días con conteo exacto (mide también el tiempo al total exacto)"""
+    client = ctx.client()
+    query = (
+        f'from_to={ctx.service_number}&fecha_inicio={ctx.day(ctx.args.days)}'
+        f'&fecha_final={ctx.day(0)}T23:59'
+    )
+    started = time.perf_counter()
+    ctx.get(client, f'/mensajes?page=1&per_page=50&exact_count=1&{query}')
+    
+    polls = 0
+    while time.perf_counter() - started < ctx.args.count_timeout:
+        count = ctx.get(client, f'/mensajes/count?per_page=50&{query}') or {}
+        polls += 1
+        if count.get('exact'):
+            ctx.extra['exact_total'] = count.get('total')
+            ctx.extra['seconds_to_exact'] = round(time.perf_counter() - started, 2)
+            break
+        time.sleep(0.5)
+    ctx.extra['count_polls'] = polls
+
+
+def pollers(ctx: BenchmarkContext) -> None:
+    """Varias pestañas refrescando la misma búsqueda del día a la vez"""
+    path = f'/mensajes?page=1&per_page=50&fecha_inicio={ctx.day(0)}'
+    clients = [ctx.client() for _ in range(ctx.args.pollers)]
+    
+    def poll(client) -> None:
+        for _ in range(ctx.repeat * 2):
+            ctx.get(client, path)
+            time.sleep(0.25)
+    
+    threads = [threading.Thread(target=poll, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+SCENARIOS: dict[str, Callable[[BenchmarkContext], None]] = {
+    'cold_page': cold_page,
+    'cache_hit': cache_hit,
+    'deep_pagination': deep_pagination,
+    'body_search': body_search,
+    'wide_range': wide_range,
+    'pollers': pollers
+}
+
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+
+def run_scenario(name: str, ctx: BenchmarkContext) -> dict:
+    """
+    Ejecuta un escenario y resume sus mediciones
+    
+    Returns:
+        Diccionario con latencias, peticiones a la API simulada y RSS
+    """
+    ctx.latencies, ctx.errors, ctx.extra = [], 0, {}
+    ctx.fake.reset()
+    rss_before = rss_mb()
+    
+    started = time.perf_counter()
+    SCENARIOS[name](ctx)
+    ctx.settle()
+    wall = time.perf_counter() - started
+    
+    upstream = ctx.fake.stats()
+    upstream.pop('account', None)  # Logins del propio escenario
+    return {
+        'scenario': name,
+        'requests': len(ctx.latencies),
+        'errors': ctx.errors,
+        'p50_ms': round(percentile(ctx.latencies, 0.50), 2),
+        'p95_ms': round(percentile(ctx.latencies, 0.95), 2),
+        'max_ms': round(max(ctx.latencies, default=0), 2),
+        'wall_s': round(wall, 2),
+        'upstream_calls': sum(upstream.values()),
+        'upstream': upstream,
+        'rss_mb': round(rss_mb(), 1),
+        'rss_delta_mb': round(rss_mb() - rss_before, 1),
+        **ctx.extra
+    }
+
+
+def print_results(results: list[dict]) -> None:
+    """Tabla de resultados"""
+    header = (
+        f"{'escenario':<17}{'peticiones':>11}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}"
+        f"{'errores':>9}{'upstream':>10}{'RSS MB':>9}{'ΔRSS':>8}"
+    )
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(
+            f"{result['scenario']:<17}{result['requests']:>11}{result['p50_ms']:>10.1f}"
+            f"{result['p95_ms']:>10.1f}{result['max_ms']:>10.1f}{result['errors']:>9}"
+            f"{result['upstream_calls']:>10}{result['rss_mb']:>9.1f}{result['rss_delta_mb']:>+8.1f}"
+        )
+        extra = {
+            key: value for key, value in result.items()
+            if key in ('seconds_to_exact', 'exact_total', 'count_polls')
+        }
+        if extra:
+            print(f"{'':<17}{extra}")
+
+
+def print_comparison(results: list[dict], baseline_path: str) -> None:
+    """Compara p50/p95 y llamadas upstream con una corrida anterior (--json)"""
+    with open(baseline_path) as baseline_file:
+        baseline = {result['scenario']: result for result in json.load(baseline_file)['results']}
+    
+    print(f"\nComparación con {baseline_path} (actual / base)")
+    for result in results:
+        before = baseline.get(result['scenario'])
+        if before is None:
+            continue
+        
+        def ratio(key: str) -> str:
+            return f"{result[key] / before[key]:.2f}x" if before[key] else '-'
+        
+        print(
+            f"{result['scenario']:<17} p50 {ratio('p50_ms'):>7}  p95 {ratio('p95_ms'):>7}  "
+            f"upstream {before['upstream_calls']} -> {result['upstream_calls']}"
+        )
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Argumentos de la línea de comandos"""
+    parser = argparse.ArgumentParser(description='Benchmarks del monitor de mensajes')
+    parser.add_argument('--messages', type=int, default=100000, help='Mensajes de la cuenta (10k-1M)')
+    parser.add_argument('--days', type=int, default=30, help='Días que cubren los mensajes')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--anchor', default=None,
+                        help='Fecha UTC del mensaje más reciente (ISO; default: hora actual)')
+    parser.add_argument('--latency-ms', type=float, default=150, help='Latencia por página de la API')
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--per-record-us', type=float, default=200)
+    parser.add_argument('--max-rps', type=float, default=0, help='Límite de la API (429); 0 = sin límite')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--pages', type=int, default=20, help='Páginas de deep_pagination')
+    parser.add_argument('--think-ms', type=float, default=300, help='Pausa entre clics de deep_pagination')
+    parser.add_argument('--pollers', type=int, default=8, help='Clientes simultáneos de pollers')
+    parser.add_argument('--count-timeout', type=float, default=120)
+    parser.add_argument('--engine', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--store', action='store_true', help='Activar el almacén local de mensajes')
+    parser.add_argument('--cache-backend', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--json', help='Guardar los resultados en este archivo')
+    parser.add_argument('--compare', help='Resultados anteriores (--json) con los que comparar')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Ejecuta los escenarios pedidos e imprime el reporte"""
+    args = parse_args(argv)
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Escenarios desconocidos: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    
+    if args.anchor:
+        anchor = int(datetime.fromisoformat(args.anchor).replace(tzinfo=timezone.utc).timestamp())
+    else:
+        anchor = int(time.time()) // 3600 * 3600
+    
+    print(f"Generando cuenta sintética de {args.messages} mensajes...", flush=True)
+    fake = FakeTwilioProcess(args, anchor)
+    work_dir = tempfile.mkdtemp(prefix='bench-')
+    
+    # La configuración se lee al importar backend: el entorno va antes
+    os.environ.update({
+        'TWILIO_API_BASE_URL': fake.url,
+        'TWILIO_ASYNC_ENABLED': str(args.engine == 'async'),
+        'MESSAGE_STORE_ENABLED': str(args.store),
+        'MESSAGE_STORE_DIR': os.path.join(work_dir, 'message_store'),
+        'CACHE_BACKEND': args.cache_backend,
+        'CACHE_SQLITE_PATH': os.path.join(work_dir, 'cache.sqlite3'),
+        'FLASK_DEBUG': 'False'
+    })
+    sys.path.insert(0, str(REPO_DIR))
+    
+    try:
+        import logging
+        from backend.app import create_app
+        from benchmarks.fake_twilio_api import ACCOUNT_SID
+        
+        app = create_app()
+        logging.getLogger().setLevel(logging.WARNING)
+        ctx = BenchmarkContext(app, fake, ACCOUNT_SID, anchor, args)
+        
+        results = []
+        for name in names:
+            print(f"Ejecutando {name}...", flush=True)
+            results.append(run_scenario(name, ctx))
+    finally:
+        fake.stop()
+    
+    print()
+    print_results(results)
+    if args.compare:
+        print_comparison(results, args.compare)
+    
+    if args.json:
+        config = {key: value for key, value in vars(args).items() if key not in ('json', 'compare')}
+        config.update(anchor=anchor, python=platform.python_version())
+        with open(args.json, 'w') as output:
+            json.dump({'config': config, 'results': results}, output, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
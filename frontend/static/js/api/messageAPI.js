@@ -14,26 +14,9 @@ class MessageAPI {
                 return await this._fetchServiceUserConversation(params);
             }
             
-            // Si existe from_to, hacer dos peticiones en paralelo
-            if (params.from_to) {
-                const from_to = params.from_to;
-                
-                // Crear copia de params sin from_to
-                const baseParams = { ...params };
-                delete baseParams.from_to;
-                
-                // Hacer dos peticiones en paralelo
-                const [responseFrom, responseTo] = await Promise.all([
-                    this._fetchWithParams({ ...baseParams, from: from_to }),
-                    this._fetchWithParams({ ...baseParams, to: from_to })
-                ]);
-                
-                // Combinar y retornar resultados
-                return this._mergeResults(responseFrom, responseTo);
-            } else {
-                // Petición normal sin from_to
-                return await this._fetchWithParams(params);
-            }
+            // from_to (mensajes de o para un número) lo resuelve el backend
+            // en una sola consulta que combina ambos sentidos
+            return await this._fetchWithParams(params);
         } catch (error) {
             console.error("Error al cargar mensajes:", error);
             throw error;
@@ -57,16 +40,96 @@ class MessageAPI {
         
         console.log(`Buscando conversación entre servicio ${serviceNumber} y usuario ${userNumber}`);
         
-        // Hacer dos búsquedas en paralelo:
-        // 1. Mensajes DEL servicio HACIA el usuario
-        // 2. Mensajes DEL usuario HACIA el servicio
-        const [responseServiceToUser, responseUserToService] = await Promise.all([
-            this._fetchWithParams({ ...baseParams, from: serviceNumber, to: userNumber }),
-            this._fetchWithParams({ ...baseParams, from: userNumber, to: serviceNumber })
-        ]);
+        // El backend combina ambos sentidos (servicio -> usuario y
+        // usuario -> servicio) y pagina la conversación completa
+        return await this._fetchWithParams({
+            ...baseParams,
+            from_to: serviceNumber,
+            contraparte: userNumber
+        });
+    }
+
+    /**
+     * Construye la URL de exportación con los mismos filtros de la búsqueda
+     * @param {Object} params - Parámetros de búsqueda
+     * @param {string} format - 'csv' o 'ndjson'
+     * @returns {string} URL de /mensajes/export
+     */
+    static buildExportUrl(params, format = 'csv') {
+        const exportParams = this._resolveConversation({ ...params, format });
+        delete exportParams.page;
+        delete exportParams.per_page;
+        delete exportParams.exact_count;
+        
+        return `/mensajes/export?${this._toQueryString(exportParams)}`;
+    }
+    
+    /**
+     * Abre el feed en vivo (SSE) de mensajes nuevos de una búsqueda
+     * @param {Object} params - Parámetros de búsqueda
+     * @param {Function} onMessages - Recibe cada lote de mensajes nuevos (más antiguo primero)
+     * @returns {EventSource} Conexión abierta (llamar close() al cambiar de búsqueda)
+     */
+    static openStream(params, onMessages) {
+        const streamParams = this._resolveConversation({ ...params });
+        delete streamParams.page;
+        delete streamParams.per_page;
+        delete streamParams.exact_count;
         
-        // Combinar resultados
-        return this._mergeResults(responseServiceToUser, responseUserToService);
+        // EventSource reconecta solo y reenvía Last-Event-ID para no perder mensajes
+        const source = new EventSource(`/mensajes/stream?${this._toQueryString(streamParams)}`);
+        source.addEventListener('mensajes', (event) => {
+            onMessages(JSON.parse(event.data).mensajes);
+        });
+        return source;
+    }
+    
+    /**
+     * Consulta el conteo exacto de una búsqueda (puede seguir en curso)
+     * @param {Object} params - Parámetros de búsqueda
+     * @returns {Promise<Object>} { total, total_pages, exact, days_done, days_total }
+     */
+    static async fetchCount(params) {
+        const countParams = this._resolveConversation({ ...params });
+        delete countParams.page;
+        delete countParams.exact_count;
+        
+        const response = await fetch(`/mensajes/count?${this._toQueryString(countParams)}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return await response.json();
+    }
+    
+    /**
+     * Convierte la búsqueda servicio-usuario en from_to + contraparte
+     * @param {Object} params - Parámetros de búsqueda (se modifican)
+     * @returns {Object} Parámetros para el backend
+     */
+    static _resolveConversation(params) {
+        if (params.service_user_conversation) {
+            params.from_to = params.service_number;
+            params.contraparte = params.user_number;
+            delete params.service_user_conversation;
+            delete params.service_number;
+            delete params.user_number;
+        }
+        return params;
+    }
+    
+    /**
+     * Serializa los parámetros con valor a query string
+     * @param {Object} params - Parámetros
+     * @returns {string} Query string
+     */
+    static _toQueryString(params) {
+        const queryParams = new URLSearchParams();
+        Object.entries(params).forEach(([key, value]) => {
+            if (value) {
+                queryParams.append(key, value);
+            }
+        });
+        return queryParams.toString();
     }
 
     /**
@@ -93,40 +156,6 @@ class MessageAPI {
         console.log("Response received:", data);
         return data;
     }
-
-    /**
-     * Combina resultados de dos peticiones
-     * @param {Object} responseFrom - Respuesta de petición con from
-     * @param {Object} responseTo - Respuesta de petición con to
-     * @returns {Object} Resultados combinados
-     */
-    static _mergeResults(responseFrom, responseTo) {
-        // Combinar los mensajes de ambas respuestas, eliminando duplicados por SID
-        const allMessages = [...(responseFrom.mensajes || []), ...(responseTo.mensajes || [])];
-        const uniqueMessages = [];
-        const seenSids = new Set();
-        
-        for (const message of allMessages) {
-            if (!seenSids.has(message.sid)) {
-                uniqueMessages.push(message);
-                seenSids.add(message.sid);
-            }
-        }
-        
-        // Ordenar por fecha (más recientes primero)
-        uniqueMessages.sort((a, b) => {
-            const da = a && a.date_sent ? new Date(a.date_sent) : new Date(0);
-            const db = b && b.date_sent ? new Date(b.date_sent) : new Date(0);
-            return db - da;
-        });
-
-        // Retornar la respuesta con la estructura del primer resultado
-        return {
-            ...responseFrom,
-            mensajes: uniqueMessages,
-            total: uniqueMessages.length
-        };
-    }
 }
 
 export default MessageAPI;
@@ -10,6 +10,7 @@ import FormHandler from './ui/formHandler.js';
 import CSVExporter from './utils/csvExporter.js';
 import AuthService from './services/authService.js';
 import ServicesService from './services/servicesService.js';
+import MessageAPI from './api/messageAPI.js';
 
 class TwilioMonitorApp {
     constructor() {
@@ -38,6 +39,13 @@ class TwilioMonitorApp {
         this.serviceInfoName = document.getElementById('service-info-name');
         this.serviceInfoNumber = document.getElementById('service-info-number');
         this.accountNameElement = document.getElementById('account-name');
+        
+        // Identifica la búsqueda vigente para descartar conteos de búsquedas anteriores
+        this.countRequestId = 0;
+        
+        // Feed en vivo de la primera página (EventSource) y SID ya mostrados
+        this.liveFeed = null;
+        this.shownSids = new Set();
     }
     
     /**
@@ -168,6 +176,10 @@ class TwilioMonitorApp {
             return;
         }
         
+        // Cancelar el sondeo de conteo y el feed en vivo de la búsqueda anterior
+        this.countRequestId++;
+        this.stopLiveFeed();
+        
         // Mostrar indicadores de carga
         this.formHandler.toggleLoadingIndicator(true);
         this.tableRenderer.renderLoading();
@@ -197,6 +209,15 @@ class TwilioMonitorApp {
             );
             this.paginationRenderer.renderInfo(response);
             
+            if (response.count_pending) {
+                this.pollExactCount(searchParams, response);
+            }
+            
+            // Sólo la primera página de una búsqueda abierta recibe mensajes nuevos
+            if (response.page === 1 && !searchParams.fecha_final && !searchParams.sid) {
+                this.startLiveFeed(searchParams, response);
+            }
+            
             // Renderizar estadísticas (NUEVO)
             this.statsRenderer.render(response);
             
@@ -217,6 +238,79 @@ class TwilioMonitorApp {
         }
     }
     
+    /**
+     * Abre el feed en vivo y agrega los mensajes nuevos al inicio de la tabla
+     * @param {Object} searchParams - Parámetros de la búsqueda mostrada
+     * @param {Object} response - Respuesta mostrada
+     */
+    startLiveFeed(searchParams, response) {
+        this.shownSids = new Set(response.mensajes.map((message) => message.sid));
+        
+        this.liveFeed = MessageAPI.openStream(searchParams, (messages) => {
+            const fresh = messages.filter((message) => !this.shownSids.has(message.sid));
+            if (fresh.length === 0) {
+                return;
+            }
+            fresh.forEach((message) => this.shownSids.add(message.sid));
+            
+            // El lote llega del más antiguo al más reciente; la tabla muestra primero el más reciente
+            this.tableRenderer.prepend(fresh.reverse(), response.per_page);
+        });
+    }
+    
+    /**
+     * Cierra el feed en vivo de la búsqueda anterior
+     */
+    stopLiveFeed() {
+        if (this.liveFeed) {
+            this.liveFeed.close();
+            this.liveFeed = null;
+        }
+    }
+    
+    /**
+     * Consulta el conteo exacto hasta que esté listo y actualiza la paginación
+     * @param {Object} searchParams - Parámetros de la búsqueda mostrada
+     * @param {Object} response - Respuesta mostrada (con total estimado)
+     */
+    async pollExactCount(searchParams, response) {
+        const requestId = ++this.countRequestId;
+        
+        for (let attempt = 0; attempt < 30; attempt++) {
+            await new Promise((resolve) => setTimeout(resolve, 2000));
+            
+            // Otra búsqueda o página reemplazó a esta
+            if (requestId !== this.countRequestId) {
+                return;
+            }
+            
+            try {
+                const count = await MessageAPI.fetchCount(searchParams);
+                if (requestId !== this.countRequestId) {
+                    return;
+                }
+                if (count.exact) {
+                    const updated = {
+                        ...response,
+                        total: count.total,
+                        total_pages: count.total_pages,
+                        total_exact: true
+                    };
+                    this.paginationRenderer.render(
+                        updated.page,
+                        updated.total_pages,
+                        updated.page < updated.total_pages
+                    );
+                    this.paginationRenderer.renderInfo(updated);
+                    return;
+                }
+            } catch (error) {
+                console.error("Error al consultar conteo exacto:", error);
+                return;
+            }
+        }
+    }
+    
     /**
      * Limpia todos los filtros
      */
@@ -227,10 +321,21 @@ class TwilioMonitorApp {
     }
     
     /**
-     * Exporta la tabla actual a CSV
+     * Exporta a CSV todos los resultados de los filtros actuales
      */
     exportCSV() {
-        CSVExporter.exportTable('tabla-mensajes');
+        const selectedService = this.servicesService.getSelectedService();
+        if (!selectedService) {
+            // Sin servicio no hay búsqueda que exportar: usar la tabla visible
+            CSVExporter.exportTable('tabla-mensajes');
+            return;
+        }
+        
+        const searchParams = this.messageService.buildSearchParams(
+            this.formHandler.form,
+            selectedService
+        );
+        CSVExporter.exportResults(searchParams);
     }
     
     /**
@@ -35,7 +35,8 @@ class MessageService {
         const formData = new FormData(form);
         const params = {
             page: this.currentPage,
-            per_page: this.messagesPerPage
+            per_page: this.messagesPerPage,
+            exact_count: 1
         };
         
         // Función auxiliar para normalizar números (agregar whatsapp: si no lo tiene)
@@ -66,6 +67,17 @@ class MessageService {
             params.body_search = bodySearch.trim();
         }
         
+        // Estado y sentido (se combinan con cualquier otro filtro)
+        const status = formData.get('status');
+        if (status) {
+            params.status = status;
+        }
+        
+        const direction = formData.get('direction');
+        if (direction) {
+            params.direction = direction;
+        }
+        
         // Obtener valores de filtros manuales
         const numeroFrom = formData.get('numero_from');
         const numeroTo = formData.get('numero_to');
@@ -54,6 +54,8 @@ class FormHandler {
         document.getElementById("numero_to").value = "";
         document.getElementById("numero_from_to").value = "";
         document.getElementById("body_search").value = ""; // Nuevo campo
+        document.getElementById("status").value = "";
+        document.getElementById("direction").value = "";
         document.getElementById("cantidad").value = "50";
     }
     
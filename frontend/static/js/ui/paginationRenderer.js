@@ -43,7 +43,7 @@ class PaginationRenderer {
         this.info.innerHTML = `
             <small class="text-muted">
                 Mostrando ${start}-${end} de ${data.total} mensajes
-                ${data.has_more ? ' (aprox.)' : ''}
+                ${data.has_more && !data.total_exact ? ' (aprox.)' : ''}
             </small>
         `;
     }
@@ -74,7 +74,9 @@ class StatsRenderer {
                 <small class="text-muted">
                     <i class="bi bi-info-circle"></i>
                     Los usuarios únicos excluyen el número del servicio seleccionado
-                    ${data.has_more ? ' (puede haber más resultados)' : ''}
+                    ${data.scan_truncated
+                        ? ' (búsqueda parcial: se cortó la lectura tras muchos mensajes sin coincidencias)'
+                        : data.has_more ? ' (puede haber más resultados)' : ''}
                 </small>
             </div>
         `;
@@ -27,6 +27,26 @@ class TableRenderer {
         });
     }
     
+    /**
+     * Agrega mensajes nuevos al inicio de la tabla
+     * @param {Array} messages - Mensajes nuevos, del más reciente al más antiguo
+     * @param {number} maxRows - Filas máximas (las más antiguas se quitan)
+     */
+    prepend(messages, maxRows) {
+        // Quitar el aviso de tabla vacía
+        if (this.table.querySelector('td[colspan]')) {
+            this.table.innerHTML = "";
+        }
+        
+        [...messages].reverse().forEach(message => {
+            this.table.insertBefore(this._createRow(message), this.table.firstChild);
+        });
+        
+        while (this.table.rows.length > maxRows) {
+            this.table.deleteRow(-1);
+        }
+    }
+    
     /**
      * Muestra mensaje de tabla vacía
      */
@@ -2,8 +2,23 @@
  * Utilidad para exportar datos a CSV
  */
 import DateFormatter from './dateFormatter.js';
+import MessageAPI from '../api/messageAPI.js';
 
 class CSVExporter {
+    /**
+     * Exporta todos los resultados de la búsqueda desde el backend
+     * (no sólo la página visible); el servidor genera el archivo en streaming
+     * @param {Object} searchParams - Parámetros de búsqueda actuales
+     */
+    static exportResults(searchParams) {
+        const link = document.createElement('a');
+        link.href = MessageAPI.buildExportUrl(searchParams, 'csv');
+        link.style.display = 'none';
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+    }
+    
     /**
      * Exporta la tabla actual a CSV
      * @param {string} tableId - ID de la tabla
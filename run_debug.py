@@ -13,8 +13,14 @@ sys.path.insert(0, str(Path(__file__).parent))
 from backend.config import Config
 from backend.services.twilio_service import TwilioService
 from backend.services.cache_service import CacheService
+from backend.services.cache_backends import create_cache_backend
+from backend.services.message_store import MessageStoreManager
+from backend.services.twilio_client_registry import TwilioClientRegistry
+from backend.services.webhook_ingestor import WebhookIngestor
 from backend.routes.message_routes import MessageRoutes
 from backend.routes.auth_routes import AuthRoutes
+from backend.routes.webhook_routes import WebhookRoutes
+from backend.routes.metrics_routes import MetricsRoutes
 
 # Crear aplicación
 app = Flask(__name__, static_folder=None)  # Deshabilitamos la carpeta static por defecto
@@ -54,15 +60,66 @@ if STATIC_DIR.exists() and not IS_PRODUCTION:
 print("="*60 + "\n")
 
 # Inicializar servicios
-cache_service = CacheService(ttl_seconds=Config.CACHE_TTL_SECONDS)
+cache_service = CacheService(
+    ttl_seconds=Config.CACHE_TTL_SECONDS,
+    stale_ttl_seconds=Config.CACHE_STALE_SECONDS,
+    backend=create_cache_backend(
+        Config.CACHE_BACKEND,
+        max_entries=Config.CACHE_MAX_ENTRIES,
+        max_bytes=Config.CACHE_MAX_BYTES,
+        sqlite_path=Config.CACHE_SQLITE_PATH
+    )
+)
+
+client_registry = TwilioClientRegistry(
+    pool_size=Config.TWILIO_HTTP_POOL_SIZE,
+    idle_seconds=Config.TWILIO_CLIENT_IDLE_SECONDS,
+    timeout=Config.TWILIO_HTTP_TIMEOUT,
+    governor_options={
+        'initial_rate': Config.TWILIO_RATE_INITIAL,
+        'max_rate': Config.TWILIO_RATE_MAX,
+        'max_concurrency': Config.TWILIO_MAX_CONCURRENCY,
+        'max_retries': Config.TWILIO_RATE_LIMIT_RETRIES,
+        'max_wait_seconds': Config.TWILIO_RATE_LIMIT_MAX_WAIT_SECONDS
+    },
+    api_base_url=Config.TWILIO_API_BASE_URL
+)
+
+message_store_manager = None
+if Config.MESSAGE_STORE_ENABLED:
+    message_store_manager = MessageStoreManager(Config.MESSAGE_STORE_DIR)
 
 # Registrar rutas
-auth_routes = AuthRoutes()
+auth_routes = AuthRoutes(client_registry, cache_service)
 app.register_blueprint(auth_routes.blueprint)
 
-message_routes = MessageRoutes(cache_service)
+message_routes = MessageRoutes(
+    cache_service,
+    message_store_manager,
+    client_registry=client_registry
+)
 app.register_blueprint(message_routes.blueprint)
 
+webhook_ingestor = WebhookIngestor(
+    cache_service,
+    message_store_manager,
+    max_queue=Config.WEBHOOK_QUEUE_SIZE,
+    batch_size=Config.WEBHOOK_BATCH_SIZE
+)
+webhook_routes = WebhookRoutes(
+    webhook_ingestor,
+    Config.TWILIO_WEBHOOK_AUTH_TOKENS,
+    base_url=Config.WEBHOOK_BASE_URL
+)
+app.register_blueprint(webhook_routes.blueprint)
+
+metrics_routes = MetricsRoutes(
+    cache_service,
+    token=Config.METRICS_TOKEN,
+    server_timing=Config.SERVER_TIMING_ENABLED
+)
+app.register_blueprint(metrics_routes.blueprint)
+
 
 @app.route("/")
 def index():
@@ -161,6 +218,10 @@ def health():
         "status": "ok",
         "environment": "production" if IS_PRODUCTION else "development",
         "cache_size": cache_service.size(),
+        "cache": cache_service.stats(),
+        "twilio_clients": client_registry.stats(),
+        "webhooks": webhook_ingestor.stats(),
+        "prefetch": message_routes.page_prefetcher.stats(),
         "authenticated": 'account_sid' in session,
         "paths": {
             "base_dir": str(BASE_DIR),
@@ -199,6 +260,8 @@ if __name__ == "__main__":
         print(f"   • Página: http://127.0.0.1:{port}/")
         print(f"   • Login: http://127.0.0.1:{port}/login")
         print(f"   • Health: http://127.0.0.1:{port}/health")
+        if Config.METRICS_TOKEN:
+            print(f"   • Métricas: http://127.0.0.1:{port}/metrics")
         print(f"   • CSS: http://127.0.0.1:{port}/static/css/style.css")
         print(f"   • JS: http://127.0.0.1:{port}/static/js/main.js")
     
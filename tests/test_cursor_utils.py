@@ -0,0 +1,41 @@
+"""
+Validación de los cursores opacos de paginación
+"""
+import base64
+import json
+
+import pytest
+
+from backend.utils.cursor_utils import decode_cursor, encode_cursor
+
+
+def _raw(state) -> str:
+    """Token con cualquier contenido, como uno manipulado por el cliente"""
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('state', [
+    {'f': 'abc', 'm': 's', 'n': 50, 'd': 1767225600, 's': 'SM1'},
+    {'f': 'abc', 'm': 's', 'n': 50, 'd': None, 's': 'SM1'},
+    {'f': 'abc', 'm': 'u', 'n': 0, 't': None, 'p': None, 'o': 0},
+    {'f': 'abc', 'm': 'o', 'n': 20},
+])
+def test_round_trip(state):
+    assert decode_cursor(encode_cursor(state)) == state
+
+
+@pytest.mark.parametrize('token', [
+    'no-es-base64!',
+    _raw([1, 2]),
+    _raw({'s': 'SM1'}),
+    _raw({'d': 1767225600}),
+    _raw({'o': 'x'}),
+    _raw({'n': '10'}),
+    _raw({'n': True}),
+    _raw({'p': 1.5}),
+    _raw({'n': -1}),
+    _raw({'url': 'https://otro-host'}),
+])
+def test_malformed_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
@@ -0,0 +1,88 @@
+"""
+Equivalencia entre MessageFilter.matches y los matchers compilados
+"""
+from datetime import datetime, timedelta
+from itertools import product
+import random
+
+from backend.models.message import Message, MessageFilter
+from backend.services.query_planner import QueryPlanner
+
+
+BASE = datetime(2026, 1, 10)
+NUMBERS = ['whatsapp:+1', 'whatsapp:+2', 'whatsapp:+3']
+
+
+def _messages(count: int = 300) -> list[Message]:
+    rnd = random.Random(7)
+    return [
+        Message(
+            f'SM{i}',
+            rnd.choice(NUMBERS),
+            rnd.choice(NUMBERS),
+            rnd.choice(['Hola confirmado', 'adiós', None, 'Canción']),
+            rnd.choice(['delivered', 'failed', 'received']),
+            rnd.choice(['inbound', 'outbound-api', 'outbound-reply', None]),
+            rnd.choice([None, BASE + timedelta(hours=rnd.randint(0, 96))])
+        )
+        for i in range(count)
+    ]
+
+
+def _filters():
+    """Combinaciones de todos los filtros, con y sin cada uno"""
+    dates = [None, BASE + timedelta(hours=24), BASE + timedelta(hours=72)]
+    numbers = [None] + NUMBERS[:2]
+    for fecha_inicio, fecha_final, numero_from, numero_to, from_to, contraparte, body, status, direction in product(
+        dates, dates, numbers, numbers, numbers, [None, NUMBERS[2]],
+        [None, 'confirm'], [None, 'failed'], [None, 'inbound', 'outbound']
+    ):
+        if contraparte and not from_to:
+            continue
+        yield MessageFilter(
+            fecha_inicio=fecha_inicio,
+            fecha_final=fecha_final,
+            numero_from=numero_from,
+            numero_to=numero_to,
+            numero_from_to=from_to,
+            numero_contraparte=contraparte,
+            body_search=body,
+            status=status,
+            direction=direction
+        )
+
+
+def _streamed(message: Message, streams: list[dict]) -> bool:
+    """Simula Twilio: el mensaje sale de algún stream si cumple su from/to"""
+    fields = {'from_': 'from_number', 'to': 'to_number'}
+    return any(
+        all(getattr(message, fields[param]) == value for param, value in stream.items() if param in fields)
+        for stream in streams
+    )
+
+
+def test_compile_matcher_equals_matches():
+    messages = _messages()
+    for filters in _filters():
+        matcher = filters.compile_matcher()
+        for message in messages:
+            assert matcher(message) == filters.matches(message), (filters, message)
+
+
+def test_compile_matcher_with_pushed_filters_equals_matches():
+    messages = _messages()
+    planner = QueryPlanner()
+    for filters in _filters():
+        plan = planner.plan(filters)
+        for message in messages:
+            # Los filtros que el plan deja a Twilio los cumple el stream
+            got = _streamed(message, plan.streams) and plan.matcher(message)
+            assert got == filters.matches(message), (plan.strategy, filters, message)
+
+
+def test_compile_matcher_sid():
+    message = _messages(1)[0]
+    filters = MessageFilter(sid=message.sid, status=message.status)
+    assert filters.compile_matcher()(message)
+    assert filters.compile_matcher(pushed={'sid'})(message)
+    assert not MessageFilter(sid='SMotro').compile_matcher()(message)
@@ -0,0 +1,92 @@
+"""
+Sincronización incremental del almacén local en segundo plano
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import threading
+import time
+
+from backend.models.message import Message, MessageFilter
+from backend.services.message_store import MessageStore
+from backend.services.sync_service import MessageSyncService
+from backend.utils.date_utils import to_epoch
+
+
+NOW = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+class _FakeMessages:
+    """messages.stream de Twilio sobre una lista, del más reciente al más antiguo"""
+    
+    def __init__(self, records, release: threading.Event = None):
+        self.records = records
+        self.calls = []
+        self._release = release
+    
+    def stream(self, page_size=None, date_sent_after=None, date_sent_before=None):
+        self.calls.append((date_sent_after, date_sent_before))
+        if self._release is not None:
+            self._release.wait(5)
+        for record in self.records:
+            if date_sent_after is not None and record.date_sent < date_sent_after:
+                continue
+            if date_sent_before is not None and record.date_sent >= date_sent_before:
+                continue
+            yield record
+
+
+def _record(sid: str, status: str, age: timedelta) -> SimpleNamespace:
+    return SimpleNamespace(
+        sid=sid, from_='whatsapp:+1', to='whatsapp:+2', body='Hola',
+        status=status, direction='outbound-api', date_sent=NOW - age
+    )
+
+
+def _store(tmp_path, messages: list[Message]) -> MessageStore:
+    store = MessageStore(tmp_path / 'store.db')
+    store.upsert_messages(messages)
+    store.set_state(
+        backfill_complete=1,
+        high_water_mark=max(to_epoch(message.date_sent) for message in messages)
+    )
+    return store
+
+
+def test_ensure_synced_does_not_wait_for_twilio(tmp_path):
+    store = _store(tmp_path, [Message.from_twilio_message(_record('SM1', 'sent', timedelta(0)))])
+    release = threading.Event()
+    messages = _FakeMessages([_record('SM2', 'sent', timedelta(0))], release)
+    sync = MessageSyncService(SimpleNamespace(messages=messages), store)
+    
+    started = time.monotonic()
+    sync.ensure_synced()
+    assert time.monotonic() - started < 1
+    assert not store.known_sids(['SM2'])
+    
+    release.set()
+    deadline = time.monotonic() + 5
+    while not store.known_sids(['SM2']) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.known_sids(['SM2'])
+
+
+def test_status_changes_before_the_overlap_are_refreshed(tmp_path):
+    recent = _record('SM0', 'delivered', timedelta(0))
+    old_sent = _record('SM1', 'sent', timedelta(hours=2))
+    old_read = _record('SM2', 'read', timedelta(hours=3))
+    store = _store(tmp_path, [Message.from_twilio_message(record)
+                              for record in (recent, old_sent, old_read)])
+    messages = _FakeMessages([recent, _record('SM1', 'read', timedelta(hours=2)), old_read])
+    sync = MessageSyncService(SimpleNamespace(messages=messages), store)
+    
+    sync.sync_incremental()
+    
+    # Se relee desde el mensaje pendiente más antiguo, no desde los ya finales
+    statuses = {m.sid: m.status for m in store.find_messages(MessageFilter(), limit=10)}
+    assert statuses == {'SM0': 'delivered', 'SM1': 'read', 'SM2': 'read'}
+    assert messages.calls[-1][0] == old_sent.date_sent
+    
+    # Dentro del intervalo no se vuelve a releer
+    calls = len(messages.calls)
+    sync.sync_incremental()
+    assert len(messages.calls) == calls + 1
@@ -0,0 +1,114 @@
+"""
+Paginación de /mensajes sobre Twilio: ventanas, colector y tramos
+"""
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+from backend.models.message import Message, MessageFilter
+from backend.services.cache_service import CacheService
+from backend.services.message_window import MessageWindowCache
+from backend.services.twilio_service import TwilioService
+
+
+END = datetime(2026, 1, 20)
+
+
+class _ShardSpy:
+    """ShardedFetcher que registra las lecturas divididas en lugar de hacerlas"""
+    
+    def __init__(self, messages):
+        self.calls = 0
+        self._messages = messages
+    
+    def iter_messages(self, fetch_shard, start, end, limit=None):
+        self.calls += 1
+        return iter(self._messages)
+
+
+def _messages(density, count: int = 20000) -> list[Message]:
+    """Mensajes del más reciente al más antiguo; density(i) es la fracción que falló"""
+    rnd = random.Random(5)
+    return [
+        Message(
+            f'SM{i}',
+            'whatsapp:+1',
+            'whatsapp:+2',
+            'Hola',
+            'failed' if rnd.random() < density(i) else 'delivered',
+            'outbound-api',
+            END - timedelta(seconds=30 * i)
+        )
+        for i in range(count)
+    ]
+
+
+def _service(messages: list[Message], window: bool, **kwargs) -> TwilioService:
+    service = TwilioService(
+        'AC' + 'a' * 32,
+        'token',
+        client=object(),
+        window_cache=MessageWindowCache(CacheService()) if window else None,
+        **kwargs
+    )
+    service._iter_upstream = lambda params, limit=None: iter(messages[:limit])
+    return service
+
+
+def _week(**kwargs) -> MessageFilter:
+    return MessageFilter(fecha_inicio=END - timedelta(days=7), fecha_final=END, **kwargs)
+
+
+@pytest.fixture(params=[True, False], ids=['ventanas', 'colector'])
+def window(request):
+    return request.param
+
+
+def test_filtered_first_page_is_not_sharded(window):
+    messages = _messages(lambda i: 0.1)
+    service = _service(messages, window, shard_concurrency=4)
+    service._sharded_fetcher = _ShardSpy(messages)
+    
+    response = service.get_paginated_messages(_week(status='failed'), 1, 50)
+    
+    assert len(response.messages) == 50
+    assert service._sharded_fetcher.calls == 0
+
+
+def test_deep_page_is_sharded(window):
+    messages = _messages(lambda i: 0.1)
+    service = _service(messages, window, shard_concurrency=4)
+    service._sharded_fetcher = _ShardSpy(messages)
+    
+    service.get_paginated_messages(_week(), 120, 50)
+    
+    assert service._sharded_fetcher.calls == 1
+
+
+@pytest.mark.parametrize('per_page', [20, 50])
+def test_truncated_pages_continue_to_the_end(per_page):
+    # Un tramo casi sin coincidencias corta varias páginas por el máximo de descartes
+    messages = _messages(lambda i: 0.0005 if 3000 <= i < 15000 else 0.04, count=30000)
+    expected = [message.sid for message in messages if message.status == 'failed']
+    filters = MessageFilter(status='failed')
+    
+    pages = {}
+    for window in (True, False):
+        service = _service(messages, window, max_discarded_rows=1200)
+        pages[window] = []
+        for page in range(1, len(expected) + 2):
+            response = service.get_paginated_messages(filters, page, per_page)
+            pages[window].append([message.sid for message in response.messages])
+            if not response.has_more:
+                break
+        
+        assert [sid for sids in pages[window] for sid in sids] == expected
+        
+        # Más allá del final ya no hay más páginas y total_pages no crece
+        past_end = service.get_paginated_messages(filters, page + 1, per_page)
+        assert not past_end.messages and not past_end.has_more
+        assert past_end.total_pages == response.total_pages
+    
+    assert any(len(sids) < per_page for sids in pages[True][:-1])
+    assert pages[True] == pages[False]